@@ -0,0 +1,124 @@
+"""Throughput of per-line vs batched publishing in log_to_mqtt.
+
+Starts a minimal local MQTT broker stand-in that accepts one client,
+acknowledges the CONNECT and counts the lines in every PUBLISH it
+receives.  A paho client then publishes a burst of direwolf lines, once
+the way log_to_mqtt always has (one publish and one terminal write per
+line) and once through :class:`direwolf_monitor.utils.batch.Batcher`.
+
+Usage::
+
+    python benchmarks/bench_batch.py [--lines 20000]
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from direwolf_monitor.utils import batch
+
+LINE = b"[0.4] KM6LYW-9>APDR16,WIDE1-1:=3742.61N/12225.27W[360/000/A=000045\n"
+
+
+class SinkBroker:
+    """Just enough MQTTv5 to let paho connect and publish at qos 0."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.lines = 0
+        self.packets = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _read(self, conn, n):
+        data = b""
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        try:
+            while True:
+                header = self._read(conn, 1)[0]
+                length, mult = 0, 1
+                while True:
+                    byte = self._read(conn, 1)[0]
+                    length += (byte & 0x7F) * mult
+                    mult *= 128
+                    if not byte & 0x80:
+                        break
+                body = self._read(conn, length)
+                kind = header >> 4
+                if kind == 1:
+                    conn.sendall(b"\x20\x03\x00\x00\x00")
+                elif kind == 3:
+                    self.packets += 1
+                    self.lines += body.count(b"\n")
+                elif kind == 12:
+                    conn.sendall(b"\xd0\x00")
+                elif kind == 14:
+                    break
+        except ConnectionError:
+            pass
+        conn.close()
+
+
+def _run(mode, lines):
+    broker = SinkBroker()
+    client = mqtt.Client(
+        callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+        protocol=mqtt.MQTTv5,
+    )
+    client.max_queued_messages_set(0)
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    devnull = open(os.devnull, "w")
+
+    start = time.perf_counter()
+    if mode == "per-line":
+        for _ in range(lines):
+            line = LINE.decode()
+            print(f"Published {line}", end="", file=devnull)
+            client.publish("direwolf", payload=line, qos=0)
+    else:
+        def _publish(payload, count):
+            client.publish("direwolf", payload=payload, qos=0)
+            print(f"Published batch of {count} lines", file=devnull)
+
+        batcher = batch.Batcher(_publish)
+        for _ in range(lines):
+            batcher.add(LINE)
+        batcher.close()
+
+    while broker.lines < lines:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+    client.loop_stop()
+    devnull.close()
+    return elapsed, broker.packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'lines/s':>12}{'packets':>10}")
+    for mode in ("per-line", "batched"):
+        elapsed, packets = _run(mode, args.lines)
+        print(f"{mode:<10}{args.lines / elapsed:>12.0f}{packets:>10}")
+
+
+if __name__ == "__main__":
+    main()
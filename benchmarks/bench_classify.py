@@ -0,0 +1,67 @@
+"""Micro-benchmark of direwolf line classification.
+
+Compares the original mqtt_to_terminal dispatch (decode to str, an
+uncompiled re.search, then a chain of ``in`` checks and ``replace``
+calls to strip the prefix) with :func:`direwolf_monitor.utils.classify.classify`
+on the raw bytes.  Only classification and getting at the packet text
+is timed, no parsing.
+
+Usage::
+
+    python benchmarks/bench_classify.py [--replay tests/data/direwolf.log] [--number 200]
+"""
+import argparse
+import os
+import re
+import timeit
+
+from direwolf_monitor.utils import classify
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+
+def _old(line):
+    line = line.decode('UTF-8').strip()
+    search = re.search(r"^\[\d\.*\d*\] (.*)", line)
+    if search is not None:
+        return "rx", search.group(1)
+    elif "[0L]" in line:
+        return "tx", line.replace("[0L]", "").strip()
+    elif "[ig]" in line:
+        return "ig", line.replace("[ig]", "").strip()
+    elif "[rx>ig]" in line:
+        return "rx>ig", None
+    elif "[ig>tx]" in line:
+        return "ig>tx", line.replace("[ig>tx]", "").strip()
+    elif 'ig_to_tx' in line:
+        return "other", None
+    return "other", None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.replay, "rb") as f:
+        lines = f.readlines()
+
+    def run_old():
+        for line in lines:
+            _old(line)
+
+    def run_new():
+        for line in lines:
+            classify.classify(line)
+
+    total = len(lines) * args.number
+    for name, fn in (("old chain", run_old), ("classify", run_new)):
+        elapsed = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:<12}{elapsed / total * 1e9:>10.0f} ns/line"
+              f"{total / elapsed:>14.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark of <0xNN> escape decoding.
+
+Compares the replace chain mqtt_to_terminal used for received packets
+(decode to str, then five ``str.replace`` calls covering only some of
+the escapes, two of them wrongly) with
+:func:`direwolf_monitor.utils.escape.decode` on the packet bytes, for
+packets with and without escapes.
+
+Usage::
+
+    python benchmarks/bench_escape.py [--replay tests/data/direwolf.log] [--number 2000]
+"""
+import argparse
+import os
+import timeit
+
+from direwolf_monitor.utils import classify, escape
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+
+def _old(raw):
+    packetstring = str(raw, "UTF-8", "replace")
+    return packetstring.replace('<0x0d>', '\x0d'). \
+        replace('<0x1c>', '\x1c').replace('<0x1e>', '\x1e'). \
+        replace('<0x1f>', '\0x1f').replace('<0x0a>', '\0x0a')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.replay, "rb") as f:
+        packets = [bytes(raw) for kind, raw in map(classify.classify, f)
+                   if kind != classify.OTHER]
+    sets = (
+        ("plain", [p for p in packets if b"<0x" not in p]),
+        ("escaped", [p for p in packets if b"<0x" in p]),
+    )
+
+    print(f"{'packets':<10}{'decoder':<12}{'ns/packet':>12}")
+    for label, data in sets:
+        if not data:
+            continue
+        for name, fn in (("old chain", _old), ("decode", escape.decode)):
+            def _run(data=data, fn=fn):
+                for raw in data:
+                    fn(raw)
+            elapsed = min(timeit.repeat(_run, number=args.number, repeat=3))
+            print(f"{label:<10}{name:<12}{elapsed / (len(data) * args.number) * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Micro-benchmark of distance and bearing to many stations.
+
+Compares, per point:
+
+  * ``scalar``: what add_gps did for every packet, converting our own
+    position to floats, then calling
+    :func:`direwolf_monitor.utils.calculate_initial_compass_bearing`
+    and ``haversine`` separately
+  * ``home``: :meth:`direwolf_monitor.utils.geo.Home.distance_bearing`
+    with our position precomputed
+  * ``batch``: :meth:`direwolf_monitor.utils.geo.Home.distances_bearings`
+    on NumPy arrays
+
+Usage::
+
+    python benchmarks/bench_geo.py [--sizes 10000,1000000]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from haversine import Unit, haversine
+
+from direwolf_monitor import utils
+from direwolf_monitor.utils import geo
+
+MY_LATITUDE = "37.4219"
+MY_LONGITUDE = "-122.0841"
+
+
+def _scalar(lats, lons):
+    for lat, lon in zip(lats, lons, strict=True):
+        my_coords = (float(MY_LATITUDE), float(MY_LONGITUDE))
+        utils.calculate_initial_compass_bearing(my_coords, (lat, lon))
+        haversine(my_coords, (lat, lon), unit=Unit.MILES)
+
+
+def _home(lats, lons):
+    home = geo.home(MY_LATITUDE, MY_LONGITUDE)
+    for lat, lon in zip(lats, lons, strict=True):
+        home.distance_bearing(lat, lon)
+
+
+def _batch(lats, lons):
+    geo.home(MY_LATITUDE, MY_LONGITUDE).distances_bearings(lats, lons)
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,1000000")
+    args = parser.parse_args()
+
+    rand = random.Random(1)
+    print(f"{'points':>10}{'path':>8}{'seconds':>10}{'ns/point':>10}{'speedup':>9}")
+    for size in map(int, args.sizes.split(",")):
+        lats = [rand.uniform(30, 45) for _ in range(size)]
+        lons = [rand.uniform(-125, -110) for _ in range(size)]
+        arrays = np.array(lats), np.array(lons)
+        base = _time(_scalar, lats, lons)
+        for name, fn, data in (("scalar", _scalar, (lats, lons)),
+                               ("home", _home, (lats, lons)),
+                               ("batch", _batch, arrays)):
+            elapsed = base if fn is _scalar else min(_time(fn, *data) for _ in range(3))
+            print(f"{size:>10}{name:>8}{elapsed:>10.3f}"
+                  f"{elapsed / size * 1e9:>10.0f}{base / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""CPU cost of per-line console output vs --headless.
+
+Replays a direwolf log through:
+
+  * mqtt_to_terminal's LineProcessor, rendering every packet vs headless
+  * log_to_mqtt's per-line delivery (Rich status + "Published" print)
+    vs headless counting
+
+and reports CPU seconds (process time) for each.  Terminal output goes
+to /dev/null so only the cost of producing it is measured.
+
+Usage::
+
+    python benchmarks/bench_headless.py [--replay tests/data/direwolf.log] [--repeat 20]
+"""
+import argparse
+import contextlib
+import os
+import time
+import types
+
+from rich.console import Console
+
+from direwolf_monitor.utils import processor, stats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+
+def _cpu(fn):
+    start = time.process_time()
+    fn()
+    return time.process_time() - start
+
+
+def _terminal(lines, devnull, headless):
+    console = Console(file=devnull, force_terminal=True, width=160)
+    ctx = types.SimpleNamespace(obj={"console": console})
+    proc = processor.LineProcessor(
+        ctx, latitude="37.7", longitude="-122.4", headless=headless,
+    )
+    msgs = [types.SimpleNamespace(payload=line) for line in lines]
+
+    def _run():
+        with contextlib.redirect_stdout(devnull):
+            for msg in msgs:
+                proc.on_message(None, None, msg)
+    return _cpu(_run)
+
+
+def _log(lines, devnull, headless):
+    console = Console(file=devnull, force_terminal=True, width=160)
+    summary = stats.Summary("log_to_mqtt")
+
+    def _run():
+        if headless:
+            for line in lines:
+                summary.count(len(line))
+            return
+        with console.status("reading") as status, contextlib.redirect_stdout(devnull):
+            for number, line in enumerate(lines):
+                status.update(f"Reading line {number} from direwolf.log")
+                print(f"Published {line.decode('UTF-8', errors='replace')}", end='')
+    return _cpu(_run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="replay the file this many times")
+    args = parser.parse_args()
+
+    with open(args.replay, "rb") as f:
+        lines = [line for line in f.readlines() if line.strip()] * args.repeat
+
+    with open(os.devnull, "w") as devnull:
+        print(f"{len(lines)} lines from {args.replay}")
+        print(f"{'command':<20}{'normal cpu s':>14}{'headless cpu s':>16}{'ratio':>8}")
+        for name, fn in (("mqtt_to_terminal", _terminal), ("log_to_mqtt", _log)):
+            normal = fn(lines, devnull, headless=False)
+            headless = fn(lines, devnull, headless=True)
+            print(f"{name:<20}{normal:>14.3f}{headless:>16.3f}{normal / headless:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
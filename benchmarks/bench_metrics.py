@@ -0,0 +1,96 @@
+"""Overhead of the rolling metrics.
+
+Reports the cost of each metric operation, of a sample and of a
+Prometheus scrape, then replays a direwolf log through a headless
+LineProcessor with its metrics on and with them stubbed out, the way
+mqtt_to_terminal's on_message runs them for every line.  log_to_mqtt's
+publish path adds one histogram observation and two perf_counter calls
+per message.
+
+Usage::
+
+    python benchmarks/bench_metrics.py [--replay tests/data/direwolf.log] [--repeat 20]
+"""
+import argparse
+import io
+import os
+import time
+import timeit
+import types
+
+from rich.console import Console
+
+from direwolf_monitor.utils import cache, metrics, processor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+
+class _Off:
+    """Stands in for every metric, doing nothing."""
+
+    def inc(self, *args):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _replay(lines, repeat, off):
+    ctx = types.SimpleNamespace(obj={"console": Console(file=io.StringIO())})
+    # Cache the parse so the metrics aren't lost in parsing time.
+    from direwolf_monitor.utils import packet
+    proc = processor.LineProcessor(
+        ctx, headless=True, cache=cache.ParseCache(packet.parse_packet),
+        dedup_window=30,
+    )
+    if off:
+        proc._lines = proc._packets = proc._failures = proc._render_time = _Off()
+    msg = types.SimpleNamespace(payload=b"")
+
+    def _run():
+        for line in lines:
+            msg.payload = line
+            proc.on_message(None, None, msg)
+        proc.dedup.close()
+
+    _run()
+    return min(timeit.repeat(_run, number=1, repeat=repeat)) / len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    m = metrics.Metrics()
+    counter = m.counter("lines")
+    labeled = m.labeled_counter("packets")
+    histogram = m.histogram("render_seconds")
+    number = 200000
+    ops = (
+        ("Counter.inc", lambda: counter.inc()),
+        ("LabeledCounter.inc", lambda: labeled.inc("GPSPacket")),
+        ("Histogram.observe", lambda: histogram.observe(0.0012)),
+        ("timed observe", lambda: histogram.observe(time.perf_counter() - time.perf_counter())),
+    )
+    print(f"{'operation':<22}{'ns':>10}")
+    for name, fn in ops:
+        elapsed = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        print(f"{name:<22}{elapsed * 1e9:>10.0f}")
+    for _ in range(m.window + 1):
+        m.sample()
+    print(f"{'sample':<22}{min(timeit.repeat(m.sample, number=1000, repeat=3)) * 1e6:>10.0f}")
+    print(f"{'prometheus scrape':<22}{min(timeit.repeat(m.prometheus, number=100, repeat=3)) * 1e7:>10.0f}")
+
+    with open(args.replay, "rb") as f:
+        lines = f.readlines()
+    on = _replay(lines, args.repeat, off=False)
+    off = _replay(lines, args.repeat, off=True)
+    print(f"\nreplay us/line: metrics off {off * 1e6:.2f} on {on * 1e6:.2f} "
+          f"overhead {(on - off) * 1e9:.0f} ns/line ({(on - off) / off:.1%})")
+
+
+if __name__ == "__main__":
+    main()
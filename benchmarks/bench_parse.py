@@ -0,0 +1,79 @@
+"""Packets per second per core: aprslib + aprsd factory vs the fast path.
+
+Parses generated packets (see tests/test_fastparse.py) three ways, once
+for just the formats the fast parser handles and once for the whole
+mix, which also has bulletins, weather and timestamped positions:
+
+  * ``aprslib.parse`` then aprsd's ``factory``, the old parse_packet
+  * ``aprslib.parse`` then :func:`fastparse.factory`
+  * :func:`packet.parse_packet`, fast parser with aprslib fallback
+
+Single process, so the rates are per core.
+
+Usage::
+
+    python benchmarks/bench_parse.py [--packets 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import aprslib
+from aprsd.packets import core as aprsd_core
+
+from direwolf_monitor.utils import fastparse
+from direwolf_monitor.utils import packet as packet_utils
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "tests"))
+
+from test_fastparse import _Generator  # noqa: E402
+
+
+def _old(raw):
+    try:
+        return aprsd_core.factory(aprslib.parse(raw))
+    except (aprslib.exceptions.ParseError, aprslib.exceptions.UnknownFormat):
+        return None
+
+
+def _fast_factory(raw):
+    try:
+        return fastparse.factory(aprslib.parse(raw))
+    except (aprslib.exceptions.ParseError, aprslib.exceptions.UnknownFormat):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packets", type=int, default=2000)
+    args = parser.parse_args()
+
+    gen = _Generator(1)
+    packets = []
+    while len(packets) < args.packets:
+        raw = gen.packet()
+        try:
+            aprsd_core.factory(aprslib.parse(raw))
+        except Exception:
+            continue
+        packets.append(raw)
+    common = [raw for raw in packets if fastparse.parse(raw) is not None]
+
+    for label, data in (("common formats", common), ("all generated", packets)):
+        print(f"\n{label}: {len(data)} packets")
+        print(f"{'parser':<28}{'packets/s':>12}{'us/packet':>12}")
+        for name, fn in (("aprslib + aprsd factory", _old),
+                         ("aprslib + fast factory", _fast_factory),
+                         ("parse_packet", packet_utils.parse_packet)):
+            start = time.process_time()
+            for raw in data:
+                fn(raw)
+            elapsed = time.process_time() - start
+            print(f"{name:<28}{len(data) / elapsed:>12.0f}"
+                  f"{elapsed / len(data) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Throughput of mqtt_to_terminal parsing in-thread vs a process pool.
+
+Replays a direwolf log through a headless LineProcessor, then through
+PooledLineProcessor with 1, 2, 4, ... workers up to the core count, and
+reports wall-clock packets per second for each.  The parse cache and
+dedup are off so every packet is really parsed.
+
+Usage::
+
+    python benchmarks/bench_pool.py [--replay tests/data/direwolf.log] [--repeat 20]
+                                    [--max-workers N] [--chunk-size 64]
+"""
+import argparse
+import io
+import os
+import time
+import types
+
+from rich.console import Console
+
+from direwolf_monitor.utils import processor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+
+def _run(proc, lines):
+    start = time.perf_counter()
+    for line in lines:
+        proc.process_line(line)
+    proc.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="replay the file this many times")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=processor.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with open(args.replay, "rb") as f:
+        lines = f.readlines() * args.repeat
+    ctx = types.SimpleNamespace(obj={"console": Console(file=io.StringIO())})
+    packets = sum(1 for line in lines
+                  if processor.LineProcessor(ctx).prepare(line) is not None)
+
+    print(f"{packets} packets from {args.replay}, {os.cpu_count()} cores")
+    print(f"{'mode':<16}{'seconds':>10}{'packets/s':>12}{'speedup':>10}")
+    base = _run(processor.LineProcessor(ctx, headless=True), lines)
+    print(f"{'in-thread':<16}{base:>10.2f}{packets / base:>12.0f}{1:>9.1f}x")
+    workers = 1
+    while workers <= args.max_workers:
+        pooled = processor.PooledLineProcessor(
+            ctx, workers=workers, chunk_size=args.chunk_size, headless=True,
+        )
+        elapsed = _run(pooled, lines)
+        print(f"{f'{workers} workers':<16}{elapsed:>10.2f}{packets / elapsed:>12.0f}"
+              f"{base / elapsed:>9.1f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
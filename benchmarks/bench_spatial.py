@@ -0,0 +1,109 @@
+"""Insert and query cost of the grid spatial index.
+
+Places `--stations` stations, most of them clustered around a few
+iGate areas and the rest spread over the globe, then times:
+
+  * ``insert``: adding every station, and moving 10% of them
+  * ``radius``: stations within `--miles` of home
+  * ``bbox``: stations in a 1x1 degree box around home
+  * ``nearest``: the 10 nearest stations to home
+
+against a linear scan calling ``haversine()`` on every station, which
+is what answering the same question without an index costs.
+
+Usage::
+
+    python benchmarks/bench_spatial.py [--stations 10000,50000] [--miles 20]
+"""
+import argparse
+import heapq
+import random
+import time
+
+from haversine import Unit, haversine
+
+from direwolf_monitor.utils import spatial
+
+HOME = (37.4219, -122.0841)
+CENTERS = [HOME, (34.05, -118.24), (47.61, -122.33), (40.71, -74.0), (51.5, -0.12)]
+
+
+def _positions(count, seed=1):
+    rand = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        if rand.random() < 0.8:
+            lat, lon = rand.choice(CENTERS)
+            positions.append((lat + rand.gauss(0, 1), lon + rand.gauss(0, 1)))
+        else:
+            positions.append((rand.uniform(-80, 80), rand.uniform(-179, 179)))
+    return positions
+
+
+def _best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _compare(count, miles, repeat):
+    positions = _positions(count)
+    index = spatial.GridIndex()
+
+    def _insert():
+        index.clear()
+        for key, (lat, lon) in enumerate(positions):
+            index.update(key, lat, lon)
+        for key in range(0, count, 10):
+            lat, lon = positions[key]
+            index.update(key, lat + 0.3, lon + 0.3)
+
+    inserted = _best(_insert, 3)
+    print(f"{count:>10}{'insert':>10}{inserted / (count * 1.1) * 1e6:>12.2f}{'-':>12}")
+    _insert()
+    stations = {key: (lat + 0.3, lon + 0.3) if key % 10 == 0 else (lat, lon)
+                for key, (lat, lon) in enumerate(positions)}
+
+    def _scan_radius():
+        return [key for key, position in stations.items()
+                if haversine(HOME, position, unit=Unit.MILES) <= miles]
+
+    def _scan_bbox():
+        return [key for key, (lat, lon) in stations.items()
+                if HOME[0] - 0.5 <= lat <= HOME[0] + 0.5
+                and HOME[1] - 0.5 <= lon <= HOME[1] + 0.5]
+
+    def _scan_nearest():
+        return heapq.nsmallest(10, stations, key=lambda key: haversine(
+            HOME, stations[key], unit=Unit.MILES))
+
+    queries = (
+        ("radius", lambda: index.radius(*HOME, miles), _scan_radius),
+        ("bbox", lambda: index.bbox(HOME[0] - 0.5, HOME[1] - 0.5,
+                                    HOME[0] + 0.5, HOME[1] + 0.5), _scan_bbox),
+        ("nearest", lambda: index.nearest(*HOME, 10), _scan_nearest),
+    )
+    for name, query, scan in queries:
+        indexed = _best(query, repeat)
+        scanned = _best(scan, max(repeat // 10, 1))
+        print(f"{count:>10}{name:>10}{indexed * 1e6:>12.1f}{scanned * 1e6:>12.1f}"
+              f"{scanned / indexed:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", default="10000,50000")
+    parser.add_argument("--miles", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'stations':>10}{'operation':>10}{'index us':>12}{'scan us':>12}{'speedup':>9}")
+    for count in map(int, args.stations.split(",")):
+        _compare(count, args.miles, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
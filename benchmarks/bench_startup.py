@@ -0,0 +1,136 @@
+"""Cold-start time of the dwm CLI, with regression limits.
+
+Each measurement runs in a fresh interpreter, best of `--repeat`:
+
+  * ``import:<module>``: time to import the module, interpreter start
+    not included.
+  * ``cmd:<args>``: wall time of running ``dwm <args>``.
+  * ``first-packet``: wall time from starting Python to having rendered
+    the first packet of the replay file through mqtt_to_terminal's
+    LineProcessor, the way ``dwm mqtt-to-terminal`` gets there (the
+    broker connection left out).
+
+Exits with status 1 if a measurement is over its limit.  The limits are
+for a desktop class machine; use ``--scale`` on slower hosts (a Pi Zero
+wants around 10) or ``--limit name=ms`` to override one.
+
+Usage::
+
+    python benchmarks/bench_startup.py [--repeat 5] [--scale 1] [--limit first-packet=2000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPLAY = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+
+MODULES = [
+    "direwolf_monitor.cli",
+    "direwolf_monitor.cmds.log",
+    "direwolf_monitor.utils.processor",
+    "direwolf_monitor.utils.packet",
+]
+COMMANDS = [
+    ["version"],
+    ["--help"],
+]
+
+# milliseconds
+DEFAULT_LIMITS = {
+    "import:direwolf_monitor.cli": 150,
+    "import:direwolf_monitor.cmds.log": 450,
+    "import:direwolf_monitor.utils.processor": 200,
+    "import:direwolf_monitor.utils.packet": 900,
+    "cmd:version": 400,
+    "cmd:--help": 1000,
+    "first-packet": 2000,
+}
+
+_IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+_FIRST_PACKET = """
+import os, sys, types
+import click
+from direwolf_monitor.cli import cli
+cli.get_command(click.Context(cli), "mqtt-to-terminal")
+from rich.console import Console
+from direwolf_monitor.utils import processor
+console = Console(file=open(os.devnull, "w"), force_terminal=True)
+proc = processor.LineProcessor(types.SimpleNamespace(obj={"console": console}))
+with open(sys.argv[1], "rb") as f:
+    for line in f:
+        if proc.prepare(line) is not None:
+            proc.process_line(line)
+            break
+"""
+
+
+def _wall(args):
+    start = time.perf_counter()
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _measure(args, repeat):
+    results = {}
+    for module in MODULES:
+        results[f"import:{module}"] = min(
+            float(subprocess.run(
+                [sys.executable, "-c", _IMPORT.format(module=module)],
+                check=True, capture_output=True, text=True,
+            ).stdout)
+            for _ in range(repeat)
+        )
+    main = "import sys; from direwolf_monitor.cli import main; sys.exit(main())"
+    for command in COMMANDS:
+        results[f"cmd:{' '.join(command)}"] = min(
+            _wall([sys.executable, "-c", main, *command]) for _ in range(repeat)
+        )
+    results["first-packet"] = min(
+        _wall([sys.executable, "-c", _FIRST_PACKET, args.replay])
+        for _ in range(repeat)
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replay", default=DEFAULT_REPLAY)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply every limit by this")
+    parser.add_argument("--limit", action="append", default=[],
+                        metavar="NAME=MS", help="override one limit")
+    args = parser.parse_args()
+
+    limits = dict(DEFAULT_LIMITS)
+    for item in args.limit:
+        name, _, ms = item.partition("=")
+        limits[name] = float(ms)
+
+    failed = []
+    print(f"{'measurement':<42}{'ms':>10}{'limit':>10}")
+    for name, elapsed in _measure(args, args.repeat).items():
+        limit = limits.get(name)
+        if limit is not None:
+            limit *= args.scale
+        over = limit is not None and elapsed * 1000 > limit
+        if over:
+            failed.append(name)
+        shown = f"{limit:.0f}" if limit is not None else "-"
+        print(f"{name:<42}{elapsed * 1000:>10.1f}{shown:>10}{'  OVER' if over else ''}")
+    if failed:
+        print(f"over the limit: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
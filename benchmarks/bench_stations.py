@@ -0,0 +1,76 @@
+"""Update cost and memory of the station table.
+
+Feeds `--packets` synthetic position packets from `--stations`
+callsigns into a :class:`direwolf_monitor.utils.stations.StationTable`
+and reports the time per update and the memory per station, with the
+table below and at its `--max-stations` bound.
+
+Usage::
+
+    python benchmarks/bench_stations.py [--stations 50000] [--packets 500000] [--max-stations 20000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import types
+
+from direwolf_monitor.utils import stations
+
+
+class GPSPacket(types.SimpleNamespace):
+    pass
+
+
+class StatusPacket(types.SimpleNamespace):
+    pass
+
+
+def _packets(callsigns, count, seed=1):
+    rand = random.Random(seed)
+    paths = [["WIDE1-1"], ["WIDE1-1", "WIDE2-1"], ["TCPIP*", "qAC", "T2USANE"]]
+    packets = []
+    for _ in range(count):
+        call = rand.choice(callsigns)
+        if rand.random() < 0.8:
+            packets.append(GPSPacket(
+                from_call=call, path=rand.choice(paths),
+                latitude=rand.uniform(30, 45), longitude=rand.uniform(-125, -110),
+                symbol="-", symbol_table="/",
+            ))
+        else:
+            packets.append(StatusPacket(from_call=call, path=rand.choice(paths)))
+    return packets
+
+
+def _fill(packets, max_stations):
+    table = stations.StationTable(max_stations=max_stations, max_age=0)
+    start = time.perf_counter()
+    for now, packet in enumerate(packets):
+        table.update(packet, now=now)
+    return table, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=50000)
+    parser.add_argument("--packets", type=int, default=500000)
+    parser.add_argument("--max-stations", type=int, default=stations.DEFAULT_MAX_STATIONS)
+    args = parser.parse_args()
+
+    callsigns = [f"K{i:05d}-{i % 16}" for i in range(args.stations)]
+    packets = _packets(callsigns, args.packets)
+    print(f"{'max stations':>14}{'stations':>10}{'us/update':>11}{'bytes/station':>15}{'evictions':>11}")
+    for bound in (args.stations, args.max_stations):
+        # Time without tracemalloc, measure memory with it.
+        _, elapsed = _fill(packets, bound)
+        tracemalloc.start()
+        table, _ = _fill(packets, bound)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{bound:>14}{len(table):>10}{elapsed / len(packets) * 1e6:>11.2f}"
+              f"{memory / len(table):>15.0f}{table.evictions:>11}")
+
+
+if __name__ == "__main__":
+    main()
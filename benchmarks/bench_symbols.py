@@ -0,0 +1,76 @@
+"""Micro-benchmark of rendering an APRS symbol.
+
+Compares what packet_print did for every packet (crop the tile from the
+full-size chart, wrap it in a term_image AutoImage and format it one
+cell high) with :meth:`direwolf_monitor.utils.symbols.SymbolAtlas.render`,
+cold (first use of each symbol) and warm.
+
+Usage::
+
+    python benchmarks/bench_symbols.py [--number 200]
+"""
+import argparse
+import time
+import timeit
+import warnings
+
+from direwolf_monitor.utils import symbols
+
+# symbol, table pairs as seen on a typical feed
+SAMPLE = [
+    ("-", "/"), (">", "/"), ("k", "/"), ("_", "/"), ("#", "\\"),
+    ("&", "I"), ("[", "/"), ("j", "\\"), ("#", "S"), ("v", "/"),
+]
+
+
+def _old_chart(atlas, table):
+    return atlas._chart(symbols.CHARTS[symbols.ALTERNATE if table != "/" else "/"])
+
+
+def _old(atlas, symbol, table):
+    from term_image.image import AutoImage
+    offset = ord(symbol) - 33
+    row, col = divmod(offset, symbols.COLUMNS)
+    size = symbols.TILE_SIZE
+    tile = _old_chart(atlas, table).crop(
+        (col * size, row * size, col * size + size, row * size + size),
+    )
+    image = AutoImage(tile)
+    image.height = 1
+    return format(image, "1.1#")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    atlas = symbols.SymbolAtlas()
+    start = time.perf_counter()
+    for symbol, table in SAMPLE:
+        atlas.render(symbol, table)
+    cold = (time.perf_counter() - start) / len(SAMPLE)
+
+    def _run_old():
+        for symbol, table in SAMPLE:
+            _old(atlas, symbol, table)
+
+    def _run_atlas():
+        for symbol, table in SAMPLE:
+            atlas.render(symbol, table)
+
+    old = min(timeit.repeat(_run_old, number=max(args.number // 20, 1), repeat=3))
+    old /= len(SAMPLE) * max(args.number // 20, 1)
+    warm = min(timeit.repeat(_run_atlas, number=args.number, repeat=3))
+    warm /= len(SAMPLE) * args.number
+
+    print(f"{'renderer':<16}{'us/symbol':>12}")
+    print(f"{'old':<16}{old * 1e6:>12.1f}")
+    print(f"{'atlas (cold)':<16}{cold * 1e6:>12.1f}")
+    print(f"{'atlas (warm)':<16}{warm * 1e6:>12.1f}")
+    print(f"tiles cached {len(atlas)}")
+
+
+if __name__ == "__main__":
+    main()
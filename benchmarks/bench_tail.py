@@ -0,0 +1,117 @@
+"""Compare line-to-publish latency of the log tailers.
+
+Writes timestamped lines to a temp file at random intervals and reads
+them back the way log_to_mqtt does, handing each line to a publish
+callback.  The latency is from the write to that callback, for:
+
+  * ``sleep``    - the old log_to_mqtt loop, readline and a 100 ms sleep
+                   after every empty read
+  * ``poll``     - Tailer with the adaptive backoff PollingWatcher
+  * ``inotify``  - Tailer woken by an inotify watch
+
+Usage::
+
+    python benchmarks/bench_tail.py [--lines 200] [--max-gap 0.05]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from direwolf_monitor.utils import tail
+
+# What the old loop slept for after an empty read.
+SLEEP_SEC = 0.1
+
+
+def _sleep_loop(file, stopped):
+    """Yield lines appended to `file` as log_to_mqtt did before the Tailer."""
+    line = ""
+    while not stopped.is_set():
+        tmp = file.readline()
+        if tmp:
+            line += tmp
+            if line.endswith("\n"):
+                yield line
+                line = ""
+        else:
+            time.sleep(SLEEP_SEC)
+
+
+def _writer(path, lines, max_gap):
+    with open(path, "a") as f:
+        for _ in range(lines):
+            time.sleep(random.uniform(0, max_gap))
+            f.write(f"{time.perf_counter_ns()}\n")
+            f.flush()
+
+
+def _measure(name, path, lines, max_gap):
+    latencies = []
+    done = threading.Event()
+    stopped = threading.Event()
+
+    def _publish(payload, count=1):
+        latencies.append(time.perf_counter_ns() - int(payload))
+        if len(latencies) >= lines:
+            done.set()
+
+    # Open before writing starts, so no line lands before the read position.
+    if name == "sleep":
+        file = open(path, "r")
+        file.seek(0, os.SEEK_END)
+        source = _sleep_loop(file, stopped)
+        tailer = None
+    else:
+        file = None
+        tailer = tail.Tailer(path, use_inotify=(name == "inotify"))
+        source = tailer.raw_lines()
+
+    def _reader():
+        for line in source:
+            _publish(line, 1)
+            if done.is_set():
+                break
+
+    reader = threading.Thread(target=_reader, daemon=True)
+    reader.start()
+    _writer(path, lines, max_gap)
+    done.wait(10)
+    stopped.set()
+    if tailer:
+        tailer.stop()
+    reader.join(1)
+    if tailer:
+        tailer.close()
+    if file:
+        file.close()
+
+    ms = sorted(x / 1e6 for x in latencies)
+    return {
+        "median": statistics.median(ms),
+        "p95": ms[int(len(ms) * 0.95) - 1],
+        "max": ms[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--max-gap", type=float, default=0.05,
+                        help="max seconds between written lines")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"{'tailer':<10}{'median ms':>12}{'p95 ms':>12}{'max ms':>12}")
+        for name in ("sleep", "poll", "inotify"):
+            path = os.path.join(tmpdir, f"{name}.log")
+            open(path, "w").close()
+            r = _measure(name, path, args.lines, args.max_gap)
+            print(f"{name:<10}{r['median']:>12.3f}{r['p95']:>12.3f}{r['max']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
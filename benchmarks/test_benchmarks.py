@@ -0,0 +1,145 @@
+"""pytest-benchmark suite for the per packet hot paths.
+
+Covers tailing (the old ``follow`` loop and the ``Tailer`` log_to_mqtt
+uses now), ``parse_packet``, ``create_symbol_image``, ``add_gps`` and
+``packet_print`` over the packets in the test corpus.
+Baselines are stored in benchmarks/baselines, in a directory per OS
+and interpreter (e.g. ``Linux-CPython-3.11-64bit``), not per machine.
+A run fails if a benchmark's median gets more than 25% slower than the
+stored one, which only means something on hardware like the box that
+stored it: run ``make bench-baseline`` on yours before comparing.  The
+committed baseline was stored with the pytest-benchmark and py-cpuinfo
+pinned in requirements-dev.txt.
+
+Usage::
+
+    make bench                 # compare against the stored baseline
+    make bench-baseline        # store a new one
+
+or directly::
+
+    pytest benchmarks --benchmark-storage=benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=median:25%
+
+Not collected by a plain ``pytest`` run, see testpaths in
+pyproject.toml.
+"""
+import contextlib
+import io
+import itertools
+import os
+import types
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from rich.console import Console  # noqa: E402
+
+from direwolf_monitor.cmds import log  # noqa: E402
+from direwolf_monitor.utils import classify, escape, packet, symbols, tail  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, "..", "tests", "data", "direwolf.log")
+LATITUDE = "37.7"
+LONGITUDE = "-122.4"
+
+
+def _corpus_lines():
+    with open(CORPUS, "rb") as f:
+        return [line for line in f if line.strip()]
+
+
+def _raw_packets():
+    raw = []
+    for line in _corpus_lines():
+        kind, data = classify.classify(line)
+        if kind in (classify.RX, classify.TX, classify.IG) and data[:1] != b"#":
+            raw.append(escape.decode(data))
+    return raw
+
+
+@pytest.fixture(scope="module")
+def raw_packets():
+    return _raw_packets()
+
+
+@pytest.fixture(scope="module")
+def packets(raw_packets):
+    return [p for p in map(packet.parse_packet, raw_packets) if p]
+
+
+@pytest.fixture(scope="module")
+def located(packets):
+    return [p for p in packets if getattr(p, "latitude", None) is not None]
+
+
+@pytest.fixture(scope="module")
+def devnull():
+    with open(os.devnull, "w") as f:
+        yield f
+
+
+def test_follow(benchmark):
+    text = b"".join(_corpus_lines()).decode("UTF-8", errors="replace") * 20
+    count = text.count("\n")
+
+    def _follow():
+        return sum(1 for _ in itertools.islice(log.follow(io.StringIO(text), 0), count))
+
+    assert benchmark(_follow) == count
+
+
+def test_tail(benchmark, tmp_path):
+    path = tmp_path / "direwolf.log"
+    path.write_bytes(b"".join(_corpus_lines()) * 20)
+    count = path.read_bytes().count(b"\n")
+
+    def _tail():
+        tailer = tail.Tailer(path, from_end=False, use_inotify=False)
+        try:
+            return sum(1 for _ in itertools.islice(tailer.raw_lines(), count))
+        finally:
+            tailer.close()
+
+    assert benchmark(_tail) == count
+
+
+def test_parse_packet(benchmark, raw_packets):
+    def _parse():
+        return [packet.parse_packet(raw) for raw in raw_packets]
+
+    assert any(benchmark(_parse))
+
+
+def test_create_symbol_image(benchmark, packets):
+    symbolled = [(p.symbol, p.symbol_table) for p in packets if getattr(p, "symbol", None)]
+    # The atlas is loaded once per process; time the warm lookups.
+    symbols.atlas()
+
+    def _images():
+        return [packet.create_symbol_image(s, t) for s, t in symbolled]
+
+    assert len(benchmark(_images)) == len(symbolled)
+
+
+def test_add_gps(benchmark, located):
+    def _add():
+        logit = []
+        for p in located:
+            packet.add_gps(logit, p, LATITUDE, LONGITUDE)
+        return logit
+
+    assert benchmark(_add)
+
+
+def test_packet_print(benchmark, packets, devnull):
+    console = Console(file=devnull, force_terminal=True, width=160)
+    ctx = types.SimpleNamespace(obj={"console": console})
+
+    def _print():
+        with contextlib.redirect_stdout(devnull):
+            for p in packets:
+                packet.packet_print(ctx, p, LATITUDE, LONGITUDE)
+
+    benchmark(_print)
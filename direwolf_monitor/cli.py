@@ -1,14 +1,12 @@
 """Console script for python_direwolf_monitor."""
+import importlib
 import sys
 import click
 # import click_completion
 
-from oslo_config import cfg
-
 import direwolf_monitor
 from direwolf_monitor import cli_helper, utils
 
-CONF = cfg.CONF
 APP = 'dwm'
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
@@ -26,11 +24,45 @@ CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 # click_completion.init()
 
 
+# Commands registered by importing their module, which only happens when
+# one of them is run (or listed by --help).  paho, aprsd and friends are
+# slow to import, and `dwm version` shouldn't wait for them.
+LAZY_COMMANDS = {
+    "log-to-mqtt": "direwolf_monitor.cmds.log",
+    "mqtt-to-terminal": "direwolf_monitor.cmds.log",
+    "stations": "direwolf_monitor.cmds.stations",
+    "latency": "direwolf_monitor.cmds.latency",
+    "replay": "direwolf_monitor.cmds.replay",
+    "generate": "direwolf_monitor.cmds.generate",
+}
+
+
+class LazyGroup(click.Group):
+    """A click group that imports a command's module on first use.
+
+    Args:
+        lazy_commands: command name to the module that registers it.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            importlib.import_module(self.lazy_commands[cmd_name])
+        return super().get_command(ctx, cmd_name)
+
+
 def signal_handler(sig, frame):
     pass
 
 
-@click.group(context_settings=CONTEXT_SETTINGS)
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS,
+             context_settings=CONTEXT_SETTINGS)
 @click.version_option()
 @click.pass_context
 def cli(ctx):
@@ -60,9 +92,6 @@ def version(ctx):
 
 def main(args=None):
     """Console script for direwolf_monitor."""
-    from .cmds import (
-        log # noqa
-    )
     cli(auto_envvar_prefix="dwm")
 
 if __name__ == "__main__":
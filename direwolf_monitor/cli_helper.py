@@ -3,15 +3,13 @@ import typing as t
 import os
 
 import click
-from oslo_config import cfg
-from rich.console import Console
 
 import direwolf_monitor
-from direwolf_monitor.logging import log
-from direwolf_monitor.utils import trace
 
 
-CONF = cfg.CONF
+# oslo.config, rich, loguru and aprsd's config are imported by the
+# wrappers below when a command runs, so `dwm --help` and `dwm version`
+# don't pay for them.
 
 F = t.TypeVar("F", bound=t.Callable[..., t.Any])
 
@@ -51,6 +49,15 @@ def add_options(options):
 
 def process_standard_options(f: F) -> F:
     def new_func(*args, **kwargs):
+        from oslo_config import cfg
+        from rich.console import Console
+
+        from direwolf_monitor.logging import log
+
+        # Registers the trace options before the config is parsed.
+        from direwolf_monitor.utils import trace
+
+        CONF = cfg.CONF
         ctx = args[0]
         ctx.ensure_object(dict)
         if kwargs['config_file']:
@@ -85,6 +92,8 @@ def process_standard_options(f: F) -> F:
 def process_standard_options_no_config(f: F) -> F:
     """Use this as a decorator when config isn't needed."""
     def new_func(*args, **kwargs):
+        from direwolf_monitor.logging import log
+
         ctx = args[0]
         ctx.ensure_object(dict)
         ctx.obj["loglevel"] = kwargs["loglevel"]
@@ -0,0 +1,205 @@
+import logging
+import signal
+import sys
+
+import click
+
+from direwolf_monitor import cli_helper
+from direwolf_monitor.cli import cli
+from direwolf_monitor.utils import broker as broker_utils
+from direwolf_monitor.utils import metrics as metrics_utils
+from direwolf_monitor.utils import traffic as traffic_utils
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_STATUS_INTERVAL = 5
+
+
+def _mix(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return traffic_utils.parse_mix(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Append the generated lines to this file, for log-to-mqtt "
+         "--direwolf-log to tail",
+)
+@click.option(
+    "--broker-port",
+    default=0,
+    show_default=True,
+    help="Run an MQTT broker stand-in on this port, 0 for none.  Without "
+         "--output the lines are published to it directly",
+)
+@click.option(
+    "--broker-host",
+    default=broker_utils.DEFAULT_HOST,
+    show_default=True,
+    help="Address the broker stand-in listens on",
+)
+@click.option(
+    "--broker-queue-size",
+    default=broker_utils.DEFAULT_QUEUE_SIZE,
+    show_default=True,
+    help="Messages queued per subscriber before the broker drops them",
+)
+@click.option(
+    "--mqtt-topic",
+    envvar="DWM_MQTT_TOPIC",
+    default="direwolf",
+    show_envvar=True,
+    show_default=True,
+    help="The topic to publish lines to when publishing directly",
+)
+@click.option(
+    "--rate",
+    type=click.FloatRange(min=0, min_open=True),
+    default=traffic_utils.DEFAULT_RATE,
+    show_default=True,
+    help="Packets per second",
+)
+@click.option(
+    "--ramp",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="Add this many packets per second to the rate every --ramp-interval seconds",
+)
+@click.option(
+    "--ramp-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=traffic_utils.DEFAULT_RAMP_INTERVAL,
+    show_default=True,
+    help="Seconds between rate increases",
+)
+@click.option(
+    "--duration",
+    default=0.0,
+    show_default=True,
+    help="Stop after this many seconds, 0 to run until interrupted",
+)
+@click.option(
+    "--mix",
+    callback=_mix,
+    help="Relative weights of the kinds of traffic, e.g. 'position=5,mic-e=3,ig=1'.  "
+         f"Kinds: {', '.join(traffic_utils.KINDS)}",
+)
+@click.option(
+    "--stations",
+    default=traffic_utils.DEFAULT_STATIONS,
+    show_default=True,
+    help="How many different stations are heard",
+)
+@click.option(
+    "--latitude",
+    envvar="DWM_LATITUDE",
+    show_envvar=True,
+    default=traffic_utils.DEFAULT_LATITUDE,
+    show_default=True,
+    help="Latitude the stations are around",
+)
+@click.option(
+    "--longitude",
+    envvar="DWM_LONGITUDE",
+    show_envvar=True,
+    default=traffic_utils.DEFAULT_LONGITUDE,
+    show_default=True,
+    help="Longitude the stations are around",
+)
+@click.option(
+    "--timestamps/--no-timestamps",
+    default=False,
+    show_default=True,
+    help="Add direwolf -T style timestamps to received packets",
+)
+@click.option(
+    "--chatter/--no-chatter",
+    default=True,
+    show_default=True,
+    help="Add the audio level and blank lines direwolf prints around packets",
+)
+@click.option(
+    "--seed",
+    type=int,
+    help="Seed for a repeatable sequence of packets",
+)
+@click.option(
+    "--status-interval",
+    default=DEFAULT_STATUS_INTERVAL,
+    show_default=True,
+    help="Log the generated and broker rates every this many seconds, 0 for never",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def generate(ctx, output, broker_port, broker_host, broker_queue_size, mqtt_topic, rate,
+             ramp, ramp_interval, duration, mix, stations, latitude, longitude,
+             timestamps, chatter, seed, status_interval):
+    """Generate synthetic direwolf traffic for load tests.
+
+    Writes made up direwolf log lines to a file for log-to-mqtt to tail,
+    or publishes them to a built in MQTT broker stand-in, which
+    mqtt-to-terminal can subscribe to.  With both, log-to-mqtt can
+    publish to the stand-in for an end to end test on one machine:
+
+    \b
+        dwm generate --output /tmp/dw.log --broker-port 1884 --ramp 50
+        dwm log-to-mqtt --direwolf-log /tmp/dw.log --mqtt-host localhost --mqtt-port 1884
+        dwm mqtt-to-terminal --mqtt-host localhost --mqtt-port 1884 --headless
+    """
+    console = ctx.obj['console']
+    if not output and not broker_port:
+        raise click.UsageError("Give --output, --broker-port or both")
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+
+    traffic = traffic_utils.Traffic(
+        mix=mix, stations=stations, latitude=latitude, longitude=longitude,
+        timestamps=timestamps, chatter=chatter, seed=seed,
+    )
+    metrics = metrics_utils.Metrics("generate")
+    broker = None
+    if broker_port:
+        broker = broker_utils.Broker(
+            port=broker_port, host=broker_host, queue_size=broker_queue_size,
+            metrics=metrics,
+        ).start()
+    generated = metrics.counter("generated", "Packets generated")
+    metrics.gauge("rate", lambda: traffic.rate, "Target packets per second")
+
+    out = open(output, "ab") if output else None
+    if out:
+        def _emit(lines):
+            out.writelines(lines)
+            out.flush()
+            generated.inc(sum(1 for line in lines if line[:1] == b"["))
+    else:
+        def _emit(lines):
+            for line in lines:
+                if line.strip():
+                    broker.publish(mqtt_topic, line)
+            generated.inc(sum(1 for line in lines if line[:1] == b"["))
+
+    where = f"{output}" if out else f"topic {mqtt_topic}"
+    console.print(f"Generating {rate:g} packets/s to {where}")
+    metrics.start(log_interval=status_interval)
+    try:
+        traffic.run(
+            _emit, rate=rate, duration=duration, ramp=ramp, ramp_interval=ramp_interval,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.close()
+        if out:
+            out.close()
+        console.print(f"{traffic.line()}, {traffic.behind:.2f}s behind at the end")
+        if broker:
+            console.print(broker.line())
+            broker.close()
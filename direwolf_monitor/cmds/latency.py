@@ -0,0 +1,64 @@
+import logging
+import urllib.error
+import urllib.request
+
+import click
+from rich.table import Table
+
+from direwolf_monitor import cli_helper
+from direwolf_monitor.cli import cli
+from direwolf_monitor.utils import latency as latency_utils
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--metrics-port",
+    envvar="DWM_METRICS_PORT",
+    show_envvar=True,
+    required=True,
+    type=int,
+    help="The --metrics-port of the log-to-mqtt or mqtt-to-terminal to ask",
+)
+@click.option(
+    "--metrics-host",
+    default=metrics_utils.DEFAULT_HOST,
+    show_default=True,
+    help="The --metrics-host it serves metrics on",
+)
+@click.option(
+    "--timeout",
+    default=5.0,
+    show_default=True,
+    help="Seconds to wait for the metrics",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def latency(ctx, metrics_port, metrics_host, timeout):
+    """Show the per stage latency of a running dwm started with --trace-latency."""
+    console = ctx.obj['console']
+    url = f"http://{metrics_host}:{metrics_port}/metrics"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            text = response.read().decode("UTF-8")
+    except (urllib.error.URLError, OSError) as e:
+        raise click.ClickException(f"Failed to read {url}: {e}") from e
+
+    histograms = latency_utils.from_prometheus(text)
+    if not histograms:
+        raise click.ClickException(f"No latency histograms at {url}, is --trace-latency set?")
+    rows = latency_utils.histogram_rows(histograms)
+    out = Table(title=f"Latency per stage, {url}")
+    out.add_column("Stage", style="#C70039")
+    out.add_column("Count", justify="right")
+    for q in latency_utils.QUANTILES:
+        out.add_column(f"p{round(q * 100)}", justify="right")
+    out.add_column("Mean", justify="right")
+    for stage, count, quantiles, mean in rows:
+        out.add_row(
+            stage, str(count), *(f"{value * 1000:.2f} ms" for value in quantiles + [mean]),
+        )
+    console.print(out)
@@ -1,6 +1,9 @@
+import contextlib
 import logging
 from pathlib import Path
-import re
+import signal
+import socket
+import sys
 import time
 from typing import Iterator
 
@@ -12,11 +15,123 @@ from paho.mqtt.properties import Properties
 
 from direwolf_monitor.cli import cli
 from direwolf_monitor import cli_helper
-from direwolf_monitor.utils import packet as packet_utils
+from direwolf_monitor.utils import batch
+from direwolf_monitor.utils import cache as cache_utils
+from direwolf_monitor.utils import checkpoint
+from direwolf_monitor.utils import dedup
+from direwolf_monitor.utils import filters
+from direwolf_monitor.utils import latency as latency_utils
+from direwolf_monitor.utils import metrics as metrics_utils
+from direwolf_monitor.utils import pipeline
+from direwolf_monitor.utils import processor as processor_utils
+from direwolf_monitor.utils import record as record_utils
+from direwolf_monitor.utils import spool
+from direwolf_monitor.utils import stations as stations_utils
+from direwolf_monitor.utils import stats
+from direwolf_monitor.utils import tail
+from direwolf_monitor.utils import topics
 
 
 LOG = logging.getLogger("dwm")
 
+headless_options = [
+    click.option(
+        "--headless",
+        is_flag=True,
+        default=False,
+        help="Don't print anything per line, log a periodic summary instead",
+    ),
+    click.option(
+        "--summary-interval",
+        default=stats.DEFAULT_INTERVAL,
+        show_default=True,
+        help="Seconds between summary lines in --headless mode",
+    ),
+]
+
+metrics_options = [
+    click.option(
+        "--metrics-port",
+        envvar="DWM_METRICS_PORT",
+        show_envvar=True,
+        default=0,
+        show_default=True,
+        help="Serve Prometheus metrics on this local HTTP port, 0 for none",
+    ),
+    click.option(
+        "--metrics-host",
+        default=metrics_utils.DEFAULT_HOST,
+        show_default=True,
+        help="Address to serve metrics on",
+    ),
+    click.option(
+        "--metrics-interval",
+        envvar="DWM_METRICS_INTERVAL",
+        show_envvar=True,
+        default=0,
+        show_default=True,
+        help="Log throughput and latency metrics every this many seconds, 0 for never",
+    ),
+]
+
+latency_options = [
+    click.option(
+        "--trace-latency",
+        envvar="DWM_TRACE_LATENCY",
+        show_envvar=True,
+        is_flag=True,
+        default=False,
+        help="Time each line through read, publish, deliver, parse and "
+             "render.  Send SIGUSR1 or run `dwm latency` to see the histograms",
+    ),
+]
+
+
+def _template(ctx, param, value):
+    try:
+        topics.validate_template(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+    return value
+
+
+def _filters(ctx, param, value):
+    for topic_filter in value:
+        try:
+            topics.validate_filter(topic_filter)
+        except ValueError as e:
+            raise click.BadParameter(str(e)) from e
+    return value
+
+
+def _start_metrics(metrics, port, host, interval):
+    """Start sampling `metrics`, and serve them if a port is given."""
+    metrics.start(log_interval=interval)
+    if not port:
+        return None
+    return metrics_utils.MetricsServer(metrics, port, host=host).start()
+
+
+def _stop_metrics(metrics, server):
+    if server:
+        server.close()
+    metrics.close()
+
+
+def _start_latency(metrics):
+    """Return a latency tracker that is logged on SIGUSR1."""
+    tracker = latency_utils.Tracker(metrics)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda sig, frame: tracker.log())
+    return tracker
+
+
+class _NullStatus:
+    """Stands in for a Rich status in --headless mode."""
+
+    def update(self, *args, **kwargs):
+        pass
+
 
 def follow(file, sleep_sec=0.1) -> Iterator[str]:
     """ Yield each line from a file as they are written.
@@ -47,7 +162,12 @@ def _on_message(client, userdata, flags, rc, properties):
             
 def _create_mqtt_client(ctx, mqtt_host, mqtt_port, mqtt_username, mqtt_password,
                         client_id, on_connect=None, on_connect_fail=None,
-                        on_disconnect=None, on_message=None):
+                        on_disconnect=None, on_message=None, connect_async=False):
+    """Create a paho MQTTv5 client and connect it.
+
+    With `connect_async` the connection is only made once the network
+    loop is started, so a broker that is down at startup isn't fatal.
+    """
     console = ctx.obj['console']
     
     client = mqtt.Client(
@@ -74,7 +194,8 @@ def _create_mqtt_client(ctx, mqtt_host, mqtt_port, mqtt_username, mqtt_password,
     properties = Properties(PacketTypes.CONNECT)
     properties.SessionExpiryInterval = 30 * 60  # in seconds
     console.print(f"Connecting to mqtt://{mqtt_host}:{mqtt_port}")
-    client.connect(
+    connect = client.connect_async if connect_async else client.connect
+    connect(
         mqtt_host,
         port=mqtt_port,
         # clean_start=mqtt.MQTT_CLEAN_START_FIRST_ONLY,
@@ -84,6 +205,100 @@ def _create_mqtt_client(ctx, mqtt_host, mqtt_port, mqtt_username, mqtt_password,
     return client
 
 
+def _create_sender(client, mqtt_topic, summary=None, metrics=None, read_times=None,
+                   tracker=None, encoder=None, router=None, partial=False):
+    """Return a ``send(payload, count)`` that publishes to `mqtt_topic`.
+
+    Payloads holding more than one line are tagged with the batch
+    ``lines`` user property.  Returns True if paho accepted the message,
+    otherwise counts a failure in `summary`.  With `metrics`, the time
+    each publish takes and the failures are recorded there.
+
+    `read_times`, a :class:`~direwolf_monitor.utils.latency.ReadTimes`,
+    says when each payload's first line was read.  Lines drained from
+    the spool that it has forgotten use the time they were spooled
+    instead, passed as `spooled`.  With `tracker` as well, payloads
+    carry when their first line was read and when they were published,
+    and `tracker` records the time spent in between.
+
+    With `encoder`, a :class:`~direwolf_monitor.utils.record.Encoder`,
+    the lines are parsed and published as records instead, stamped
+    with when they were read.  Payloads without any packets in them
+    aren't published at all.
+
+    With `router`, a :class:`~direwolf_monitor.utils.topics.Router`,
+    each packet goes to its own topic instead of `mqtt_topic`.  A batch
+    is published as one message per run of lines with the same topic,
+    stopping at the first that fails.  The batch counts as failed,
+    unless with `partial` it returns how many of its lines came before
+    that run, so a :class:`~direwolf_monitor.utils.spool.SpoolingPublisher`
+    only spools what didn't go out.
+    """
+    metrics = metrics if metrics is not None else metrics_utils.Metrics()
+    latency = metrics.histogram("publish_seconds", "Seconds to hand a message to paho")
+    failures = metrics.counter("publish_failures", "Messages paho didn't accept")
+
+    def _publish(topic, payload, count, read):
+        lines = payload
+        if encoder is not None:
+            payload, count = encoder.encode(payload, read)
+            if not count:
+                return True
+        properties = None
+        if count > 1 or tracker is not None or encoder is not None:
+            properties = Properties(PacketTypes.PUBLISH)
+        if count > 1:
+            properties.UserProperty = (batch.LINES_PROPERTY, str(count))
+        if encoder is not None:
+            properties.ContentType = encoder.content_type
+        if tracker is not None:
+            published = time.time()
+            properties.UserProperty = latency_utils.user_properties(read, published)
+            tracker.record(latency_utils.origin(lines, published), read, published)
+        start = time.perf_counter()
+        info = client.publish(topic, payload=payload, qos=0, properties=properties)
+        latency.observe(time.perf_counter() - start)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            if summary:
+                summary.failures += 1
+            failures.inc()
+            return False
+        return True
+
+    def _send(payload, count=1, spooled=None):
+        read = None
+        if read_times is not None:
+            read = read_times.take(payload, count)
+        if read is None:
+            read = spooled
+        if router is None:
+            return _publish(mqtt_topic, payload, count, read)
+        for topic, lines, lines_count, start in router.route(payload):
+            if not _publish(topic, lines, lines_count, read):
+                return start if partial else False
+        return True
+
+    return _send
+
+
+def _create_batcher(publish, status, my_file, max_lines, max_bytes, max_delay,
+                    on_published=None, headless=False):
+    """Batcher that hands batches to `publish` and reports once per batch."""
+
+    def _publish(payload, count):
+        sent = publish(payload, count)
+        if not headless:
+            status.update(f"Read {batcher.lines} lines from {my_file}")
+            print(f"Published batch of {count} lines")
+        return sent
+
+    batcher = batch.Batcher(
+        _publish, max_lines=max_lines, max_bytes=max_bytes, max_delay=max_delay,
+        on_published=on_published,
+    )
+    return batcher
+
+
 @cli.command()
 @cli_helper.add_options(cli_helper.common_options)
 @click.option(
@@ -123,20 +338,207 @@ def _create_mqtt_client(ctx, mqtt_host, mqtt_port, mqtt_username, mqtt_password,
     show_default=True,
     help="The direwolf log path and filename"
 )
+@click.option(
+    "--no-inotify",
+    is_flag=True,
+    default=False,
+    help="Poll the direwolf log for changes instead of using inotify",
+)
+@click.option(
+    "--batch/--no-batch",
+    "batch_mode",
+    default=False,
+    show_default=True,
+    help="Group lines into one MQTT payload per batch, separated by newlines",
+)
+@click.option(
+    "--batch-lines",
+    default=batch.DEFAULT_MAX_LINES,
+    show_default=True,
+    help="Publish a batch once it holds this many lines",
+)
+@click.option(
+    "--batch-bytes",
+    default=batch.DEFAULT_MAX_BYTES,
+    show_default=True,
+    help="Publish a batch once it holds this many bytes",
+)
+@click.option(
+    "--batch-delay",
+    default=batch.DEFAULT_MAX_DELAY,
+    show_default=True,
+    help="Publish a batch this many seconds after its first line",
+)
+@click.option(
+    "--spool",
+    "spool_file",
+    envvar="DWM_SPOOL",
+    show_envvar=True,
+    default=None,
+    help="Spool lines to this file while the MQTT broker is unreachable",
+)
+@click.option(
+    "--spool-max-bytes",
+    default=spool.DEFAULT_MAX_BYTES,
+    show_default=True,
+    help="Drop the oldest spooled lines once the spool reaches this size",
+)
+@click.option(
+    "--spool-max-age",
+    default=spool.DEFAULT_MAX_AGE,
+    show_default=True,
+    help="Drop spooled lines older than this many seconds",
+)
+@click.option(
+    "--spool-drain-rate",
+    default=spool.DEFAULT_DRAIN_RATE,
+    show_default=True,
+    help="Max lines per second to publish when draining the spool",
+)
+@click.option(
+    "--checkpoint",
+    "checkpoint_file",
+    envvar="DWM_CHECKPOINT",
+    show_envvar=True,
+    default=None,
+    help="Save the position of the last published line here, to resume from on restart",
+)
+@click.option(
+    "--checkpoint-interval",
+    default=checkpoint.DEFAULT_INTERVAL,
+    show_default=True,
+    help="Seconds between checkpoint writes",
+)
+@click.option(
+    "--start-from",
+    type=click.Choice(checkpoint.START_CHOICES, case_sensitive=False),
+    default=checkpoint.START_CHECKPOINT,
+    show_default=True,
+    help="Where to start reading the log.  'checkpoint' falls back to "
+         "'end' when there is no checkpoint",
+)
+@click.option(
+    "--catch-up-rate",
+    default=checkpoint.DEFAULT_CATCH_UP_RATE,
+    show_default=True,
+    help="Max lines per second to publish while catching up on old log lines",
+)
+@click.option(
+    "--pipeline/--no-pipeline",
+    "pipeline_mode",
+    default=False,
+    show_default=True,
+    help="Read the log and publish on separate threads, with a queue between them",
+)
+@click.option(
+    "--queue-size",
+    default=pipeline.DEFAULT_MAXSIZE,
+    show_default=True,
+    help="Max lines queued between the reader and the publisher",
+)
+@click.option(
+    "--overflow",
+    type=click.Choice(pipeline.OVERFLOW_CHOICES, case_sensitive=False),
+    default=pipeline.OVERFLOW_BLOCK,
+    show_default=True,
+    help="What to do when the queue is full.  'spill' needs --spool",
+)
+@click.option(
+    "--shard-topics/--no-shard-topics",
+    envvar="DWM_SHARD_TOPICS",
+    show_envvar=True,
+    default=False,
+    show_default=True,
+    help="Publish each packet to its own topic under --mqtt-topic, by "
+         "station, kind, packet type and sender, so subscribers can filter "
+         "with wildcards.  Lines that aren't packets aren't published",
+)
+@click.option(
+    "--topic-template",
+    envvar="DWM_TOPIC_TEMPLATE",
+    show_envvar=True,
+    default=topics.DEFAULT_TEMPLATE,
+    show_default=True,
+    callback=_template,
+    help="The topics --shard-topics publishes to",
+)
+@click.option(
+    "--station",
+    envvar="DWM_STATION",
+    show_envvar=True,
+    help="Name of this direwolf in sharded topics  [default: the host name]",
+)
+@click.option(
+    "--publish-format",
+    envvar="DWM_PUBLISH_FORMAT",
+    show_envvar=True,
+    type=click.Choice(record_utils.FORMAT_CHOICES, case_sensitive=False),
+    default=record_utils.FORMAT_RAW,
+    show_default=True,
+    help="Publish the log lines as they are, or parse them here and publish "
+         "structured records so subscribers don't have to.  msgpack needs "
+         "the msgpack package",
+)
+@cli_helper.add_options(headless_options)
+@cli_helper.add_options(metrics_options)
+@cli_helper.add_options(latency_options)
 @click.pass_context
 @cli_helper.process_standard_options
-def log_to_mqtt(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password, direwolf_log):
+def log_to_mqtt(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password, direwolf_log,
+                no_inotify, batch_mode, batch_lines, batch_bytes, batch_delay,
+                spool_file, spool_max_bytes, spool_max_age, spool_drain_rate,
+                checkpoint_file, checkpoint_interval, start_from, catch_up_rate,
+                pipeline_mode, queue_size, overflow, shard_topics, topic_template,
+                station, publish_format, headless,
+                summary_interval, metrics_port, metrics_host, metrics_interval,
+                trace_latency):
     """Tail direwolf.log and put entries in MQTT
 
     Args:
         ctx (_type_): _description_
     """
     console = ctx.obj['console']
+    # Run the finally blocks below on SIGTERM (systemd stop) so the
+    # checkpoint, spool and queued lines are flushed.
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    if pipeline_mode and overflow == pipeline.OVERFLOW_SPILL and not spool_file:
+        console.print("[bold red]--overflow spill needs --spool to be set.[/]")
+        return
+    if publish_format == record_utils.FORMAT_MSGPACK and not record_utils.have_msgpack():
+        console.print("[bold red]--publish-format msgpack needs msgpack, pip install msgpack.[/]")
+        return
     msg = f"Checking for direwolf log {direwolf_log}"
-    with console.status(msg) as status:
+    status_ctx = contextlib.nullcontext(_NullStatus()) if headless else console.status(msg)
+    with status_ctx as status:
         my_file = Path(direwolf_log)
         if my_file.is_file():
             
+            spooler = None
+            pipe = None
+            summary = stats.Summary(
+                "log_to_mqtt", interval=summary_interval,
+                depth=lambda: pipe.depth if pipe else 0,
+            )
+            metrics = metrics_utils.Metrics("log_to_mqtt")
+            lines_read = metrics.counter("lines", "Lines read from the log")
+            metrics.gauge("queue", lambda: pipe.depth if pipe else 0, "Lines queued to publish")
+            read_times = tracker = None
+            if trace_latency:
+                tracker = _start_latency(metrics)
+            # Records are stamped with when their line was read.
+            if trace_latency or publish_format != record_utils.FORMAT_RAW:
+                read_times = latency_utils.ReadTimes()
+
+            def _log_on_connect(client, userdata, flags, rc, properties):
+                _on_connect(client, userdata, flags, rc, properties)
+                if spooler and not rc.is_failure:
+                    spooler.connected()
+
+            def _log_on_disconnect(client, userdata, flags, rc, properties):
+                _on_disconnect(client, userdata, flags, rc, properties)
+                if spooler:
+                    spooler.disconnected()
+
             # Create mqtt client connection
             status.update("Creating MQTT connection")
             client = _create_mqtt_client(
@@ -145,25 +547,131 @@ def log_to_mqtt(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_passw
                 int(mqtt_port),
                 mqtt_username,
                 mqtt_password,
-                "direwolf-monitor-log"
+                "direwolf-monitor-log",
+                on_connect=_log_on_connect,
+                on_disconnect=_log_on_disconnect,
+                connect_async=bool(spool_file),
             )
+            encoder = None
+            if publish_format != record_utils.FORMAT_RAW:
+                encoder = record_utils.Encoder(publish_format, metrics=metrics)
+                summary.extra = encoder.line
+            router = None
+            if shard_topics:
+                router = topics.Router(
+                    mqtt_topic, station or socket.gethostname().split(".")[0],
+                    template=topic_template, metrics=metrics,
+                )
+                LOG.info(f"Publishing to {topic_template}")
+            publish = _create_sender(
+                client, mqtt_topic, summary, metrics, read_times=read_times, tracker=tracker,
+                encoder=encoder, router=router, partial=bool(spool_file),
+            )
+            if spool_file:
+                spooler = spool.SpoolingPublisher(
+                    publish,
+                    spool.Spool(spool_file, max_bytes=spool_max_bytes,
+                                max_age=spool_max_age),
+                    drain_rate=spool_drain_rate,
+                )
+                publish = spooler.publish
+            # The network loop keeps the connection alive and reconnects
+            # after the broker goes away.
+            client.reconnect_delay_set(min_delay=1, max_delay=60)
+            client.loop_start()
 
             status.update(f"Opening file {my_file} for reading") 
             line_number = 0
-            with open(my_file, 'r') as file:
-                # now move the pointer to the end of the file
-                status.update(f"Reading line {line_number} from {my_file}")
-                file.seek(0, 2)
-                for line in follow(file):
-                    status.update(f"Reading line {line_number} from {my_file}")
-                    line_number += 1
-                    #print(line, end='')
-                    print(f"Published {line}", end='')
-                    client.publish(
-                        mqtt_topic,
-                        payload=line,
-                        qos=0
+            # Follow the file across rotations, starting at the end
+            # unless we're resuming.
+            tailer = tail.Tailer(
+                my_file, use_inotify=not no_inotify,
+                from_end=(start_from != checkpoint.START_START),
+            )
+            LOG.info(f"Watching {my_file} using {tailer.watcher.kind}")
+            cursor = None
+            if checkpoint_file:
+                cursor = checkpoint.Checkpoint(checkpoint_file, interval=checkpoint_interval)
+                saved = cursor.load()
+                cursor.start()
+                if saved and start_from == checkpoint.START_CHECKPOINT:
+                    LOG.info(f"Resuming {my_file} from checkpoint {saved}")
+                    tailer.resume(*saved)
+            # Old lines are published no faster than --catch-up-rate
+            # until we first reach the end of the file.
+            limiter = checkpoint.RateLimiter(catch_up_rate)
+            catching_up = tailer.lag > 0
+
+            status.update(f"Reading line {line_number} from {my_file}")
+            if batch_mode:
+                batcher = _create_batcher(
+                    publish, status, my_file,
+                    batch_lines, batch_bytes, batch_delay,
+                    on_published=(lambda c: cursor.update(*c)) if cursor else None,
+                    headless=headless,
+                )
+
+            def _deliver(line, position):
+                nonlocal line_number
+                summary.count(len(line))
+                lines_read.inc()
+                if batch_mode:
+                    batcher.add(line, position)
+                    return
+                if headless:
+                    if publish(line, 1) and cursor and position:
+                        cursor.update(*position)
+                    return
+                status.update(f"Reading line {line_number} from {my_file}{_queue_status()}")
+                line_number += 1
+                #print(line, end='')
+                print(f"Published {line.decode('UTF-8', errors='replace')}", end='')
+                if publish(line, 1) and cursor and position:
+                    cursor.update(*position)
+
+            if pipeline_mode:
+                spill = None
+                if overflow == pipeline.OVERFLOW_SPILL:
+                    spill = spool.Spool(
+                        f"{spool_file}.overflow", max_bytes=spool_max_bytes,
+                        max_age=spool_max_age,
                     )
+                pipe = pipeline.Pipeline(
+                    _deliver, maxsize=queue_size, overflow=overflow, spill=spill,
+                )
+
+            def _queue_status():
+                if not pipe:
+                    return ""
+                return f" (queue {pipe.depth}, dropped {pipe.dropped}, spilled {pipe.spilled})"
+
+            deliver = pipe.put if pipe else _deliver
+            if headless:
+                summary.start()
+            metrics_server = _start_metrics(metrics, metrics_port, metrics_host, metrics_interval)
+            try:
+                for line in tailer.raw_lines():
+                    if catching_up:
+                        catching_up = not tailer.eof
+                        limiter.wait()
+                    if read_times is not None:
+                        read_times.read(line)
+                    deliver(line, (tailer.inode, tailer.offset))
+            finally:
+                tailer.close()
+                if pipe:
+                    pipe.close()
+                if batch_mode:
+                    batcher.close()
+                if cursor:
+                    cursor.close()
+                if spooler:
+                    spooler.close()
+                client.loop_stop()
+                _stop_metrics(metrics, metrics_server)
+                if tracker is not None:
+                    tracker.log()
+                summary.close()
         else:
             console.print(f"[bold red]{direwolf_log} doesn't exist.[/]")
             
@@ -204,6 +712,17 @@ def log_to_mqtt(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_passw
     show_envvar=True,
     help="The mqtt password for login",
 )
+@click.option(
+    "--subscribe",
+    "subscribe",
+    envvar="DWM_MQTT_SUBSCRIBE",
+    show_envvar=True,
+    multiple=True,
+    callback=_filters,
+    help="An MQTT topic filter to subscribe to, e.g. 'direwolf/+/rx/weather/#' "
+         "for a publisher using --shard-topics.  Can be given more than once.  "
+         "[default: --mqtt-topic and everything under it]",
+)
 @click.option(
     "--latitude",
     envvar="DWM_LATITUDE",
@@ -216,10 +735,97 @@ def log_to_mqtt(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_passw
     show_envvar=True,
     help="GPS Longitude of the direwolf instance"
 )
+@click.option(
+    "--filter",
+    "filter_expressions",
+    envvar="DWM_FILTER",
+    show_envvar=True,
+    multiple=True,
+    help="Only show packets matching all of these terms: call:GLOB,... "
+         "type:TYPE,... kind:rx|tx|ig|ig>tx text:WORD radius:MILES "
+         "bbox:SOUTH,WEST,NORTH,EAST.  Prefix a term with ! to negate it.  "
+         "Can be given more than once",
+)
+@click.option(
+    "--parse-cache-size",
+    envvar="DWM_PARSE_CACHE_SIZE",
+    show_envvar=True,
+    default=cache_utils.DEFAULT_MAX_ENTRIES,
+    show_default=True,
+    help="Remember this many parsed packets, 0 to parse every packet",
+)
+@click.option(
+    "--parse-cache-ttl",
+    default=cache_utils.DEFAULT_TTL,
+    show_default=True,
+    help="Seconds a parsed (or unparseable) packet is remembered",
+)
+@click.option(
+    "--dedup-window",
+    envvar="DWM_DEDUP_WINDOW",
+    show_envvar=True,
+    default=dedup.DEFAULT_WINDOW,
+    show_default=True,
+    help="Show only the first copy of a packet heard within this many "
+         "seconds (digipeated, or via APRS-IS with --dedup-kind ig), 0 to "
+         "show every copy",
+)
+@click.option(
+    "--dedup-kind",
+    "dedup_kinds",
+    type=click.Choice(dedup.KIND_CHOICES, case_sensitive=False),
+    multiple=True,
+    default=dedup.DEFAULT_KINDS,
+    show_default=True,
+    help="Line kinds to drop copies of, repeat for more than one",
+)
+@click.option(
+    "--workers",
+    envvar="DWM_WORKERS",
+    show_envvar=True,
+    default=0,
+    show_default=True,
+    help="Parse packets in this many worker processes, 0 to parse in the "
+         "MQTT thread",
+)
+@click.option(
+    "--chunk-size",
+    default=processor_utils.DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Most lines sent to a worker at once",
+)
+@click.option(
+    "--max-stations",
+    envvar="DWM_MAX_STATIONS",
+    show_envvar=True,
+    default=stations_utils.DEFAULT_MAX_STATIONS,
+    show_default=True,
+    help="Remember this many heard stations, 0 to not keep a station table",
+)
+@click.option(
+    "--station-max-age",
+    default=stations_utils.DEFAULT_MAX_AGE,
+    show_default=True,
+    help="Forget stations not heard for this many seconds, 0 to never",
+)
+@click.option(
+    "--stations-file",
+    envvar="DWM_STATIONS_FILE",
+    show_envvar=True,
+    type=click.Path(dir_okay=False),
+    help="Save the station table here every minute and on exit, and "
+         "reload it on start.  See `dwm stations`",
+)
+@cli_helper.add_options(headless_options)
+@cli_helper.add_options(metrics_options)
+@cli_helper.add_options(latency_options)
 @click.pass_context
 @cli_helper.process_standard_options
 def mqtt_to_terminal(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_password,
-                    latitude, longitude):
+                    subscribe, latitude, longitude, filter_expressions, parse_cache_size,
+                    parse_cache_ttl, dedup_window, dedup_kinds, workers, chunk_size, max_stations,
+                    station_max_age, stations_file, headless, summary_interval, metrics_port,
+                    metrics_host, metrics_interval, trace_latency):
     """Pull direwolf log lines from mqtt and display them in the terminal!
 
     Args:
@@ -231,13 +837,15 @@ def mqtt_to_terminal(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_
         mqtt_password (_type_): _description_
     """
     console = ctx.obj['console']
+    subscriptions = topics.subscriptions(mqtt_topic, subscribe)
 
     def _rx_on_connect(client, userdata, flags, rc, properties):
         console.print(f"Connected with result code {rc}")
         console.print(f"userdata: {userdata}")
         console.print(f"flags: {flags}")
-        client.subscribe(mqtt_topic)
-        console.print(f"Subscribed to topic {mqtt_topic}")
+        for topic_filter in subscriptions:
+            client.subscribe(topic_filter)
+            console.print(f"Subscribed to topic {topic_filter}")
         
     def _rx_on_connect_fail(client, userdata):
         console.print("Failed to connect to MQTT host")
@@ -246,74 +854,53 @@ def mqtt_to_terminal(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_
         console.print(f"Disconnected from mqtt server {mqtt_host} result code: {rc}")
         console.print(f"userdata: {userdata}")
         
-    def _rx_on_message(client, userdata, msg):
-        # console.out(f"{msg.topic} msg '{msg.payload}'")
-        line = msg.payload.decode('UTF-8').strip()
-        #console.out(f"RAW line = '{line}'")
-        search = re.search("^\[\d\.*\d*\] (.*)", line)
-        if search is not None:
-            packetstring = search.group(1)
-            packetstring = packetstring.replace('<0x0d>','\x0d'). \
-                replace('<0x1c>','\x1c').replace('<0x1e>','\x1e'). \
-                replace('<0x1f>','\0x1f').replace('<0x0a>','\0x0a')
-            packet = packet_utils.parse_packet(packetstring)
-            if packet:
-                #aprsd_log.log(packet)
-                packet_utils.packet_print(ctx, packet, latitude=latitude, longitude=longitude)
-            #console.print(packet)
-        elif "[0L]" in line:
-            # packet that direwolf Transmitted
-            raw = line.replace("[0L]", "").strip()
-            #console.print(f"OL {raw}")
-            packet = packet_utils.parse_packet(raw)
-            if packet:
-                #aprsd_log.log(packet, tx=True)
-                packet_utils.packet_print(ctx, packet, latitude=latitude, longitude=longitude, tx=True)
-        # elif "[0H]" in line:
-            # packet RX'd already covered?
-            # raw = line.replace("[0H]", "").strip()
-            # console.print(f"IG {raw}")
-            # packet = _parse_packet(raw)
-            # if packet:
-            #     aprsd_log.log(packet)
-            return
-        elif "[ig]" in line:
-            # Packet sent to direwolf from APRSIS
-            # strip out the [ig]
-            raw = line.replace("[ig]", "").strip()
-            console.print(f"IG {raw}")
-            packet = packet_utils.parse_packet(raw)
-            if packet:
-                #aprsd_log.log(packet)
-                packet_utils.packet_print(ctx, packet, latitude=latitude, longitude=longitude)
-            #console.print(packet)
-        elif "[rx>ig]" in line:
-            # Got a line from RF and sent to APRSIS 
-            if line != "[rx>ig] #":
-                #console.print(f"RX->IG '{line}'")
-                pass
-            else:
-                pass
-                #console.out(f"Ignoring '{line}'")
-        elif "[ig>tx]" in line:
-            raw = line.replace("[ig>tx]", "").strip()
-            # console.print(f"IG>TX {raw}")
-            packet = packet_utils.parse_packet(raw)
-            if packet:
-                # aprsd_log.log(packet)
-                packet_utils.packet_print(
-                    ctx, packet, latitude=latitude, longitude=longitude,
-                    header="\[ig>tx]"
-                )
-            
-        elif 'ig_to_tx' in line:
-            # ignoring
-            # console.out(f"Ignoring '{line}'")
-            return
-        else:
-            # ignore
-            #console.print(f"Ignoring '{line}'")
-            return
+    summary = stats.Summary("mqtt_to_terminal", interval=summary_interval)
+    metrics = metrics_utils.Metrics("mqtt_to_terminal")
+    tracker = _start_latency(metrics) if trace_latency else None
+    try:
+        packet_filter = filters.compile(
+            filter_expressions, latitude=latitude, longitude=longitude, metrics=metrics,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--filter") from e
+    if packet_filter is not None:
+        LOG.info(f"Filtering with {', '.join(packet_filter.stages)}")
+    station_table = None
+    if max_stations > 0:
+        station_table = stations_utils.StationTable(
+            max_stations=max_stations, max_age=station_max_age, path=stations_file,
+        )
+    if workers > 0:
+        processor = processor_utils.PooledLineProcessor(
+            ctx, workers=workers, chunk_size=chunk_size,
+            cache_size=parse_cache_size, cache_ttl=parse_cache_ttl,
+            latitude=latitude, longitude=longitude, headless=headless,
+            summary=summary, dedup_window=dedup_window, dedup_kinds=dedup_kinds,
+            stations=station_table, metrics=metrics, latency=tracker,
+            packet_filter=packet_filter,
+        )
+    else:
+        parse_cache = None
+        if parse_cache_size > 0:
+            from direwolf_monitor.utils import packet as packet_utils
+            parse_cache = cache_utils.ParseCache(
+                packet_utils.parse_packet, max_entries=parse_cache_size,
+                ttl=parse_cache_ttl,
+            )
+        processor = processor_utils.LineProcessor(
+            ctx, latitude=latitude, longitude=longitude, headless=headless,
+            summary=summary, cache=parse_cache, dedup_window=dedup_window,
+            dedup_kinds=dedup_kinds, stations=station_table, metrics=metrics,
+            latency=tracker, packet_filter=packet_filter,
+        )
+    # Only now, once the worker processes are forked, start its thread.
+    if station_table is not None:
+        station_table.start()
+    summary.extra = processor.line
+    _rx_on_message = processor.on_message
+    if headless:
+        summary.start()
+    metrics_server = _start_metrics(metrics, metrics_port, metrics_host, metrics_interval)
 
     msg = f"Connecting to MQTT server {mqtt_host}"
     with console.status(msg) as status:
@@ -336,4 +923,13 @@ def mqtt_to_terminal(ctx, mqtt_host, mqtt_port, mqtt_topic, mqtt_username, mqtt_
         client.on_message = _rx_on_message
         client.connect(mqtt_host, mqtt_port, 60)
 
-    client.loop_forever(timeout=60)
\ No newline at end of file
+    try:
+        client.loop_forever(timeout=60)
+    finally:
+        processor.close()
+        if station_table is not None:
+            station_table.close()
+        _stop_metrics(metrics, metrics_server)
+        if tracker is not None:
+            tracker.log()
+        summary.close()
\ No newline at end of file
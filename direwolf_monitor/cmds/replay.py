@@ -0,0 +1,200 @@
+import contextlib
+import json
+import logging
+import os
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from direwolf_monitor import cli_helper
+from direwolf_monitor.cli import cli
+from direwolf_monitor.utils import cache as cache_utils
+from direwolf_monitor.utils import dedup, filters
+from direwolf_monitor.utils import processor as processor_utils
+from direwolf_monitor.utils import replay as replay_utils
+from direwolf_monitor.utils import stations as stations_utils
+
+LOG = logging.getLogger("dwm")
+
+SINK_TERMINAL = "terminal"
+SINK_DEVNULL = "devnull"
+SINK_NONE = "none"
+SINK_CHOICES = [SINK_TERMINAL, SINK_DEVNULL, SINK_NONE]
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--direwolf-log",
+    default="./direwolf.log",
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="The recorded direwolf log to replay",
+)
+@click.option(
+    "--speed",
+    default=replay_utils.DEFAULT_SPEED,
+    show_default=True,
+    help="Replay this many times faster than recorded, 0 for as fast as possible",
+)
+@click.option(
+    "--interval",
+    default=replay_utils.DEFAULT_INTERVAL,
+    show_default=True,
+    help="Seconds between lines of a log recorded without direwolf -T timestamps",
+)
+@click.option(
+    "--repeat",
+    default=1,
+    show_default=True,
+    help="Replay the log this many times.  Repeats are copies to "
+         "--dedup-window, set it to 0 to show them all",
+)
+@click.option(
+    "--sink",
+    type=click.Choice(SINK_CHOICES, case_sensitive=False),
+    default=SINK_DEVNULL,
+    show_default=True,
+    help="Where packets are rendered.  'devnull' renders them as the terminal "
+         "would but throws the output away, 'none' doesn't render at all",
+)
+@click.option(
+    "--latitude",
+    envvar="DWM_LATITUDE",
+    show_envvar=True,
+    help="GPS Latitude of the direwolf instance"
+)
+@click.option(
+    "--longitude",
+    envvar="DWM_LONGITUDE",
+    show_envvar=True,
+    help="GPS Longitude of the direwolf instance"
+)
+@click.option(
+    "--parse-cache-size",
+    envvar="DWM_PARSE_CACHE_SIZE",
+    show_envvar=True,
+    default=cache_utils.DEFAULT_MAX_ENTRIES,
+    show_default=True,
+    help="Remember this many parsed packets, 0 to parse every packet",
+)
+@click.option(
+    "--filter",
+    "filter_expressions",
+    envvar="DWM_FILTER",
+    show_envvar=True,
+    multiple=True,
+    help="Only show packets matching all of these terms, as mqtt-to-terminal --filter",
+)
+@click.option(
+    "--dedup-window",
+    envvar="DWM_DEDUP_WINDOW",
+    show_envvar=True,
+    default=dedup.DEFAULT_WINDOW,
+    show_default=True,
+    help="Show only the first copy of a packet heard within this many "
+         "seconds, 0 to show every copy",
+)
+@click.option(
+    "--dedup-kind",
+    "dedup_kinds",
+    type=click.Choice(dedup.KIND_CHOICES, case_sensitive=False),
+    multiple=True,
+    default=dedup.DEFAULT_KINDS,
+    show_default=True,
+    help="Line kinds to drop copies of, repeat for more than one",
+)
+@click.option(
+    "--max-stations",
+    envvar="DWM_MAX_STATIONS",
+    show_envvar=True,
+    default=stations_utils.DEFAULT_MAX_STATIONS,
+    show_default=True,
+    help="Remember this many heard stations, 0 to not keep a station table",
+)
+@click.option(
+    "--json", "as_json",
+    is_flag=True,
+    default=False,
+    help="Print the results as JSON instead of a table",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def replay(ctx, direwolf_log, speed, interval, repeat, sink, latitude, longitude,
+           parse_cache_size, filter_expressions, dedup_window, dedup_kinds, max_stations, as_json):
+    """Replay a recorded direwolf log and time each stage of showing it."""
+    console = ctx.obj['console']
+    from direwolf_monitor.utils import packet as packet_utils
+    try:
+        packet_filter = filters.compile(
+            filter_expressions, latitude=latitude, longitude=longitude,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--filter") from e
+
+    with open(direwolf_log, "rb") as f:
+        lines = f.readlines()
+
+    with contextlib.ExitStack() as stack:
+        sink_ctx = ctx
+        if sink == SINK_DEVNULL:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            # packet_print prints to stdout, not the console.
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            sink_ctx = click.Context(ctx.command, obj={
+                **ctx.obj, "console": Console(file=devnull, force_terminal=True, width=160),
+            })
+        parse_cache = None
+        if parse_cache_size > 0:
+            parse_cache = cache_utils.ParseCache(
+                packet_utils.parse_packet, max_entries=parse_cache_size,
+            )
+        station_table = None
+        if max_stations > 0:
+            station_table = stations_utils.StationTable(max_stations=max_stations)
+        processor = processor_utils.LineProcessor(
+            sink_ctx, latitude=latitude, longitude=longitude,
+            headless=(sink == SINK_NONE), cache=parse_cache,
+            dedup_window=dedup_window, dedup_kinds=dedup_kinds, stations=station_table,
+            packet_filter=packet_filter,
+        )
+        replayer = replay_utils.Replayer(processor, speed=speed, interval=interval)
+        for _ in range(repeat):
+            replayer.run(lines)
+        processor.close()
+
+    rows = replayer.report()
+    if as_json:
+        click.echo(json.dumps({
+            "log": direwolf_log,
+            "speed": speed,
+            "sink": sink,
+            "lines": replayer.lines,
+            "packets": replayer.packets,
+            "seconds": replayer.elapsed,
+            "stages": rows,
+        }, indent=2))
+        return
+
+    out = Table(title=replayer.line(), caption=processor.line() or None)
+    out.add_column("Stage", style="#C70039")
+    out.add_column("Count", justify="right")
+    out.add_column("Busy s", justify="right")
+    out.add_column("Per s", justify="right")
+    for q in replay_utils.QUANTILES:
+        out.add_column(f"p{round(q * 100)} ms", justify="right")
+    out.add_column("Mean ms", justify="right")
+    for row in rows:
+        per_second = row["per_second"]
+        out.add_row(
+            row["stage"], str(row["count"]), f"{row['seconds']:.3f}",
+            f"{per_second:,.0f}" if per_second else "",
+            *(_ms(row[f"p{round(q * 100)}"]) for q in replay_utils.QUANTILES),
+            _ms(row["mean"]),
+        )
+    console.print(out)
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.3f}"
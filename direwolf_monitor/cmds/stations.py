@@ -0,0 +1,188 @@
+import datetime
+import json
+import logging
+import time
+
+import click
+from rich.table import Table
+
+from direwolf_monitor import cli_helper, utils
+from direwolf_monitor.cli import cli
+from direwolf_monitor.utils import geo
+from direwolf_monitor.utils import stations as stations_utils
+
+LOG = logging.getLogger("dwm")
+
+SORT_LAST_HEARD = "last-heard"
+SORT_DISTANCE = "distance"
+SORT_PACKETS = "packets"
+SORT_CALLSIGN = "callsign"
+SORT_CHOICES = [SORT_LAST_HEARD, SORT_DISTANCE, SORT_PACKETS, SORT_CALLSIGN]
+
+
+def _select(table, since, latitude, longitude, radius, bbox, nearest):
+    """Return the stations heard in `since` seconds that match the filters."""
+    heard = table.heard(since)
+    if bbox:
+        inside = {station.callsign for station in table.in_bbox(*bbox, since=since)}
+        heard = [station for station in heard if station.callsign in inside]
+    if radius or nearest:
+        if latitude is None or longitude is None:
+            raise click.UsageError("--radius and --nearest need --latitude and --longitude")
+        latitude, longitude = float(latitude), float(longitude)
+        if radius:
+            near = {s.callsign for s, _ in table.within(latitude, longitude, radius, since=since)}
+            heard = [station for station in heard if station.callsign in near]
+        if nearest:
+            keep = {station.callsign for station in heard}
+            heard = [table.get(callsign) for callsign, _ in table.index.nearest(
+                latitude, longitude, nearest, accept=keep.__contains__,
+            )]
+    return heard
+
+
+def _rows(heard, latitude, longitude):
+    """Return ``(station, miles, bearing)`` for each station."""
+    if latitude is None or longitude is None:
+        return [(station, None, None) for station in heard]
+    placed = [station for station in heard if station.latitude is not None]
+    located = {}
+    if placed:
+        miles, bearings = geo.home(latitude, longitude).distances_bearings(
+            [station.latitude for station in placed],
+            [station.longitude for station in placed],
+        )
+        located = {
+            station.callsign: (float(m), float(b))
+            for station, m, b in zip(placed, miles, bearings, strict=True)
+        }
+    return [(station, *located.get(station.callsign, (None, None))) for station in heard]
+
+
+def _sort(rows, sort):
+    if sort == SORT_DISTANCE:
+        return sorted(rows, key=lambda row: (row[1] is None, row[1] or 0))
+    if sort == SORT_PACKETS:
+        return sorted(rows, key=lambda row: -row[0].packets)
+    if sort == SORT_CALLSIGN:
+        return sorted(rows, key=lambda row: row[0].callsign)
+    return rows
+
+
+@cli.command()
+@cli_helper.add_options(cli_helper.common_options)
+@click.option(
+    "--stations-file",
+    envvar="DWM_STATIONS_FILE",
+    show_envvar=True,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Station table saved by mqtt-to-terminal --stations-file",
+)
+@click.option(
+    "--since",
+    default=3600,
+    show_default=True,
+    help="Only stations heard in the last this many seconds, 0 for all",
+)
+@click.option(
+    "--latitude",
+    envvar="DWM_LATITUDE",
+    show_envvar=True,
+    help="GPS Latitude to measure distance from"
+)
+@click.option(
+    "--longitude",
+    envvar="DWM_LONGITUDE",
+    show_envvar=True,
+    help="GPS Longitude to measure distance from"
+)
+@click.option(
+    "--radius",
+    type=float,
+    help="Only stations within this many miles of --latitude/--longitude",
+)
+@click.option(
+    "--bbox",
+    type=(float, float, float, float),
+    default=None,
+    metavar="SOUTH WEST NORTH EAST",
+    help="Only stations inside this box, in decimal degrees",
+)
+@click.option(
+    "--nearest",
+    type=int,
+    help="Only this many stations, the nearest to --latitude/--longitude",
+)
+@click.option(
+    "--sort",
+    type=click.Choice(SORT_CHOICES, case_sensitive=False),
+    default=SORT_LAST_HEARD,
+    show_default=True,
+    help="Order of the stations",
+)
+@click.option(
+    "--limit",
+    default=0,
+    help="Show at most this many stations, 0 for all",
+)
+@click.option(
+    "--json", "as_json",
+    is_flag=True,
+    default=False,
+    help="Print the selected stations as a JSON snapshot instead of a table",
+)
+@click.pass_context
+@cli_helper.process_standard_options
+def stations(ctx, stations_file, since, latitude, longitude, radius, bbox, nearest,
+             sort, limit, as_json):
+    """Show the stations mqtt-to-terminal has heard."""
+    console = ctx.obj['console']
+    snapshot = stations_utils.load(stations_file)
+    if snapshot is None:
+        raise click.ClickException(f"{stations_file} is not a station snapshot")
+    table = stations_utils.StationTable(max_stations=len(snapshot["stations"]), max_age=0)
+    table.restore(snapshot)
+
+    heard = _select(table, since, latitude, longitude, radius, bbox, nearest)
+    rows = _sort(_rows(heard, latitude, longitude), sort)
+    if limit:
+        rows = rows[:limit]
+
+    if as_json:
+        selected = []
+        for station, miles, bearing in rows:
+            data = station.to_dict()
+            if miles is not None:
+                data["distance"] = miles
+                data["bearing"] = bearing
+            selected.append(data)
+        click.echo(json.dumps({**snapshot, "stations": selected}, indent=2))
+        return
+
+    now = time.time()
+    out = Table(title=f"{len(rows)} stations heard")
+    out.add_column("Callsign", style="#C70039")
+    out.add_column("Last heard", justify="right")
+    out.add_column("Packets", justify="right")
+    out.add_column("Types")
+    out.add_column("Position")
+    out.add_column("Distance", justify="right", style="#FF5733")
+    out.add_column("Path", style="dim")
+    for station, miles, bearing in rows:
+        ago = utils.strfdelta(datetime.timedelta(seconds=int(now - station.last_heard)))
+        types = ", ".join(
+            f"{name.replace('Packet', '')} {count}"
+            for name, count in sorted(station.counts.items(), key=lambda item: -item[1])
+        )
+        position = ""
+        if station.latitude is not None:
+            position = f"{station.latitude:.4f}, {station.longitude:.4f}"
+        distance = ""
+        if miles is not None:
+            distance = f"{utils.degrees_to_cardinal(bearing)} {miles:.1f} mi"
+        out.add_row(
+            station.callsign, ago, str(station.packets), types, position, distance,
+            ",".join(station.path),
+        )
+    console.print(out)
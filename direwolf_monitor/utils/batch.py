@@ -0,0 +1,166 @@
+"""Group direwolf log lines into batched MQTT payloads.
+
+Framing
+-------
+A payload published by ``log_to_mqtt`` is one or more direwolf log lines,
+each terminated by ``\\n``.  An unbatched payload is simply a batch of
+one.  direwolf escapes control characters in packets as ``<0xNN>``, so a
+raw newline never appears inside a line and consumers can split any
+payload with :func:`split_lines`.
+
+Batched payloads also carry an MQTTv5 user property ``lines`` with the
+number of lines in the batch, which lets a consumer size buffers or
+count without scanning the payload.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Union
+
+LOG = logging.getLogger("dwm")
+
+LINE_SEPARATOR = b"\n"
+LINES_PROPERTY = "lines"
+
+DEFAULT_MAX_LINES = 50
+DEFAULT_MAX_BYTES = 16 * 1024
+DEFAULT_MAX_DELAY = 0.05
+
+
+def split_raw_lines(payload: bytes) -> Iterator[bytes]:
+    """Yield each non-empty line of a payload as bytes, without decoding."""
+    for line in payload.split(LINE_SEPARATOR):
+        if line.strip():
+            yield line
+
+
+def split_lines(payload: Union[bytes, str]) -> Iterator[str]:
+    """Yield each non-empty line of a (possibly batched) payload."""
+    if isinstance(payload, bytes):
+        payload = payload.decode("UTF-8", errors="replace")
+    for line in payload.split("\n"):
+        line = line.strip()
+        if line:
+            yield line
+
+
+class Batcher:
+    """Collect lines and hand them to `publish` in batches.
+
+    A batch is sent as soon as it holds `max_lines` lines or `max_bytes`
+    bytes, or `max_delay` seconds after its first line arrived,
+    whichever comes first.  The delay is enforced by a background thread
+    so a quiet log never holds a line back for longer than `max_delay`.
+    `publish` runs without the buffer locked, so lines keep being added
+    while a slow broker or the spool holds up the last batch.
+
+    Args:
+        publish: called as ``publish(payload, count)`` with the framed
+            payload bytes and the number of lines in it.  Returns True
+            once the batch is delivered, or safely spooled.
+        on_published: if given, called with the `cursor` of the last
+            line in each batch once `publish` has returned True.  Batches
+            that failed aren't, so a checkpoint never moves past them.
+    """
+
+    def __init__(self, publish: Callable[[bytes, int], bool],
+                 max_lines=DEFAULT_MAX_LINES, max_bytes=DEFAULT_MAX_BYTES,
+                 max_delay=DEFAULT_MAX_DELAY,
+                 on_published: Optional[Callable[[Any], None]] = None):
+        self.publish = publish
+        self.on_published = on_published
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.batches = 0
+        self.lines = 0
+        self._buf = []
+        self._size = 0
+        self._cursor = None
+        self._deadline = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        # Held while a batch is published, to keep batches in order.
+        self._sending = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._timer, name="dwm-batcher", daemon=True,
+        )
+        self._thread.start()
+
+    def add(self, line: Union[bytes, str], cursor=None):
+        """Queue `line`.  `cursor` is passed to `on_published` later."""
+        if isinstance(line, str):
+            line = line.encode("UTF-8")
+        if not line.endswith(LINE_SEPARATOR):
+            line += LINE_SEPARATOR
+        with self._cond:
+            if self._size and self._size + len(line) > self.max_bytes:
+                self._flush_locked()
+            self._buf.append(line)
+            self._size += len(line)
+            self._cursor = cursor
+            if len(self._buf) >= self.max_lines or self._size >= self.max_bytes:
+                self._flush_locked()
+            elif self._deadline is None:
+                self._deadline = time.monotonic() + self.max_delay
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            self._flush_locked()
+
+    def close(self):
+        with self._cond:
+            self._flush_locked()
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _flush_locked(self):
+        """Take the buffered batch and publish it.
+
+        Called with ``_cond`` held.  It is released while the batch is
+        published, after taking ``_sending`` so the next batch can't
+        overtake this one.
+        """
+        self._deadline = None
+        if not self._buf:
+            return
+        payload = b"".join(self._buf)
+        count = len(self._buf)
+        cursor = self._cursor
+        self._buf = []
+        self._size = 0
+        self._cursor = None
+        self.batches += 1
+        self.lines += count
+        self._sending.acquire()
+        self._cond.release()
+        try:
+            self._publish(payload, count, cursor)
+        finally:
+            self._sending.release()
+            self._cond.acquire()
+
+    def _publish(self, payload, count, cursor):
+        try:
+            published = self.publish(payload, count)
+        except Exception as e:
+            LOG.error(f"Failed to publish batch of {count} lines: {e}")
+            return
+        if not published:
+            return
+        if self.on_published and cursor is not None:
+            self.on_published(cursor)
+
+    def _timer(self):
+        with self._cond:
+            while not self._stopped:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                else:
+                    self._flush_locked()
@@ -0,0 +1,370 @@
+"""A minimal MQTT broker to load test against, instead of a real one.
+
+:class:`Broker` speaks just enough MQTT 3.1.1 and 5 for log_to_mqtt
+and mqtt_to_terminal: connect, subscribe and unsubscribe with ``+``
+and ``#`` wildcards, publish (QoS 0, 1 and 2 in, always QoS 0 out),
+ping and disconnect.  MQTTv5 publish properties, such as the batch
+``lines`` and latency user properties, are passed on to v5
+subscribers untouched.  There are no sessions, retained messages,
+wills or authentication; usernames and passwords are ignored.
+
+Each subscriber has a bounded queue of outgoing messages drained by
+its own thread.  When a subscriber can't keep up its queue fills and
+new messages for it are dropped and counted, which is how a load test
+sees a consumer fall behind::
+
+    broker = Broker(port=1883).start()
+    broker.publish("direwolf", b"[0.4] K6ABC>APRS:>hi\\n")   # in process
+    broker.line()   # 'broker: clients 2 received 1 delivered 1 dropped 0'
+    broker.close()
+
+Listens on localhost only by default; it is a test tool, not a server.
+"""
+import logging
+import queue
+import socket
+import socketserver
+import struct
+import threading
+from typing import Optional
+
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 1883
+# Messages queued per subscriber before new ones are dropped.
+DEFAULT_QUEUE_SIZE = 10000
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+_STOP = object()
+
+
+class ProtocolError(Exception):
+    """A client sent something we don't understand."""
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Return True if `topic` matches a subscription's `topic_filter`."""
+    if topic_filter == topic:
+        return True
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    if topic.startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        value, digit = divmod(value, 128)
+        out.append(digit | 0x80 if value else digit)
+        if not value:
+            return bytes(out)
+
+
+def _read_varint(data: bytes, pos: int):
+    value = 0
+    for shift in range(0, 28, 7):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+    raise ProtocolError("variable byte integer too long")
+
+
+def _string(data: bytes, pos: int):
+    (length,) = struct.unpack_from("!H", data, pos)
+    pos += 2
+    return bytes(data[pos:pos + length]), pos + length
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + _varint(len(body)) + body
+
+
+def _publish_packet(topic: bytes, payload: bytes, properties: Optional[bytes]) -> bytes:
+    """A QoS 0 PUBLISH, with `properties` for v5 (already length prefixed)."""
+    body = struct.pack("!H", len(topic)) + topic
+    if properties is not None:
+        body += properties
+    return _packet(PUBLISH, 0, body + payload)
+
+
+class _Session:
+    """One connected client."""
+
+    def __init__(self, broker, sock, address, queue_size):
+        self.broker = broker
+        self.sock = sock
+        self.address = address
+        self.version = 4
+        self.client_id = ""
+        # Replaced, never changed in place: other clients' threads
+        # iterate it when routing their publishes.
+        self.subscriptions = frozenset()
+        self.dropped = 0
+        self._out = queue.Queue(maxsize=queue_size)
+        self._send_lock = threading.Lock()
+        self._writer = None
+
+    def __repr__(self):
+        return f"_Session({self.client_id!r}, {self.address})"
+
+    def send(self, data: bytes):
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def start_writer(self):
+        self._writer = threading.Thread(
+            target=self._write, name="dwm-broker-out", daemon=True,
+        )
+        self._writer.start()
+
+    def queue(self, message) -> bool:
+        try:
+            self._out.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _write(self):
+        while True:
+            message = self._out.get()
+            if message is _STOP:
+                return
+            topic, payload, properties = message
+            try:
+                self.send(_publish_packet(
+                    topic, payload, properties if self.version == 5 else None,
+                ))
+            except OSError:
+                return
+            self.broker.delivered.inc()
+
+    def stop_writer(self):
+        if self._writer is None:
+            return
+        while True:
+            try:
+                self._out.put_nowait(_STOP)
+                break
+            except queue.Full:
+                try:
+                    self._out.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class Broker:
+    """An in-process MQTT broker stand-in for load tests.
+
+    Args:
+        port: TCP port to listen on, 0 for any free one (see :attr:`port`).
+        host: address to listen on.
+        queue_size: messages queued per subscriber before dropping.
+        metrics: a :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            count received, delivered and dropped messages in.
+    """
+
+    def __init__(self, port=DEFAULT_PORT, host=DEFAULT_HOST, queue_size=DEFAULT_QUEUE_SIZE,
+                 metrics: Optional[metrics_utils.Metrics] = None):
+        self.queue_size = queue_size
+        self.metrics = metrics if metrics is not None else metrics_utils.Metrics("broker")
+        self.received = self.metrics.counter("broker_received", "Messages published to the broker")
+        self.delivered = self.metrics.counter("broker_delivered", "Messages sent to subscribers")
+        self.dropped = self.metrics.counter(
+            "broker_dropped", "Messages dropped for subscribers that fell behind",
+        )
+        self.metrics.gauge("broker_clients", lambda: len(self._sessions), "Connected clients")
+        self._sessions = set()
+        self._lock = threading.Lock()
+        broker = self
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(handler):
+                broker._serve(handler.request, handler.client_address)
+
+        class _Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = _Server((host, port), _Handler)
+        self.host = host
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    @property
+    def clients(self) -> int:
+        return len(self._sessions)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="dwm-broker", daemon=True,
+        )
+        self._thread.start()
+        LOG.info(f"MQTT broker stand-in listening on {self.host}:{self.port}")
+        return self
+
+    def close(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.stop_writer()
+            try:
+                session.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def publish(self, topic: str, payload: bytes, properties: bytes = b"\x00"):
+        """Deliver a message to the matching subscribers.
+
+        Args:
+            topic: the topic published to.
+            payload: the message.
+            properties: MQTTv5 properties as on the wire, with their
+                length prefix, passed on to v5 subscribers.
+        """
+        self._route(topic.encode("UTF-8"), topic, payload, properties)
+
+    def _route(self, topic_bytes, topic, payload, properties):
+        self.received.inc()
+        message = (topic_bytes, payload, properties)
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            if any(topic_matches(f, topic) for f in session.subscriptions):
+                if not session.queue(message):
+                    self.dropped.inc()
+
+    def line(self) -> str:
+        return (f"broker: clients {self.clients} received {self.received.value} "
+                f"delivered {self.delivered.value} dropped {self.dropped.value}")
+
+    def _serve(self, sock, address):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        rfile = sock.makefile("rb")
+        session = _Session(self, sock, address, self.queue_size)
+        try:
+            while True:
+                header = rfile.read(1)
+                if not header:
+                    return
+                length = 0
+                for shift in range(0, 28, 7):
+                    byte = rfile.read(1)
+                    if not byte:
+                        return
+                    length |= (byte[0] & 0x7f) << shift
+                    if not byte[0] & 0x80:
+                        break
+                body = rfile.read(length)
+                if len(body) < length:
+                    return
+                if not self._handle(session, header[0] >> 4, header[0] & 0x0f, body):
+                    return
+        except (OSError, ProtocolError, struct.error, IndexError) as e:
+            LOG.debug(f"broker: dropping {session}: {e}")
+        finally:
+            with self._lock:
+                self._sessions.discard(session)
+            session.stop_writer()
+            rfile.close()
+
+    def _handle(self, session, packet_type, flags, body) -> bool:
+        """Handle one packet, returns False to close the connection."""
+        if packet_type == CONNECT:
+            protocol, pos = _string(body, 0)
+            session.version = body[pos]
+            if protocol not in (b"MQTT", b"MQIsdp") or session.version not in (3, 4, 5):
+                raise ProtocolError(f"unsupported protocol {protocol!r} {session.version}")
+            pos += 4  # level, flags and keep alive
+            if session.version == 5:
+                length, pos = _read_varint(body, pos)
+                pos += length
+            client_id, _ = _string(body, pos)
+            session.client_id = client_id.decode("UTF-8", "replace")
+            if session.version == 5:
+                session.send(_packet(CONNACK, 0, b"\x00\x00\x00"))
+            else:
+                session.send(_packet(CONNACK, 0, b"\x00\x00"))
+            session.start_writer()
+            with self._lock:
+                self._sessions.add(session)
+            LOG.debug(f"broker: {session} connected")
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic_bytes, pos = _string(body, 0)
+            packet_id = None
+            if qos:
+                packet_id = body[pos:pos + 2]
+                pos += 2
+            properties = b"\x00"
+            if session.version == 5:
+                length, start = _read_varint(body, pos)
+                properties = bytes(body[pos:start + length])
+                pos = start + length
+            topic = topic_bytes.decode("UTF-8", "replace")
+            self._route(topic_bytes, topic, bytes(body[pos:]), properties)
+            if qos == 1:
+                session.send(_packet(PUBACK, 0, packet_id))
+            elif qos == 2:
+                session.send(_packet(PUBREC, 0, packet_id))
+        elif packet_type == PUBREL:
+            session.send(_packet(PUBCOMP, 0, body[:2]))
+        elif packet_type in (SUBSCRIBE, UNSUBSCRIBE):
+            packet_id = body[:2]
+            pos = 2
+            if session.version == 5:
+                length, pos = _read_varint(body, pos)
+                pos += length
+            filters = []
+            while pos < len(body):
+                topic_filter, pos = _string(body, pos)
+                if packet_type == SUBSCRIBE:
+                    pos += 1  # subscription options
+                filters.append(topic_filter.decode("UTF-8", "replace"))
+            codes = bytes(len(filters))
+            if packet_type == SUBSCRIBE:
+                session.subscriptions = session.subscriptions | set(filters)
+                ack = packet_id + (b"\x00" if session.version == 5 else b"") + codes
+                session.send(_packet(SUBACK, 0, ack))
+                LOG.debug(f"broker: {session} subscribed to {filters}")
+            else:
+                session.subscriptions = session.subscriptions - set(filters)
+                ack = packet_id + (b"\x00" + codes if session.version == 5 else b"")
+                session.send(_packet(UNSUBACK, 0, ack))
+        elif packet_type == PINGREQ:
+            session.send(_packet(PINGRESP, 0, b""))
+        elif packet_type == DISCONNECT:
+            return False
+        return True
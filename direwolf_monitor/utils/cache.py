@@ -0,0 +1,86 @@
+"""Bounded LRU/TTL cache in front of packet parsing.
+
+In a busy area the same frame is heard several times: direct, from a
+digipeater and again from APRS-IS.  Building the aprsd packet object is
+by far the most expensive part of handling a line (milliseconds, vs tens
+of microseconds for aprslib's parse), so :class:`ParseCache` remembers
+the result per raw packet.  Failures are cached too, so a malformed
+beacon isn't re-parsed every time it is heard.
+"""
+import collections
+import copy
+import time
+from typing import Callable, Union
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL = 300.0
+
+
+class ParseCache:
+    """Memoize `parse` by raw packet bytes.
+
+    Entries are dropped least recently used first once there are more
+    than `max_entries`, and re-parsed when older than `ttl` seconds.
+
+    Hits return a shallow copy of the cached packet.  aprsd packets
+    rebuild their ``raw`` and ``payload`` attributes when they are
+    rendered, and the copy keeps that from leaking between callers.
+
+    It is not thread safe; use one per thread.
+
+    Args:
+        parse: called with the raw bytes on a miss.  Returns a packet, or
+            None when the packet can't be parsed.
+        max_entries: how many packets to remember.
+        ttl: seconds a result stays valid, including failures.
+    """
+
+    def __init__(self, parse: Callable, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl=DEFAULT_TTL):
+        self._parse = parse
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def __call__(self, raw: Union[bytes, bytearray, memoryview]):
+        raw = bytes(raw)
+        now = time.monotonic()
+        entry = self._entries.get(raw)
+        if entry is not None:
+            expires, packet = entry
+            if expires > now:
+                self._entries.move_to_end(raw)
+                self.hits += 1
+                return copy.copy(packet) if packet is not None else None
+            del self._entries[raw]
+            self.expired += 1
+        self.misses += 1
+        packet = self._parse(raw)
+        self._entries[raw] = (now + self.ttl, packet)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return copy.copy(packet) if packet is not None else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def line(self) -> str:
+        """Return the counters as a summary fragment."""
+        return (
+            f"cache {len(self)}/{self.max_entries} "
+            f"hits {self.hits} misses {self.misses} "
+            f"({self.hit_rate:.0%}) evictions {self.evictions}"
+        )
@@ -0,0 +1,120 @@
+"""Remember how far into direwolf.log we got, across restarts.
+
+log_to_mqtt used to always start at the end of the log, so anything
+direwolf wrote while it was down was never published.  A
+:class:`Checkpoint` records the inode and byte offset just past the last
+line that was delivered.  Updates are kept in memory and a background
+thread writes them out at most once per `interval` (write to a temp
+file, fsync, rename), so the cost doesn't scale with the line rate and
+the last position is saved even when the log goes quiet.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_CATCH_UP_RATE = 500
+
+START_END = "end"
+START_CHECKPOINT = "checkpoint"
+START_START = "start"
+START_CHOICES = [START_END, START_CHECKPOINT, START_START]
+
+
+class Checkpoint:
+    """A periodically persisted (inode, offset) cursor into a log file.
+
+    Args:
+        path: the checkpoint filename.
+        interval: minimum seconds between writes to disk.
+    """
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.writes = 0
+        self._cursor = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start writing the checkpoint every `interval` seconds."""
+        self._thread = threading.Thread(
+            target=self._run, name="dwm-checkpoint", daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def load(self) -> Optional[Tuple[int, int]]:
+        """Return the saved (inode, offset), or None if there isn't one."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._cursor = (int(data["inode"]), int(data["offset"]))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            LOG.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+        return self._cursor
+
+    def update(self, inode, offset):
+        """Record that everything before `offset` in `inode` was delivered."""
+        self._cursor = (inode, offset)
+        self._dirty = True
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._write()
+
+    def _write(self):
+        self._dirty = False
+        inode, offset = self._cursor
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"inode": inode, "offset": offset}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            LOG.error(f"Failed to write checkpoint {self.path}: {e}")
+            self._dirty = True
+            return
+        self.writes += 1
+
+
+class RateLimiter:
+    """Block so that calls to :meth:`wait` average at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._start = None
+        self._count = 0
+
+    def wait(self):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        self._count += 1
+        due = self._start + self._count / self.rate
+        if due > now:
+            time.sleep(due - now)
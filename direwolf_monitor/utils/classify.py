@@ -0,0 +1,91 @@
+"""Classify direwolf log lines by their prefix in one step.
+
+direwolf tags every packet it prints with a bracketed prefix::
+
+    [0.4] ...          received on channel 0, decoder 4
+    [0.4 18:45:02] ... the same, with -T timestamps
+    [0L] ...           transmitted, low priority (our own beacons)
+    [0H] ...           transmitted, high priority (digipeated)
+    [ig] ...           heard from APRS-IS
+    [rx>ig] ...        received on RF and sent to APRS-IS
+    [ig>tx] ...        APRS-IS packet gated to RF
+    [0.dtmf] ...       DTMF decode
+    [0.is] ...         packet injected from APRS-IS into channel 0
+
+Everything else (audio levels, decoded descriptions, startup chatter)
+is :data:`OTHER`.  :func:`classify` works on the raw bytes from MQTT and
+matches all the prefixes with a single compiled pattern, returning the
+kind and a memoryview of the packet text, so nothing is copied or
+decoded until a caller actually needs the packet.
+"""
+import re
+from typing import Tuple, Union
+
+RX = "rx"
+TX = "tx"
+DIGI = "digi"
+IG = "ig"
+RX_IG = "rx>ig"
+IG_TX = "ig>tx"
+DTMF = "dtmf"
+IS = "is"
+OTHER = "other"
+
+KINDS = [RX, TX, DIGI, IG, RX_IG, IG_TX, DTMF, IS, OTHER]
+
+# Group names are the kinds, with '>' spelled '_'.
+_PREFIX = re.compile(
+    rb"\[(?:"
+    rb"(?P<rx>\d+\.\d+)(?: (?P<ts>[^\]]+))?"
+    rb"|(?P<tx>\d+L)"
+    rb"|(?P<digi>\d+H)"
+    rb"|(?P<ig>ig)"
+    rb"|(?P<rx_ig>rx>ig)"
+    rb"|(?P<ig_tx>ig>tx)"
+    rb"|(?P<dtmf>\d+\.dtmf)"
+    rb"|(?P<is>\d+\.is)"
+    rb")\] ?"
+)
+
+_GROUP_KIND = {
+    "rx": RX,
+    "ts": RX,
+    "tx": TX,
+    "digi": DIGI,
+    "ig": IG,
+    "rx_ig": RX_IG,
+    "ig_tx": IG_TX,
+    "dtmf": DTMF,
+    "is": IS,
+}
+
+_EMPTY = memoryview(b"")
+
+
+def classify(line: Union[bytes, bytearray]) -> Tuple[str, memoryview]:
+    """Return ``(kind, packet)`` for one direwolf log line.
+
+    `packet` is a memoryview into `line` with the prefix and the line
+    ending removed.  For :data:`OTHER` it is empty.
+    """
+    if line[:1] != b"[":
+        return OTHER, _EMPTY
+    m = _PREFIX.match(line)
+    if m is None:
+        return OTHER, _EMPTY
+    end = len(line)
+    if line.endswith(b"\n"):
+        end -= 1
+        if line.endswith(b"\r\n"):
+            end -= 1
+    return _GROUP_KIND[m.lastgroup], memoryview(line)[m.end():end]
+
+
+def timestamp(line: Union[bytes, bytearray]) -> Union[bytes, None]:
+    """Return direwolf's -T timestamp from a received line, if it has one."""
+    if line[:1] != b"[":
+        return None
+    m = _PREFIX.match(line)
+    if m is None:
+        return None
+    return m.group("ts")
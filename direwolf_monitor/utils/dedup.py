@@ -0,0 +1,132 @@
+"""Drop repeated copies of a packet heard within a time window.
+
+One beacon usually reaches us several times: direct, once per
+digipeater and again from APRS-IS.  The copies differ only in their
+path, so :class:`Dedup` keys a packet on its source, destination and
+information field::
+
+    K6YZA-4>S7QUPV,WIDE1-1:`2_Xl ...
+    K6YZA-4>S7QUPV,W6CX-3*,WIDE1:`2_Xl ...    duplicate
+    K6YZA-4>S7QUPV,TCPIP*,qAR,W6CX:`2_Xl ...  duplicate
+
+Keys are kept in time buckets `window` seconds wide.  A key stays
+known for the rest of its bucket plus the next one, so copies are
+caught for at least `window` seconds.  Older buckets are dropped in one
+go, which keeps expiry cheap and memory bounded.
+
+Only received packets are deduped by default, see
+:data:`DEFAULT_KINDS`.  Our own beacons repeat on purpose and each
+transmission should be shown.
+"""
+import time
+from typing import Callable, Optional, Tuple
+
+from direwolf_monitor.utils import classify
+
+DEFAULT_WINDOW = 30.0
+DEFAULT_MAX_ENTRIES = 10000
+# The line kinds, from classify, whose copies are dropped.
+DEFAULT_KINDS = (classify.RX,)
+KIND_CHOICES = [classify.RX, classify.TX, classify.IG, classify.IG_TX]
+
+
+def key(raw: bytes) -> Optional[Tuple[bytes, bytes]]:
+    """Return the ``(source>destination, information)`` of a raw packet.
+
+    Returns None when `raw` doesn't look like a TNC2 packet.
+    """
+    colon = raw.find(b":")
+    if colon < 0:
+        return None
+    comma = raw.find(b",", 0, colon)
+    return raw[:comma if comma >= 0 else colon], raw[colon + 1:]
+
+
+class Dedup:
+    """Remember packets by source, destination and information field.
+
+    Args:
+        window: seconds a packet is remembered for, at least.
+        max_entries: packets remembered per bucket.  When a bucket is
+            full new packets are passed through unremembered.
+        on_expire: called as ``on_expire(label, dropped)`` for each
+            remembered packet that had copies dropped, when it is
+            forgotten.  `label` is the packet's ``source>destination``.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_entries=DEFAULT_MAX_ENTRIES,
+                 on_expire: Optional[Callable[[bytes, int], None]] = None):
+        self.window = window
+        self.max_entries = max_entries
+        self.on_expire = on_expire
+        self._bucket = None
+        # hash -> [label, dropped copies]
+        self._current = {}
+        self._previous = {}
+        self.passed = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def _rotate(self, now):
+        bucket = int(now // self.window)
+        if bucket == self._bucket:
+            return
+        if self._bucket is not None and bucket == self._bucket + 1:
+            expired = self._previous
+            self._previous = self._current
+        else:
+            # Quiet for more than a bucket, everything has expired.
+            expired = {**self._previous, **self._current}
+            self._previous = {}
+        self._current = {}
+        self._bucket = bucket
+        self._expire(expired)
+
+    def _expire(self, entries):
+        if self.on_expire is None:
+            return
+        for label, dropped in entries.values():
+            if dropped:
+                self.on_expire(label, dropped)
+
+    def seen(self, raw: bytes) -> bool:
+        """Return True if `raw` is a copy of a packet seen in the window.
+
+        The first copy returns False and is remembered.
+        """
+        self._rotate(time.monotonic())
+        k = key(bytes(raw))
+        if k is None:
+            self.passed += 1
+            return False
+        h = hash(k)
+        entry = self._current.get(h)
+        if entry is None:
+            entry = self._previous.get(h)
+        if entry is not None:
+            entry[1] += 1
+            self.dropped += 1
+            return True
+        if len(self._current) < self.max_entries:
+            self._current[h] = [k[0], 0]
+        self.passed += 1
+        return False
+
+    def close(self):
+        """Forget everything, reporting dropped copies to `on_expire`."""
+        expired = {**self._previous, **self._current}
+        self._previous = {}
+        self._current = {}
+        self._expire(expired)
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of packets dropped as copies."""
+        total = self.passed + self.dropped
+        return self.dropped / total if total else 0.0
+
+    def line(self) -> str:
+        """Return the counters as a summary fragment."""
+        return f"dedup {self.dropped}/{self.passed + self.dropped} ({self.ratio:.0%})"
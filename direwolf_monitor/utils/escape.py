@@ -0,0 +1,59 @@
+"""Decode the ``<0xNN>`` escapes direwolf puts in printed packets.
+
+When direwolf prints a packet (``ax25_safe_print``) it replaces every
+byte that isn't safe to show on a terminal with ``<0x%02x>``:
+
+  * control characters below 0x20
+  * DEL (0x7f)
+  * 0xfe and 0xff, which never appear in UTF-8 text
+  * with its ASCII-only option, everything from 0x80 up
+
+Mic-E, compressed positions and telemetry use several of those bytes, so
+they have to be restored exactly before a packet is parsed.
+:func:`decode` does that in one pass with a precompiled pattern and a
+lookup table of all 256 escapes.
+"""
+import re
+from typing import Union
+
+_ESCAPE = re.compile(rb"<0x[0-9a-fA-F]{2}>")
+
+# b"<0x1f>" -> b"\x1f", in either hex case.
+_TABLE = {}
+for _byte in range(256):
+    _TABLE[b"<0x%02x>" % _byte] = bytes([_byte])
+    _TABLE[b"<0x%02X>" % _byte] = bytes([_byte])
+del _byte
+
+_lookup = _TABLE.__getitem__
+
+
+def _replace(match):
+    return _lookup(match.group())
+
+
+def decode(data: Union[bytes, bytearray, memoryview]) -> bytes:
+    """Return `data` with every ``<0xNN>`` escape turned back into its byte."""
+    data = bytes(data)
+    if b"<0x" not in data:
+        return data
+    return _ESCAPE.sub(_replace, data)
+
+
+def _needs_escape(byte, ascii_only):
+    return byte < 0x20 or byte in (0x7f, 0xfe, 0xff) or (ascii_only and byte >= 0x80)
+
+
+def encode(data: bytes, ascii_only=False) -> bytes:
+    """Escape `data` the way direwolf prints it.
+
+    The inverse of :func:`decode`, used by tests and the traffic
+    generator.
+    """
+    out = bytearray()
+    for byte in data:
+        if _needs_escape(byte, ascii_only):
+            out += b"<0x%02x>" % byte
+        else:
+            out.append(byte)
+    return bytes(out)
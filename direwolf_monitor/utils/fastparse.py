@@ -0,0 +1,490 @@
+"""Fast path for parsing the common APRS packet formats.
+
+Nearly all traffic is position reports, Mic-E, status and messages.
+:func:`parse` handles exactly those and returns the same dict
+``aprslib.parse`` would, or None for anything else (timestamps, objects,
+weather, telemetry, DAO, bulletins, ...) so the caller can fall back to
+aprslib.  Anything it isn't sure about is left to aprslib, including
+every packet aprslib would reject, so errors are reported exactly as
+before.
+
+:func:`factory` builds the aprsd packet object from that dict.  aprsd's
+own factory goes through dataclasses_json's ``from_dict``, which inspects
+every field's type hints on every call and costs milliseconds per
+packet; for the common packet classes :func:`factory` does the same
+conversions from a table built once per class.
+
+``tests/test_fastparse.py`` checks both against aprslib and aprsd.
+"""
+import dataclasses
+import math
+import re
+import typing
+from typing import Optional, Union
+
+from aprsd.packets import core as aprsd_core
+from aprslib import base91
+
+# Patterns are aprslib's own, see aprslib/parsing/.
+_FROMCALL = re.compile(r"^[a-z0-9]{0,9}(\-[a-z0-9]{1,8})?$", re.I)
+_TOCALL = re.compile(r"^([A-Z0-9]{1,6})(-(\d{1,2}))?$")
+_DIGI = re.compile(r"^[A-Z0-9\-]{1,9}\*?$", re.I)
+_Q_CONSTRUCT = re.compile(r"^q..$")
+_TIMESTAMP = re.compile(r"^((\d{6})(.))$")
+
+_COMPRESSED = re.compile(r"^[\/\\A-Za-j][!-|]{8}[!-{}][ -|]{3}")
+_NORMAL = re.compile(
+    r"^(\d{2})([0-9 ]{2}\.[0-9 ]{2})([NnSs])([\/\\0-9A-Z])"
+    r"(\d{3})([0-9 ]{2}\.[0-9 ]{2})([EeWw])([\x21-\x7e])(.*)$"
+)
+_COURSE_SPEED = re.compile(r"^([0-9 \.]{3})/([0-9 \.]{3})")
+_DF = re.compile(r"^/([0-9 \.]{3})/([0-9 \.]{3})")
+_PHG = re.compile(r"^(PHG(\d[\x30-\x7e]\d\d)([0-9A-Z]\/)?)")
+_RNG = re.compile(r"^RNG(\d{4})")
+_ALTITUDE = re.compile(r"^(.*?)/A=(\-\d{5}|\d{6})(.*)$")
+_COMMENT_TELEMETRY = re.compile(r"^(.*?)\|([!-{]{4,14})\|(.*)$")
+_DAO = re.compile("^(.*)\\!([\x21-\x7b])([\x20-\x7b]{2})\\!(.*?)$")
+
+_MICE_DSTCALL = re.compile(r"^[0-9A-Z]{3}[0-9L-Z]{3}$")
+_MICE_BODY = re.compile(
+    r"^[&-\x7f][&-a][\x1c-\x7f]{2}[\x1c-\x7d]"
+    r"[\x1c-\x7f][\x21-\x7e][\/\\0-9A-Z]"
+)
+_MICE_AMBIGUITY = re.compile(r"^\d+( *)$")
+_MICE_TELEMETRY = re.compile(r"^('[0-9a-f]{10}|`[0-9a-f]{4})(.*)$")
+_MICE_ALTITUDE = re.compile(r"^(.*)([!-{]{3})\}(.*)$")
+# K, L and Z are spaces, P-Y and A-J digits.
+_MICE_LATITUDE = str.maketrans(
+    "KLZPQRSTUVWXYABCDEFGHIJ", "   01234567890123456789",
+)
+_MICE_MBITS = str.maketrans(
+    "0123456789LPQRSTUVWXYZABCDEFGHIJK", "000000000001111111111122222222222",
+)
+_MICE_TYPES = {
+    "111": "M0: Off Duty",
+    "110": "M1: En Route",
+    "101": "M2: In Service",
+    "100": "M3: Returning",
+    "011": "M4: Committed",
+    "010": "M5: Special",
+    "001": "M6: Priority",
+    "000": "Emergency",
+}
+_MICE_CUSTOM_TYPES = {
+    "111": "C0: Custom-0",
+    "110": "C1: Custom-1",
+    "101": "C2: Custom-2",
+    "100": "C3: Custom-3",
+    "011": "C4: Custom-4",
+    "010": "C5: Custom-5",
+    "001": "C6: Custom-6",
+    "000": "Emergency",
+}
+
+_ADDRESSE = re.compile(r"^([a-zA-Z0-9_ \-]{9}):(.*)$")
+_TELEMETRY_CONFIG = re.compile(r"^(PARM|UNIT|EQNS|BITS)\.(.*)$")
+_REPLY_ACK = re.compile(r"^(ack|rej)([A-Za-z0-9]{2})}([A-Za-z0-9]{2})?$")
+_ACK = re.compile(r"^(ack|rej)([A-Za-z0-9]{1,5})$")
+_REPLY_MSGNO = re.compile(r"{([A-Za-z0-9]{2})}([A-Za-z0-9]{2})?$")
+_MSGNO = re.compile(r"{([A-Za-z0-9]{1,5})$")
+
+
+def _header(head):
+    fromcall, sep, path = head.partition(">")
+    if not sep or not 1 <= len(fromcall) <= 9 or not _FROMCALL.match(fromcall):
+        return None
+    path = path.split(",")
+    tocall = path[0]
+    path = path[1:]
+    m = _TOCALL.match(tocall)
+    if not m or (m.group(3) and int(m.group(3)) > 15):
+        return None
+    for digi in path:
+        if not _DIGI.match(digi):
+            return None
+    via = ""
+    if len(path) >= 2 and _Q_CONSTRUCT.match(path[-2]):
+        via = path[-1]
+    return {"from": fromcall, "to": tocall, "path": path, "via": via}
+
+
+def _comment(body, parsed):
+    """aprslib's parse_comment, minus DF reports, telemetry and DAO."""
+    m = _COURSE_SPEED.match(body)
+    if m:
+        cse, spd = m.groups()
+        body = body[7:]
+        if cse.isdigit() and cse != "000":
+            parsed["course"] = int(cse) if 1 <= int(cse) <= 360 else 0
+        if spd.isdigit() and spd != "000":
+            parsed["speed"] = int(spd) * 1.852
+        if _DF.match(body):
+            return None
+    else:
+        m = _PHG.match(body)
+        if m:
+            ext, phg, phgr = m.groups()
+            body = body[len(ext):]
+            parsed["phg"] = phg
+            parsed["phg_power"] = int(phg[0]) ** 2
+            parsed["phg_height"] = (10 * (2 ** (ord(phg[1]) - 0x30))) * 0.3048
+            parsed["phg_gain"] = 10 ** (int(phg[2]) / 10.0)
+            phg_dir = int(phg[3])
+            if phg_dir == 0:
+                phg_dir = "omni"
+            elif phg_dir == 9:
+                phg_dir = "invalid"
+            else:
+                phg_dir = 45 * phg_dir
+            parsed["phg_dir"] = phg_dir
+            parsed["phg_range"] = math.sqrt(
+                2 * (parsed["phg_height"] / 0.3048)
+                * math.sqrt((parsed["phg_power"] / 10.0) * (parsed["phg_gain"] / 2.0))
+            ) * 1.60934
+            if phgr:
+                parsed["phg"] += phgr[0]
+                parsed["phg_rate"] = int(phgr[0], 16)
+        else:
+            m = _RNG.match(body)
+            if m:
+                body = body[7:]
+                parsed["rng"] = int(m.group(1)) * 1.609344
+
+    m = _ALTITUDE.match(body)
+    if m:
+        body = m.group(1) + m.group(3)
+        parsed["altitude"] = int(m.group(2)) * 0.3048
+    if _COMMENT_TELEMETRY.match(body) or _DAO.match(body):
+        return None
+    if body[:1] == "/":
+        body = body[1:]
+    parsed["comment"] = body.strip(" ")
+    return parsed
+
+
+def _position(tocall, packet_type, body):
+    if packet_type not in "!=":
+        # '/' and '@' carry a timestamp, ';' is an object.
+        return None
+    parsed = {"messagecapable": packet_type == "="}
+    if _COMPRESSED.match(body):
+        compressed = body[:13]
+        body = body[13:]
+        latitude = 90 - (base91.to_decimal(compressed[1:5]) / 380926.0)
+        longitude = -180 + (base91.to_decimal(compressed[5:9]) / 190463.0)
+        c1, s1, ctype = [ord(x) - 33 for x in compressed[10:13]]
+        if c1 == -1:
+            parsed["gpsfixstatus"] = 1 if ctype & 0x20 == 0x20 else 0
+        if -1 in (c1, s1):
+            pass
+        elif ctype & 0x18 == 0x10:
+            parsed["altitude"] = (1.002 ** (c1 * 91 + s1)) * 0.3048
+        elif 0 <= c1 <= 89:
+            parsed["course"] = 360 if c1 == 0 else c1 * 4
+            parsed["speed"] = (1.08 ** s1 - 1) * 1.852
+        elif c1 == 90:
+            parsed["radiorange"] = (2 * 1.08 ** s1) * 1.609344
+        parsed.update({
+            "format": "compressed",
+            "symbol": compressed[9],
+            "symbol_table": compressed[0],
+            "latitude": latitude,
+            "longitude": longitude,
+        })
+    else:
+        m = _NORMAL.match(body)
+        if not m:
+            return None
+        (lat_deg, lat_min, lat_dir, symbol_table,
+         lon_deg, lon_min, lon_dir, symbol, body) = m.groups()
+        posambiguity = lat_min.count(" ")
+        if posambiguity != lon_min.count(" "):
+            return None
+        if posambiguity >= 4:
+            lat_min = "30"
+            lon_min = "30"
+        else:
+            lat_min = lat_min.replace(" ", "5", 1)
+            lon_min = lon_min.replace(" ", "5", 1)
+        if not 0 <= int(lat_deg) <= 89 or not 0 <= int(lon_deg) <= 179:
+            return None
+        latitude = int(lat_deg) + (float(lat_min) / 60.0)
+        longitude = int(lon_deg) + (float(lon_min) / 60.0)
+        latitude *= -1 if lat_dir in "Ss" else 1
+        longitude *= -1 if lon_dir in "Ww" else 1
+        parsed.update({
+            "format": "uncompressed",
+            "posambiguity": posambiguity,
+            "symbol": symbol,
+            "symbol_table": symbol_table,
+            "latitude": latitude,
+            "longitude": longitude,
+        })
+    if parsed["symbol"] == "_":
+        # A weather report.
+        return None
+    return _comment(body, parsed)
+
+
+def _mice(tocall, packet_type, body):
+    dstcall = tocall.split("-")[0]
+    if (len(dstcall) != 6 or len(body) < 8 or not _MICE_DSTCALL.match(dstcall)
+            or not _MICE_BODY.match(body)):
+        return None
+    parsed = {"format": "mic-e", "symbol": body[6], "symbol_table": body[7]}
+
+    digits = dstcall.translate(_MICE_LATITUDE)
+    m = _MICE_AMBIGUITY.match(digits)
+    if not m:
+        return None
+    posambiguity = len(m.group(1))
+    parsed["posambiguity"] = posambiguity
+    if posambiguity > 0:
+        digits = list(digits)
+        if posambiguity >= 4:
+            digits[2] = "3"
+        else:
+            digits[6 - posambiguity] = "5"
+        digits = "".join(digits)
+    latminutes = float(f"{digits[2:4]}.{digits[4:6]}".replace(" ", "0"))
+    latitude = int(digits[0:2]) + (latminutes / 60.0)
+    parsed["latitude"] = -latitude if ord(dstcall[3]) <= 0x4c else latitude
+
+    mbits = dstcall[0:3].translate(_MICE_MBITS)
+    if "2" in mbits:
+        mtype = _MICE_CUSTOM_TYPES.get(mbits.replace("2", "1"))
+    else:
+        mtype = _MICE_TYPES.get(mbits)
+    if mtype is None:
+        return None
+    parsed["mbits"] = mbits
+    parsed["mtype"] = mtype
+
+    longitude = ord(body[0]) - 28
+    longitude += 100 if ord(dstcall[4]) >= 0x50 else 0
+    longitude += -80 if 180 <= longitude <= 189 else 0
+    longitude += -190 if 190 <= longitude <= 199 else 0
+    lngminutes = ord(body[1]) - 28.0
+    lngminutes += -60 if lngminutes >= 60 else 0
+    lngminutes += (ord(body[2]) - 28.0) / 100.0
+    if posambiguity == 4:
+        lngminutes = 30
+    elif posambiguity == 3:
+        lngminutes = (math.floor(lngminutes / 10) + 0.5) * 10
+    elif posambiguity == 2:
+        lngminutes = math.floor(lngminutes) + 0.5
+    elif posambiguity == 1:
+        lngminutes = (math.floor(lngminutes * 10) + 0.5) / 10.0
+    elif posambiguity != 0:
+        return None
+    longitude += lngminutes / 60.0
+    parsed["longitude"] = 0 - longitude if ord(dstcall[5]) >= 0x50 else longitude
+
+    speed = (ord(body[3]) - 28) * 10
+    course = ord(body[4]) - 28
+    quotient = int(course / 10.0)
+    course += -(quotient * 10)
+    course = course * 100 + ord(body[5]) - 28
+    speed += quotient
+    speed += -800 if speed >= 800 else 0
+    course += -400 if course >= 400 else 0
+    parsed["speed"] = speed * 1.852
+    parsed["course"] = course
+
+    if len(body) > 8:
+        body = body[8:]
+        m = _MICE_TELEMETRY.match(body)
+        if m:
+            hexdata, body = m.groups()
+            hexdata = hexdata[1:]
+            channels = len(hexdata) // 2
+            value = int(hexdata, 16)
+            parsed["telemetry"] = [value >> 8 * i & 255 for i in reversed(range(channels))]
+        m = _MICE_ALTITUDE.match(body)
+        if m:
+            body = m.group(1) + m.group(3)
+            parsed["altitude"] = base91.to_decimal(m.group(2)) - 10000
+        if _COMMENT_TELEMETRY.match(body) or _DAO.match(body):
+            return None
+        parsed["comment"] = body.strip(" ")
+    return parsed
+
+
+def _status(tocall, packet_type, body):
+    if _TIMESTAMP.match(body[0:7]):
+        return None
+    return {"format": "status", "status": body.strip(" ")}
+
+
+def _message(tocall, packet_type, body):
+    if body[:3].upper() == "BLN":
+        # Bulletins and announcements.
+        return None
+    m = _ADDRESSE.match(body)
+    if not m:
+        return None
+    addresse, body = m.groups()
+    if _TELEMETRY_CONFIG.match(body):
+        return None
+    parsed = {"addresse": addresse.rstrip(" "), "format": "message"}
+
+    m = _REPLY_ACK.match(body)
+    if m:
+        parsed["response"], parsed["msgNo"], ack_msgno = m.groups()
+        if ack_msgno:
+            parsed["ackMsgNo"] = ack_msgno
+        return parsed
+    m = _ACK.match(body)
+    if m:
+        parsed["response"], parsed["msgNo"] = m.groups()
+        return parsed
+
+    parsed["message_text"] = body.strip(" ")
+    m = _REPLY_MSGNO.search(body)
+    if m:
+        msgno, ack_msgno = m.group(1), m.group(2) or ""
+        parsed["message_text"] = body[:len(body) - 4 - len(ack_msgno)].strip(" ")
+        parsed["msgNo"] = msgno
+        if ack_msgno:
+            parsed["ackMsgNo"] = ack_msgno
+        return parsed
+    m = _MSGNO.search(body)
+    if m:
+        msgno = m.group(1)
+        parsed["message_text"] = body[:len(body) - 1 - len(msgno)].strip(" ")
+        parsed["msgNo"] = msgno
+    return parsed
+
+
+_BODY = {
+    "!": _position,
+    "=": _position,
+    "`": _mice,
+    "'": _mice,
+    ">": _status,
+    ":": _message,
+}
+
+
+def parse(raw: Union[bytes, str]) -> Optional[dict]:
+    """Parse a common packet like ``aprslib.parse`` does.
+
+    Returns None when the packet isn't one of the formats handled here,
+    or doesn't parse; use aprslib for those.
+    """
+    if isinstance(raw, str):
+        packet = raw
+    else:
+        try:
+            packet = bytes(raw).decode("utf-8")
+        except UnicodeDecodeError:
+            # aprslib guesses the charset.
+            return None
+    packet = packet.rstrip("\r\n")
+    if "\n" in packet:
+        return None
+    head, sep, body = packet.partition(":")
+    if not sep or not body or (len(body) == 1 and body != ">"):
+        return None
+    handler = _BODY.get(body[0])
+    if handler is None:
+        return None
+    parsed = _header(head)
+    if parsed is None:
+        return None
+    try:
+        result = handler(parsed["to"], body[0], body[1:])
+    except (ValueError, KeyError, IndexError):
+        return None
+    if result is None:
+        return None
+    parsed["raw"] = packet
+    parsed.update(result)
+    return parsed
+
+
+def _field_kind(hint):
+    """How from_dict converts a field of type `hint`."""
+    if typing.get_origin(hint) is Union:
+        args = [a for a in typing.get_args(hint) if a is not type(None)]
+        hint = args[0] if len(args) == 1 else None
+    if hint in (int, float, str, bool):
+        return hint
+    if hint is dict or typing.get_origin(hint) is dict:
+        return dict
+    if typing.get_origin(hint) is list:
+        return list
+    return None
+
+
+def _fields(cls):
+    hints = typing.get_type_hints(cls)
+    spec = []
+    for f in dataclasses.fields(cls):
+        if not f.init:
+            continue
+        if f.default is not dataclasses.MISSING:
+            default = f.default
+            factory = None
+        else:
+            default = None
+            factory = f.default_factory
+        spec.append((f.name, default, factory, _field_kind(hints[f.name])))
+    return spec
+
+
+# The classes the fast factory builds; the rest use aprsd's factory.
+_FAST_TYPES = {
+    packet_type: (cls, _fields(cls))
+    for packet_type, cls in aprsd_core.TYPE_LOOKUP.items()
+    if cls in (
+        aprsd_core.MessagePacket,
+        aprsd_core.AckPacket,
+        aprsd_core.RejectPacket,
+        aprsd_core.BulletinPacket,
+        aprsd_core.StatusPacket,
+        aprsd_core.BeaconPacket,
+        aprsd_core.MicEPacket,
+    )
+}
+
+
+def factory(packet: dict) -> aprsd_core.Packet:
+    """Build an aprsd packet from an aprslib dict, like aprsd's factory.
+
+    Like aprsd's, this updates `packet` in place.
+    """
+    packet_type = aprsd_core.get_packet_type(packet)
+    fast = _FAST_TYPES.get(packet_type)
+    if fast is None or "_type" in packet:
+        return aprsd_core.factory(packet)
+    cls, spec = fast
+    for name, _, _, kind in spec:
+        if kind is dict and not isinstance(packet.get(name, {}), (dict, type(None))):
+            # from_dict fails on these, let it.
+            return aprsd_core.factory(packet)
+
+    packet["raw_dict"] = packet.copy()
+    if "from" in packet:
+        packet["from_call"] = packet.pop("from")
+    if "to" in packet:
+        packet["to_call"] = packet.pop("to")
+    if "addresse" in packet:
+        packet["to_call"] = packet["addresse"]
+    packet["packet_type"] = packet_type
+
+    kwargs = {}
+    for name, default, default_factory, kind in spec:
+        if name in packet:
+            value = packet[name]
+        elif default_factory is None:
+            value = default
+        else:
+            value = default_factory()
+        if value is not None and kind is not None and not isinstance(value, kind):
+            value = kind(value)
+        elif kind is dict or kind is list:
+            # from_dict copies containers.
+            value = kind(value) if value is not None else None
+        kwargs[name] = value
+    return cls(**kwargs)
@@ -0,0 +1,298 @@
+"""Filter the packets mqtt_to_terminal shows.
+
+A filter is a list of terms, all of which a packet has to match::
+
+    dwm mqtt-to-terminal --filter 'call:K6*,W6ABC-? type:position,mic-e kind:rx'
+    dwm mqtt-to-terminal --latitude 37.7 --longitude -122.2 --filter 'radius:25'
+    dwm mqtt-to-terminal --filter '!type:telemetry text:"net tonight"'
+
+``call:GLOB,...``
+    the sender's callsign matches one of the globs (``*`` and ``?``,
+    case insensitive).
+``type:TYPE,...``
+    the packet type is one of these, see
+    :data:`~direwolf_monitor.utils.topics.PACKET_TYPES`.
+``kind:KIND,...``
+    the line kind is one of ``rx``, ``tx``, ``ig`` or ``ig>tx``
+    (``ig-tx`` and ``ig_tx`` work too).
+``text:WORD``
+    the packet text contains WORD, case insensitive.
+``radius:MILES``
+    the packet's position is within MILES of ``--latitude`` and
+    ``--longitude``.
+``bbox:SOUTH,WEST,NORTH,EAST``
+    the packet's position is inside the box, in decimal degrees.
+
+A term starting with ``!`` matches packets the term doesn't.  Terms can
+be split over several ``--filter`` options; they all have to match.
+
+:func:`compile` turns the terms into a :class:`Filter` once.  Its stages
+run cheapest first, and all but the position ones work on the raw packet
+bytes, so most packets are dropped before they are parsed: the callsign
+globs are one anchored regular expression over the start of the packet
+and the type comes from its data type identifier.  Only ``radius`` and
+``bbox`` need the parsed packet.  How many packets each stage dropped
+is counted in the ``filtered`` metric and shown by :meth:`Filter.line`.
+"""
+import logging
+import re
+import shlex
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from direwolf_monitor.utils import classify, topics
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+KIND = "kind"
+CALL = "call"
+TYPE = "type"
+TEXT = "text"
+BBOX = "bbox"
+RADIUS = "radius"
+# Cheapest first, the order the stages run in.
+STAGES = [KIND, CALL, TYPE, TEXT, BBOX, RADIUS]
+POSITION_STAGES = (BBOX, RADIUS)
+
+KINDS = {
+    classify.RX: classify.RX,
+    classify.TX: classify.TX,
+    classify.IG: classify.IG,
+    classify.IG_TX: classify.IG_TX,
+    "ig-tx": classify.IG_TX,
+    "ig_tx": classify.IG_TX,
+}
+
+# Degrees of latitude per mile, to bound a radius before measuring it.
+_DEGREES_PER_MILE = 1 / 69.0
+
+
+def _glob(pattern: str) -> bytes:
+    """Translate a callsign glob into a regular expression."""
+    out = []
+    for char in pattern:
+        if char == "*":
+            out.append(b"[^>]*")
+        elif char == "?":
+            out.append(b"[^>]")
+        else:
+            out.append(re.escape(char.encode("UTF-8")))
+    return b"".join(out)
+
+
+def _values(key: str, value: str) -> List[str]:
+    values = [v.strip() for v in value.split(",") if v.strip()]
+    if not values:
+        raise ValueError(f"{key}: needs a value")
+    return values
+
+
+def _floats(key: str, value: str, count: int) -> List[float]:
+    try:
+        numbers = [float(v) for v in _values(key, value)]
+    except ValueError as e:
+        raise ValueError(f"{key}:{value} isn't {count} number{'s' if count > 1 else ''}") from e
+    if len(numbers) != count:
+        raise ValueError(f"{key}:{value} isn't {count} number{'s' if count > 1 else ''}")
+    return numbers
+
+
+def _is_comment(kind, packet) -> bool:
+    return kind == classify.IG and packet[:1] == b"#"
+
+
+def _kind_test(value):
+    kinds = set()
+    for v in _values(KIND, value):
+        if v.lower() not in KINDS:
+            raise ValueError(f"kind:{v} isn't one of {', '.join(KINDS)}")
+        kinds.add(KINDS[v.lower()])
+    return lambda kind, packet: kind in kinds
+
+
+def _call_test(value):
+    pattern = re.compile(
+        b"(?:" + b"|".join(_glob(v) for v in _values(CALL, value)) + b")>", re.I,
+    )
+    return lambda kind, packet: pattern.match(packet) is not None
+
+
+def _type_test(value):
+    types = set()
+    for v in _values(TYPE, value):
+        if v.lower() not in topics.PACKET_TYPES:
+            raise ValueError(f"type:{v} isn't one of {', '.join(topics.PACKET_TYPES)}")
+        types.add(v.lower())
+
+    def _test(kind, packet):
+        if _is_comment(kind, packet):
+            return topics.COMMENT in types
+        return topics.packet_type(packet) in types
+
+    return _test
+
+
+def _text_test(value):
+    if not value:
+        raise ValueError("text: needs a value")
+    needle = value.lower().encode("UTF-8")
+    return lambda kind, packet: needle in packet.lower()
+
+
+def _position(packet) -> Optional[Tuple[float, float]]:
+    latitude = getattr(packet, "latitude", None)
+    longitude = getattr(packet, "longitude", None)
+    if latitude is None or longitude is None:
+        return None
+    return latitude, longitude
+
+
+def _bbox_test(value):
+    south, west, north, east = _floats(BBOX, value, 4)
+    if south > north:
+        raise ValueError(f"bbox:{value} has its south edge north of its north edge")
+    wraps = west > east
+
+    def _test(packet):
+        position = _position(packet)
+        if position is None:
+            return False
+        lat, lon = position
+        if not south <= lat <= north:
+            return False
+        if wraps:
+            return lon >= west or lon <= east
+        return west <= lon <= east
+
+    return _test
+
+
+def _radius_test(value, latitude, longitude):
+    (miles,) = _floats(RADIUS, value, 1)
+    if latitude is None or longitude is None:
+        raise ValueError("radius: needs --latitude and --longitude")
+    from direwolf_monitor.utils import geo
+    home = geo.home(latitude, longitude)
+    # Anything further north or south than this can't be in range,
+    # which saves the trigonometry for most far away packets.
+    span = miles * _DEGREES_PER_MILE
+
+    def _test(packet):
+        position = _position(packet)
+        if position is None:
+            return False
+        lat, lon = position
+        if abs(lat - home.latitude) > span:
+            return False
+        return home.distance_bearing(lat, lon)[0] <= miles
+
+    return _test
+
+
+def _not(test):
+    return lambda *args: not test(*args)
+
+
+class Filter:
+    """A compiled filter, see :func:`compile`.
+
+    :meth:`before_parse` runs the stages that only need the raw packet,
+    :meth:`after_parse` the ones that need it parsed.  Packets have to
+    pass both to be shown.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable]],
+                 metrics: Optional[metrics_utils.Metrics] = None):
+        stages = sorted(stages, key=lambda stage: STAGES.index(stage[0]))
+        self._raw = [stage for stage in stages if stage[0] not in POSITION_STAGES]
+        self._parsed = [stage for stage in stages if stage[0] in POSITION_STAGES]
+        self.metrics = metrics if metrics is not None else metrics_utils.Metrics()
+        self.checked = self.metrics.counter("filter_checked", "Packets checked by --filter")
+        self.passed = self.metrics.counter("filter_passed", "Packets that passed --filter")
+        self.filtered = self.metrics.labeled_counter(
+            "filtered", "Packets dropped by --filter, by stage", label="stage",
+        )
+
+    @property
+    def stages(self) -> List[str]:
+        return [name for name, _ in self._raw + self._parsed]
+
+    @property
+    def needs_parse(self) -> bool:
+        return bool(self._parsed)
+
+    def before_parse(self, kind: str, packet: bytes) -> bool:
+        """Return True if the raw `packet` may be wanted.
+
+        Args:
+            kind: the line kind from :func:`~direwolf_monitor.utils.classify.classify`.
+            packet: the packet, with direwolf's escapes decoded.
+        """
+        self.checked.inc()
+        for name, test in self._raw:
+            if not test(kind, packet):
+                self.filtered.inc(name)
+                return False
+        return True
+
+    def after_parse(self, packet) -> bool:
+        """Return True if the parsed `packet` is wanted, None if it didn't parse."""
+        for name, test in self._parsed:
+            if not test(packet):
+                self.filtered.inc(name)
+                return False
+        self.passed.inc()
+        return True
+
+    def line(self) -> str:
+        dropped = " ".join(
+            f"{name} {self.filtered.values[name]}"
+            for name in STAGES if self.filtered.values.get(name)
+        )
+        line = f"filter {self.passed.value}/{self.checked.value}"
+        return f"{line} ({dropped})" if dropped else line
+
+
+def compile(expressions: Iterable[str], latitude=None, longitude=None,
+            metrics: Optional[metrics_utils.Metrics] = None) -> Optional[Filter]:
+    """Compile filter expressions into a :class:`Filter`.
+
+    Args:
+        expressions: strings of terms, e.g. the ``--filter`` options.
+        latitude: our latitude, for ``radius``.
+        longitude: our longitude.
+        metrics: where the filter counts what it drops.
+
+    Returns None when there are no terms.  Raises ValueError for terms
+    it doesn't understand.
+    """
+    stages = []
+    for expression in expressions:
+        try:
+            terms = shlex.split(expression)
+        except ValueError as e:
+            raise ValueError(f"can't split {expression!r}: {e}") from e
+        for term in terms:
+            negate = term.startswith("!")
+            key, sep, value = term.lstrip("!").partition(":")
+            key = key.lower()
+            if not sep:
+                raise ValueError(f"{term!r} isn't key:value, the keys are {', '.join(STAGES)}")
+            if key == KIND:
+                test = _kind_test(value)
+            elif key == CALL:
+                test = _call_test(value)
+            elif key == TYPE:
+                test = _type_test(value)
+            elif key == TEXT:
+                test = _text_test(value)
+            elif key == BBOX:
+                test = _bbox_test(value)
+            elif key == RADIUS:
+                test = _radius_test(value, latitude, longitude)
+            else:
+                raise ValueError(f"unknown filter {key!r}, the keys are {', '.join(STAGES)}")
+            stages.append((key, _not(test) if negate else test))
+    if not stages:
+        return None
+    return Filter(stages, metrics=metrics)
@@ -0,0 +1,95 @@
+"""Distance and bearing from our own station.
+
+:class:`Home` converts our position to radians once, then gives the
+great-circle distance (haversine, in miles) and initial compass bearing
+to one point, or to arrays of points with NumPy::
+
+    home = Home("37.42", "-122.05")
+    miles, bearing = home.distance_bearing(37.80, -122.41)
+    miles, bearings = home.distances_bearings(lats, lons)
+
+The results match ``haversine(..., unit=Unit.MILES)`` and
+:func:`direwolf_monitor.utils.calculate_initial_compass_bearing`.
+"""
+import functools
+import math
+from typing import Tuple, Union
+
+import numpy as np
+
+# The same radius and conversion the haversine package uses.
+EARTH_RADIUS_KM = 6371.0088
+KM_TO_MILES = 0.621371192
+EARTH_RADIUS_MILES = EARTH_RADIUS_KM * KM_TO_MILES
+
+
+class Home:
+    """Our station's position, with what each calculation needs precomputed.
+
+    Args:
+        latitude: our latitude in decimal degrees, a number or string.
+        longitude: our longitude in decimal degrees.
+    """
+
+    def __init__(self, latitude: Union[float, str], longitude: Union[float, str]):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self._lat = math.radians(self.latitude)
+        self._lon = math.radians(self.longitude)
+        self._sin_lat = math.sin(self._lat)
+        self._cos_lat = math.cos(self._lat)
+
+    def __repr__(self):
+        return f"Home({self.latitude}, {self.longitude})"
+
+    def distance_bearing(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        """Return ``(miles, degrees)`` to a point."""
+        lat = math.radians(float(latitude))
+        dlon = math.radians(float(longitude)) - self._lon
+        sin_lat = math.sin(lat)
+        cos_lat = math.cos(lat)
+        cos_dlon = math.cos(dlon)
+        sin_dlon = math.sin(dlon)
+
+        d = (math.sin((lat - self._lat) * 0.5) ** 2
+             + self._cos_lat * cos_lat * math.sin(dlon * 0.5) ** 2)
+        miles = 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(d))
+
+        x = sin_dlon * cos_lat
+        y = self._cos_lat * sin_lat - self._sin_lat * cos_lat * cos_dlon
+        bearing = (math.degrees(math.atan2(x, y)) + 360) % 360
+        return miles, bearing
+
+    def distances_bearings(self, latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray]:
+        """Return arrays of miles and degrees to arrays of points.
+
+        Args:
+            latitudes: array-like of latitudes in decimal degrees.
+            longitudes: array-like of longitudes, the same shape.
+        """
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        dlon = np.radians(np.asarray(longitudes, dtype=np.float64)) - self._lon
+        cos_lat = np.cos(lat)
+
+        d = (np.sin((lat - self._lat) * 0.5) ** 2
+             + self._cos_lat * cos_lat * np.sin(dlon * 0.5) ** 2)
+        miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(d))
+
+        x = np.sin(dlon) * cos_lat
+        y = self._cos_lat * np.sin(lat) - self._sin_lat * cos_lat * np.cos(dlon)
+        bearings = (np.degrees(np.arctan2(x, y)) + 360) % 360
+        return miles, bearings
+
+
+def home(latitude: Union[float, str], longitude: Union[float, str]) -> Home:
+    """Return the :class:`Home` for a position.
+
+    A position gets the same instance every time, however it is spelled,
+    so per packet callers like ``packet.add_gps`` only pay for a lookup.
+    """
+    return _home(float(latitude), float(longitude))
+
+
+@functools.lru_cache(maxsize=8)
+def _home(latitude: float, longitude: float) -> Home:
+    return Home(latitude, longitude)
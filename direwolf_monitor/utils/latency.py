@@ -0,0 +1,312 @@
+"""Where the time goes between direwolf hearing a packet and us showing it.
+
+Each line is stamped (wall clock, ``time.time()``) as it passes a stage::
+
+    origin     direwolf's -T timestamp on the line, if it has one
+    read       log_to_mqtt read the line from the log
+    published  log_to_mqtt handed its payload to paho
+    received   mqtt_to_terminal's on_message got the payload
+    parsed     the packet was parsed
+    rendered   the packet was shown
+
+``read`` and ``published`` travel with the payload as MQTTv5 user
+properties (see :func:`user_properties`), the rest are taken where they
+happen.  :class:`Tracker` keeps a histogram of the time between each
+pair of consecutive stamps, named after the later one, plus ``total``
+from the earliest stamp to rendered.  They live in a
+:class:`~direwolf_monitor.utils.metrics.Metrics`, so the Prometheus
+endpoint serves them too, and :meth:`Tracker.dump` formats them as a
+table for SIGUSR1 or ``dwm latency``.
+
+The stages run on two hosts, so ``deliver`` is only as good as their
+clock sync, and direwolf's -T timestamps usually have a resolution of
+a second.  Negative intervals are counted as 0.
+"""
+import calendar
+import collections
+import datetime
+import functools
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from direwolf_monitor.utils import classify
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+READ = "read"
+PUBLISH = "publish"
+DELIVER = "deliver"
+PARSE = "parse"
+RENDER = "render"
+TOTAL = "total"
+# The interval ending at each stamp after origin, in order.
+STAGES = [READ, PUBLISH, DELIVER, PARSE, RENDER, TOTAL]
+
+READ_PROPERTY = "read"
+PUBLISHED_PROPERTY = "published"
+
+# Lines read and not yet published that ReadTimes remembers.
+DEFAULT_MAX_PENDING = 10000
+# How far into the pending lines ReadTimes looks for a payload's first line.
+MAX_SCAN = 1000
+# Seconds, from 100us to 5 minutes; -T stamps are only to the second.
+DEFAULT_BUCKETS = metrics_utils.DEFAULT_BUCKETS + (30.0, 60.0, 300.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+# strftime formats direwolf -T is commonly given.  Time only formats
+# are taken as today, local time.
+TIMESTAMP_FORMATS = [
+    "%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y/%m/%d %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+]
+_FRACTION = re.compile(r"^(.*?:\d\d)([.,]\d+)?(Z)?$")
+_EPOCH = re.compile(r"^\d{9,}(\.\d+)?$")
+_DAY = 86400
+
+
+@functools.lru_cache(maxsize=256)
+def _parse(text: str) -> Optional[Tuple[str, float]]:
+    """Return ``("epoch", seconds)`` or ``("time", seconds into the day)``."""
+    if _EPOCH.match(text):
+        return "epoch", float(text)
+    m = _FRACTION.match(text)
+    if m is None:
+        return None
+    base, fraction, utc = m.groups()
+    fraction = float(fraction.replace(",", ".")) if fraction else 0.0
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(base, fmt)
+        except ValueError:
+            continue
+        if "%Y" not in fmt:
+            return "time", parsed.hour * 3600 + parsed.minute * 60 + parsed.second + fraction
+        if utc:
+            return "epoch", calendar.timegm(parsed.timetuple()) + fraction
+        return "epoch", time.mktime(parsed.timetuple()) + fraction
+    return None
+
+
+def parse_timestamp(text: Union[bytes, str], now: Optional[float] = None) -> Optional[float]:
+    """Return a direwolf -T timestamp as seconds since the epoch.
+
+    A time without a date is today's, or yesterday's if that would put
+    it more than 12 hours in the future (the line was written just
+    before midnight).  Returns None for formats we don't know.
+    """
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        text = bytes(text).decode("ascii", errors="replace")
+    parsed = _parse(text.strip())
+    if parsed is None:
+        return None
+    kind, seconds = parsed
+    if kind == "epoch":
+        return seconds
+    now = time.time() if now is None else now
+    today = time.localtime(now)
+    midnight = time.mktime(
+        (today.tm_year, today.tm_mon, today.tm_mday, 0, 0, 0, 0, 0, -1)
+    )
+    stamp = midnight + seconds
+    if stamp - now > _DAY / 2:
+        stamp -= _DAY
+    return stamp
+
+
+def origin(line: bytes, now: Optional[float] = None) -> Optional[float]:
+    """Return the -T timestamp of a received line, None without one."""
+    ts = classify.timestamp(line)
+    if ts is None:
+        return None
+    return parse_timestamp(ts, now)
+
+
+def user_properties(read: Optional[float], published: float) -> List[Tuple[str, str]]:
+    """Return the MQTTv5 user properties carrying a payload's stamps."""
+    props = [(PUBLISHED_PROPERTY, repr(published))]
+    if read is not None:
+        props.insert(0, (READ_PROPERTY, repr(read)))
+    return props
+
+
+def stamps(properties) -> Tuple[Optional[float], Optional[float]]:
+    """Return ``(read, published)`` from a message's MQTTv5 properties."""
+    found = {}
+    for name, value in getattr(properties, "UserProperty", None) or ():
+        if name in (READ_PROPERTY, PUBLISHED_PROPERTY):
+            try:
+                found[name] = float(value)
+            except ValueError:
+                pass
+    return found.get(READ_PROPERTY), found.get(PUBLISHED_PROPERTY)
+
+
+class ReadTimes:
+    """When each line was read, until the payload holding it is published.
+
+    The reader calls :meth:`read` for every line and the publisher
+    :meth:`take` for every payload, possibly on another thread and
+    after batching, queueing or dropping lines in between.  Payloads
+    are matched to lines by their first line, skipping lines that were
+    dropped on the way.  Only the newest `max_pending` lines are kept.
+    """
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING):
+        self._pending = collections.deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def read(self, line: bytes, now: Optional[float] = None):
+        with self._lock:
+            self._pending.append(
+                (line.rstrip(b"\r\n"), time.time() if now is None else now)
+            )
+
+    def take(self, payload: bytes, count=1) -> Optional[float]:
+        """Forget the `count` lines of `payload` and return when the first was read.
+
+        Returns None if the first line isn't pending, e.g. it was
+        spooled long ago.
+        """
+        end = payload.find(b"\n")
+        first = (payload if end < 0 else payload[:end]).rstrip(b"\r")
+        with self._lock:
+            pending = self._pending
+            for i, (line, read) in enumerate(pending):
+                if i >= MAX_SCAN:
+                    break
+                if line == first:
+                    for _ in range(min(i + count, len(pending))):
+                        pending.popleft()
+                    return read
+        return None
+
+
+class Tracker:
+    """Histograms of the time spent in each stage.
+
+    Args:
+        metrics: the :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            keep the ``latency_<stage>_seconds`` histograms in.
+    """
+
+    def __init__(self, metrics: Optional[metrics_utils.Metrics] = None):
+        self.metrics = metrics if metrics is not None else metrics_utils.Metrics()
+        self.histograms = {
+            stage: self.metrics.histogram(
+                histogram_name(stage), f"Seconds spent in the {stage} stage",
+                buckets=DEFAULT_BUCKETS,
+            )
+            for stage in STAGES
+        }
+        self._stages = [self.histograms[stage] for stage in STAGES[:-1]]
+        self._total = self.histograms[TOTAL]
+
+    def record(self, origin=None, read=None, published=None, received=None,
+               parsed=None, rendered=None):
+        """Observe the intervals between the stamps a line has."""
+        previous = origin
+        for histogram, stamp in zip(
+            self._stages, (read, published, received, parsed, rendered), strict=True,
+        ):
+            if stamp is None:
+                previous = None
+                continue
+            if previous is not None:
+                histogram.observe(max(stamp - previous, 0.0))
+            previous = stamp
+        if rendered is not None:
+            first = next(
+                (s for s in (origin, read, published) if s is not None), None,
+            )
+            if first is not None:
+                self._total.observe(max(rendered - first, 0.0))
+
+    def rows(self) -> List[Tuple[str, int, List[Optional[float]], Optional[float]]]:
+        """Return ``(stage, count, quantiles, mean)`` for stages with data."""
+        return histogram_rows(self.histograms)
+
+    def dump(self) -> str:
+        return format_rows(self.rows())
+
+    def log(self):
+        """Log :meth:`dump`, e.g. from a SIGUSR1 handler."""
+        for line in self.dump().splitlines():
+            LOG.info(line)
+
+
+def histogram_name(stage) -> str:
+    return f"latency_{stage}_seconds"
+
+
+def histogram_rows(histograms: Dict[str, metrics_utils.Histogram]):
+    """Return ``(stage, count, quantiles, mean)`` for each stage histogram with data."""
+    rows = []
+    for stage in STAGES:
+        histogram = histograms.get(stage)
+        if histogram is None or not histogram.count:
+            continue
+        rows.append((
+            stage, histogram.count,
+            [histogram.quantile(q) for q in QUANTILES],
+            histogram.sum / histogram.count,
+        ))
+    return rows
+
+
+def format_rows(rows: Iterable) -> str:
+    """Format :meth:`Tracker.rows` as a fixed width table in milliseconds."""
+    header = ["stage", "count"] + [f"p{round(q * 100)}" for q in QUANTILES] + ["mean"]
+    lines = ["{:<8} {:>8} {:>10} {:>10} {:>10} {:>10}".format(*header)]
+    for stage, count, quantiles, mean in rows:
+        values = [f"{value * 1000:.2f}ms" for value in quantiles + [mean]]
+        lines.append("{:<8} {:>8} {:>10} {:>10} {:>10} {:>10}".format(stage, count, *values))
+    if len(lines) == 1:
+        lines.append("no latency samples yet")
+    return "\n".join(lines)
+
+
+_SAMPLE = re.compile(
+    r'^(?P<name>\w+?)(?:_bucket\{le="(?P<le>[^"]+)"\}|_(?P<part>sum|count)) (?P<value>\S+)$'
+)
+
+
+def from_prometheus(text: str, prefix=metrics_utils.DEFAULT_PREFIX) -> Dict[str, metrics_utils.Histogram]:
+    """Rebuild the stage histograms from a :class:`MetricsServer` page."""
+    buckets = collections.defaultdict(list)
+    totals = collections.defaultdict(dict)
+    names = {f"{prefix}_{histogram_name(stage)}": stage for stage in STAGES}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if m is None or m.group("name") not in names:
+            continue
+        stage = names[m.group("name")]
+        if m.group("le") is not None:
+            if m.group("le") != "+Inf":
+                buckets[stage].append((float(m.group("le")), int(float(m.group("value")))))
+        else:
+            totals[stage][m.group("part")] = float(m.group("value"))
+    histograms = {}
+    for stage, cumulative in buckets.items():
+        cumulative.sort()
+        histogram = metrics_utils.Histogram(
+            histogram_name(stage), buckets=[bound for bound, _ in cumulative],
+        )
+        seen = 0
+        for i, (_, count) in enumerate(cumulative):
+            histogram.counts[i] = count - seen
+            seen = count
+        histogram.count = int(totals[stage].get("count", seen))
+        histogram.counts[-1] = histogram.count - seen
+        histogram.sum = totals[stage].get("sum", 0.0)
+        histograms[stage] = histogram
+    return histograms
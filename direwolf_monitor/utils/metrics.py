@@ -0,0 +1,340 @@
+"""Rolling throughput and latency metrics.
+
+The hot paths only bump plain attributes: :meth:`Counter.inc` is an
+integer add, :meth:`Histogram.observe` a bisect and two adds.  Once a
+second a sampler thread copies every total into a ring buffer, and
+rates and latency percentiles over the last `window` seconds are the
+difference between the newest and the oldest sample.  Updates from
+several threads aren't locked; a rare lost increment is fine for
+monitoring.
+
+The metrics can be logged periodically::
+
+    mqtt_to_terminal: lines 41.2/s packets 30.1/s (MicEPacket 12.0, ...)
+    failures 0.2/s render_seconds p50 1.21ms p99 4.02ms dedup_ratio 0.35
+
+and served in the Prometheus text format by :class:`MetricsServer`,
+with the rolling rates as ``<name>_rate`` gauges.
+"""
+import bisect
+import collections
+import http.server
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_WINDOW = 60
+DEFAULT_PREFIX = "dwm"
+DEFAULT_HOST = "127.0.0.1"
+# Seconds, from 100us to 10s.
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Labels shown per labeled counter in the log line.
+LINE_LABELS = 4
+
+
+class Counter:
+    """A monotonically increasing total."""
+
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def sample(self):
+        return self.value
+
+
+class LabeledCounter:
+    """Totals per label value, e.g. packets per packet type."""
+
+    __slots__ = ("name", "help", "label", "values")
+
+    def __init__(self, name, help="", label="type"):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, value, n=1):
+        self.values[value] = self.values.get(value, 0) + n
+
+    def sample(self):
+        return dict(self.values)
+
+
+class Histogram:
+    """Counts of observations in fixed buckets, with their sum."""
+
+    __slots__ = ("name", "help", "bounds", "counts", "sum", "count")
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(buckets)
+        # One more for observations above the last bound.
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def sample(self):
+        return list(self.counts)
+
+    def quantile(self, q, counts=None) -> Optional[float]:
+        """Estimate the `q` quantile from bucket `counts`.
+
+        Interpolates linearly within the bucket, like Prometheus'
+        histogram_quantile.  Returns None without observations.
+        """
+        counts = self.counts if counts is None else counts
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class Metrics:
+    """A set of counters, histograms and gauges with a rolling window.
+
+    Args:
+        name: prefix for the log line.
+        window: seconds the rolling rates and percentiles cover.
+        prefix: prefix of the Prometheus metric names.
+    """
+
+    def __init__(self, name="metrics", window=DEFAULT_WINDOW, prefix=DEFAULT_PREFIX):
+        self.name = name
+        self.window = window
+        self.prefix = prefix
+        self._metrics = {}
+        self._gauges = {}
+        self._samples = collections.deque(maxlen=window + 1)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help="") -> Counter:
+        """Return the counter `name`, creating it if needed."""
+        return self._add(Counter(name, help))
+
+    def labeled_counter(self, name, help="", label="type") -> LabeledCounter:
+        return self._add(LabeledCounter(name, help, label))
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, buckets))
+
+    def gauge(self, name, fn: Callable[[], float], help=""):
+        """Report ``fn()`` as the current value of `name`."""
+        self._gauges[name] = (fn, help)
+
+    def sample(self, now=None):
+        """Add the current totals to the ring buffer."""
+        now = time.monotonic() if now is None else now
+        totals = {name: metric.sample() for name, metric in self._metrics.items()}
+        with self._lock:
+            self._samples.append((now, totals))
+
+    def _span(self):
+        with self._lock:
+            if len(self._samples) < 2:
+                return None
+            return self._samples[0], self._samples[-1]
+
+    def rates(self) -> Dict[str, object]:
+        """Return per second rates over the window.
+
+        Counters map to a rate, labeled counters to a dict of rates.
+        """
+        span = self._span()
+        rates = {}
+        if span is None:
+            return rates
+        (then, old), (now, new) = span
+        elapsed = max(now - then, 1e-9)
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Counter):
+                rates[name] = (new.get(name, 0) - old.get(name, 0)) / elapsed
+            elif isinstance(metric, LabeledCounter):
+                before = old.get(name, {})
+                rates[name] = {
+                    label: (value - before.get(label, 0)) / elapsed
+                    for label, value in new.get(name, {}).items()
+                }
+        return rates
+
+    def quantiles(self, name, qs=(0.5, 0.99)) -> List[Optional[float]]:
+        """Return percentiles of histogram `name` over the window."""
+        metric = self._metrics[name]
+        span = self._span()
+        if span is None:
+            return [metric.quantile(q) for q in qs]
+        (_, old), (_, new) = span
+        before = old.get(name) or [0] * len(metric.counts)
+        counts = [n - b for n, b in zip(new.get(name, metric.counts), before, strict=True)]
+        return [metric.quantile(q, counts) for q in qs]
+
+    def line(self) -> str:
+        """Return the rolling rates, percentiles and gauges as one line."""
+        rates = self.rates()
+        parts = []
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Counter):
+                parts.append(f"{name} {rates.get(name, 0.0):.1f}/s")
+            elif isinstance(metric, LabeledCounter):
+                per_label = sorted(rates.get(name, {}).items(), key=lambda item: -item[1])
+                parts.append(f"{name} {sum(rate for _, rate in per_label):.1f}/s")
+                shown = [f"{label} {rate:.1f}" for label, rate in per_label[:LINE_LABELS] if rate]
+                if shown:
+                    parts.append(f"({', '.join(shown)})")
+            else:
+                p50, p99 = self.quantiles(name)
+                if p50 is not None:
+                    parts.append(f"{name} p50 {p50 * 1000:.2f}ms p99 {p99 * 1000:.2f}ms")
+        for name, (fn, _) in self._gauges.items():
+            parts.append(f"{name} {fn():.2f}")
+        return f"{self.name}: {' '.join(parts)}"
+
+    def prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        out = []
+        prefix = self.prefix
+        rates = self.rates()
+
+        def _head(name, kind, help):
+            out.append(f"# HELP {name} {help or name}")
+            out.append(f"# TYPE {name} {kind}")
+
+        for name, metric in list(self._metrics.items()):
+            full = f"{prefix}_{name}"
+            if isinstance(metric, Counter):
+                _head(f"{full}_total", "counter", metric.help)
+                out.append(f"{full}_total {metric.value}")
+                _head(f"{full}_rate", "gauge", f"{metric.help}, per second over {self.window}s")
+                out.append(f"{full}_rate {rates.get(name, 0.0):g}")
+            elif isinstance(metric, LabeledCounter):
+                values = dict(metric.values)
+                _head(f"{full}_total", "counter", metric.help)
+                for label, value in values.items():
+                    out.append(f'{full}_total{{{metric.label}="{_escape(label)}"}} {value}')
+                _head(f"{full}_rate", "gauge", f"{metric.help}, per second over {self.window}s")
+                for label, rate in rates.get(name, {}).items():
+                    out.append(f'{full}_rate{{{metric.label}="{_escape(label)}"}} {rate:g}')
+            else:
+                _head(full, "histogram", metric.help)
+                cumulative = 0
+                # The last count is the overflow bucket, +Inf below.
+                for bound, count in zip(metric.bounds, metric.counts[:-1], strict=True):
+                    cumulative += count
+                    out.append(f'{full}_bucket{{le="{bound:g}"}} {cumulative}')
+                out.append(f'{full}_bucket{{le="+Inf"}} {metric.count}')
+                out.append(f"{full}_sum {metric.sum:g}")
+                out.append(f"{full}_count {metric.count}")
+        for name, (fn, help) in list(self._gauges.items()):
+            full = f"{prefix}_{name}"
+            _head(full, "gauge", help)
+            out.append(f"{full} {fn():g}")
+        return "\n".join(out) + "\n"
+
+    def start(self, log_interval=0):
+        """Sample every second, and log :meth:`line` every `log_interval` seconds."""
+        self._thread = threading.Thread(
+            target=self._run, args=(log_interval,), name="dwm-metrics", daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, log_interval):
+        self.sample()
+        next_log = time.monotonic() + log_interval
+        while not self._stopped.wait(1.0):
+            self.sample()
+            if log_interval and time.monotonic() >= next_log:
+                next_log += log_interval
+                LOG.info(self.line())
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """Serve :meth:`Metrics.prometheus` over HTTP from a daemon thread.
+
+    Args:
+        metrics: the metrics to serve.
+        port: TCP port, 0 for any free one (see :attr:`port`).
+        host: address to listen on, local only by default.
+    """
+
+    def __init__(self, metrics: Metrics, port, host=DEFAULT_HOST):
+        self.metrics = metrics
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus().encode("UTF-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                LOG.debug(f"metrics: {format % args}")
+
+        self._server = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="dwm-metrics-http", daemon=True,
+        )
+        self._thread.start()
+        LOG.info(f"Serving metrics on http://{self._server.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def close(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
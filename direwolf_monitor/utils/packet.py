@@ -3,22 +3,20 @@ from typing import Optional
 
 import aprslib
 from aprsd.packets import core as aprsd_core
-from haversine import Unit, haversine
-from PIL import Image
-from term_image.image import AutoImage
 
 from direwolf_monitor import utils
-
-symbol_chart0 = Image.open("aprs-symbols-128-0.png")
-symbol_chart1 = Image.open("aprs-symbols-128-1.png")
+from direwolf_monitor.utils import fastparse, geo, symbols
 
 LOG = logging.getLogger("dwm")
 
 
-def parse_packet(raw):
+def parse_fields(raw) -> Optional[dict]:
+    """Parse a packet into aprslib's dict of fields, None if it doesn't parse."""
     try:
-        packet_json = aprslib.parse(raw)
-        return aprsd_core.factory(packet_json)
+        packet_json = fastparse.parse(raw)
+        if packet_json is None:
+            packet_json = aprslib.parse(raw)
+        return packet_json
     except aprslib.exceptions.ParseError:
         # console.print(f"[bold red]Failed to parse '{raw}' because '{e}'")
         pass
@@ -27,42 +25,31 @@ def parse_packet(raw):
         pass
 
 
-def create_symbol_image(symbol, symbol_table):
-    symbol_dimension = 128
-    offset = ord(symbol) - 33
-    row = offset // 16
-    col = offset % 16
-    crop_area = (
-        col * symbol_dimension,
-        row * symbol_dimension,
-        col * symbol_dimension + symbol_dimension,
-        row * symbol_dimension + symbol_dimension,
-    )
-    if symbol_table == "/":
-        test = symbol_chart0.crop(crop_area)
-    else:
-        test = symbol_chart1.crop(crop_area)
+def parse_packet(raw):
+    packet_json = parse_fields(raw)
+    if packet_json is not None:
+        return fastparse.factory(packet_json)
 
-    real = AutoImage(test)
-    real.height = 1
-    return real
+
+def create_symbol_image(symbol, symbol_table):
+    return symbols.atlas().image(symbol, symbol_table)
 
 
 def add_gps(logit, packet, my_latitude=0, my_longitude=0):
     if hasattr(packet, "latitude") and hasattr(packet, "longitude"):
-        my_coords = (float(my_latitude), float(my_longitude))
-        packet_coords = (packet.latitude, packet.longitude)
         try:
-            bearing = utils.calculate_initial_compass_bearing(my_coords, packet_coords)
+            distance, bearing = geo.home(my_latitude, my_longitude).distance_bearing(
+                packet.latitude, packet.longitude,
+            )
         except Exception as e:
             LOG.error(f"Failed to calculate bearing: {e}")
-            bearing = 0
+            return
 
         DISTANCE_COLOR = "#FF5733"
         DEGREES_COLOR = "#FFA900"
         logit.append(
             f" : [{DEGREES_COLOR}]{utils.degrees_to_cardinal(bearing, full_string=True)}[/]"
-            f"[green]@[/][{DISTANCE_COLOR}]{haversine(my_coords, packet_coords, unit=Unit.MILES):.2f}[/] miles",
+            f"[green]@[/][{DISTANCE_COLOR}]{distance:.2f}[/] miles",
         )
 
 
@@ -144,9 +131,7 @@ def packet_print(
             console.print(entry, end="")
     out_str = capture.get()
     if "__XXIMAGEXX__" in out_str:
-        symbol_image = create_symbol_image(packet.symbol, packet.symbol_table)
-        final_str = out_str.replace("__XXIMAGEXX__", "{symbol_image:1.1#}")
-        vars = {"symbol_image": symbol_image}
-        print(final_str.format(**vars))
+        symbol_image = symbols.atlas().render(packet.symbol, packet.symbol_table)
+        print(out_str.replace("__XXIMAGEXX__", symbol_image))
     else:
         print(out_str)
@@ -0,0 +1,164 @@
+"""Decouple reading direwolf.log from publishing it.
+
+Without this, log_to_mqtt reads a line, updates the Rich status, prints
+it and publishes it, all on one thread, so a slow terminal or a stalled
+socket write stops the log from being read.  :class:`Pipeline` puts a
+bounded queue between the reader and a publisher thread.  What happens
+when the queue is full is configurable:
+
+  * ``block``        - the reader waits for room (nothing is lost).
+  * ``drop-oldest``  - the oldest queued line is thrown away.
+  * ``spill``        - lines overflow to a :class:`~direwolf_monitor.utils.spool.Spool`
+                       on disk and are read back once the queue drains.
+"""
+import collections
+import logging
+import threading
+from typing import Callable, Optional, Tuple
+
+from direwolf_monitor.utils import spool as spool_utils
+
+LOG = logging.getLogger("dwm")
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_CHOICES = [OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL]
+
+DEFAULT_MAXSIZE = 10000
+SPILL_READ_LINES = 100
+
+
+class Pipeline:
+    """A bounded queue of lines with a consumer thread.
+
+    Args:
+        consume: called on the consumer thread as ``consume(line, position)``
+            for every line, in the order they were put.
+        maxsize: queue capacity in lines.
+        overflow: one of :data:`OVERFLOW_CHOICES`.
+        spill: the :class:`Spool` to overflow to, required for ``spill``.
+            Lines that went through the spill are consumed with a
+            position of None, since their tailer position isn't kept.
+    """
+
+    def __init__(self, consume: Callable[[bytes, Optional[Tuple[int, int]]], None],
+                 maxsize=DEFAULT_MAXSIZE, overflow=OVERFLOW_BLOCK,
+                 spill: Optional[spool_utils.Spool] = None):
+        if overflow not in OVERFLOW_CHOICES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        if overflow == OVERFLOW_SPILL and spill is None:
+            raise ValueError("The spill overflow policy needs a spool")
+        self.consume = consume
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.spill = spill
+        self.consumed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.blocked = 0
+        self.max_depth = 0
+        self._queue = collections.deque()
+        # While spilling, every new line goes to the spill so ordering
+        # holds: queue, then spill, then the queue again.
+        self._spilling = False
+        self._spill_pending = 0
+        # Lines being appended to the spill, outside the lock.
+        self._spill_inflight = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="dwm-publisher", daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """Lines waiting, including any spilled to disk."""
+        return len(self._queue) + self._spill_pending
+
+    def put(self, line: bytes, position: Optional[Tuple[int, int]] = None):
+        """Queue a line.  Only one thread may put, which keeps spills in order."""
+        with self._cond:
+            while not self._spilling and len(self._queue) >= self.maxsize:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.overflow == OVERFLOW_SPILL:
+                    LOG.warning(f"Publish queue full, spilling to {self.spill.path}")
+                    self._spilling = True
+                else:
+                    self.blocked += 1
+                    self._cond.wait()
+            if not self._spilling:
+                self._queue.append((line, position))
+                depth = len(self._queue)
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                self._cond.notify_all()
+                return
+            self._spill_inflight += 1
+        self._spill(line)
+
+    def _spill(self, line):
+        # Outside the lock, an append may fsync or compact the spool.
+        spilled = False
+        try:
+            self.spill.append(line)
+            spilled = True
+        finally:
+            with self._cond:
+                self._spill_inflight -= 1
+                if spilled:
+                    self.spilled += 1
+                    self._spill_pending += 1
+                self._cond.notify_all()
+
+    def close(self):
+        """Publish whatever is still queued, then stop the consumer."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _next(self):
+        """Return the next list of (line, position) to consume, or None."""
+        while True:
+            with self._cond:
+                while True:
+                    if self._queue:
+                        item = self._queue.popleft()
+                        self._cond.notify_all()
+                        return [item]
+                    if self._spilling:
+                        break
+                    if self._stopped:
+                        return None
+                    self._cond.wait()
+            # Only this thread reads the spill, so it can do so unlocked
+            # while the reader keeps appending.
+            lines, cursor = self.spill.read(SPILL_READ_LINES)
+            self.spill.commit(cursor)
+            with self._cond:
+                self._spill_pending = max(self._spill_pending - len(lines), 0)
+                if not self.spill.pending and not self._spill_inflight:
+                    LOG.info("Publish queue caught up with the spill")
+                    self._spilling = False
+                    self._spill_pending = 0
+                elif not lines and self._spill_inflight:
+                    # Wait for the append in progress rather than spin.
+                    self._cond.wait()
+            if lines:
+                return [(line, None) for line in lines]
+
+    def _run(self):
+        while True:
+            items = self._next()
+            if items is None:
+                break
+            for line, position in items:
+                try:
+                    self.consume(line, position)
+                except Exception as e:
+                    LOG.error(f"Failed to publish line: {e}")
+                self.consumed += 1
@@ -0,0 +1,531 @@
+"""Turn direwolf log lines received over MQTT into terminal output.
+
+:class:`LineProcessor` handles each line in paho's network thread.
+:class:`PooledLineProcessor` parses in a pool of worker processes
+instead, for busy feeds where parsing saturates one core.
+
+The packet parser (aprslib, aprsd, PIL) is imported when a processor is
+created, not with this module, so the CLI can read its defaults cheaply.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent import futures
+from typing import Optional, Union
+
+from rich import markup
+
+from direwolf_monitor.utils import batch, classify, escape, stats
+from direwolf_monitor.utils import cache as cache_utils
+from direwolf_monitor.utils import dedup as dedup_utils
+from direwolf_monitor.utils import latency as latency_utils
+from direwolf_monitor.utils import metrics as metrics_utils
+from direwolf_monitor.utils import record as record_utils
+
+LOG = logging.getLogger("dwm")
+
+_PACKET_KINDS = {classify.RX, classify.TX, classify.IG, classify.IG_TX}
+# An [ig] line that is an APRS-IS server comment.
+_COMMENT = "ig#"
+_STOP = object()
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_MAX_DELAY = 0.05
+
+
+class LineProcessor:
+    """Parse and render each direwolf log line of an MQTT payload.
+
+    Payloads of records published with ``--publish-format`` are already
+    parsed; their packets are only rebuilt from the fields and rendered.
+
+    Args:
+        ctx: the click context, used for its Rich console.
+        latitude: our latitude, for distance and bearing.
+        longitude: our longitude.
+        headless: don't render anything per line, only count.  Pair it
+            with a started `summary` to get periodic totals.
+        summary: a :class:`~direwolf_monitor.utils.stats.Summary` that
+            lines, bytes and parse failures are counted in.
+        cache: a :class:`~direwolf_monitor.utils.cache.ParseCache` to
+            parse packets through.  Without one every packet is parsed.
+        dedup_window: drop copies of a packet heard within this many
+            seconds of the first, 0 to show every copy.  How many were
+            dropped is shown once the packet is forgotten.
+        dedup_kinds: the line kinds copies are dropped of, see
+            :data:`~direwolf_monitor.utils.dedup.DEFAULT_KINDS`.
+        stations: a :class:`~direwolf_monitor.utils.stations.StationTable`
+            to record the senders of received packets in.
+        metrics: a :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            count lines, packets by type, parse failures and render time
+            in.
+        latency: a :class:`~direwolf_monitor.utils.latency.Tracker` to
+            record each shown packet's receive, parse and render times,
+            and those carried in the message, in.
+        packet_filter: a :class:`~direwolf_monitor.utils.filters.Filter`
+            packets have to pass to be shown.  Packets it drops aren't
+            counted, parsed if it can help it, or recorded in `stations`.
+    """
+
+    def __init__(self, ctx, latitude=None, longitude=None, headless=False,
+                 summary=None, cache=None, dedup_window=0,
+                 dedup_kinds=dedup_utils.DEFAULT_KINDS, stations=None,
+                 metrics=None, latency=None, packet_filter=None):
+        self.ctx = ctx
+        self.console = ctx.obj['console']
+        self.latitude = latitude
+        self.longitude = longitude
+        self.headless = headless
+        self.summary = summary or stats.Summary("mqtt_to_terminal")
+        from direwolf_monitor.utils import packet as packet_utils
+        self._packet_print = packet_utils.packet_print
+        from direwolf_monitor.utils import fastparse
+        self._factory = fastparse.factory
+        self.parse = cache if cache is not None else packet_utils.parse_packet
+        self.stations = stations
+        self.latency = latency
+        self.filter = packet_filter
+        self.dedup = None
+        self.dedup_kinds = frozenset(dedup_kinds)
+        if dedup_window:
+            self.dedup = dedup_utils.Dedup(dedup_window, on_expire=self._dropped)
+        self.metrics = metrics if metrics is not None else metrics_utils.Metrics()
+        self._lines = self.metrics.counter("lines", "Lines received")
+        self._packets = self.metrics.labeled_counter("packets", "Packets parsed, by type")
+        self._failures = self.metrics.counter("failures", "Packets that failed to parse")
+        self._render_time = self.metrics.histogram("render_seconds", "Seconds to render a packet")
+        self._versions = self.metrics.labeled_counter(
+            "record_versions_skipped", "Records with a schema version we don't know",
+            label="version",
+        )
+        if self.dedup is not None:
+            dedup = self.dedup
+            self.metrics.gauge(
+                "dedup_ratio", lambda: dedup.ratio, "Fraction of packets dropped as copies",
+            )
+
+    def on_message(self, client, userdata, msg):
+        """paho on_message callback."""
+        # console.out(f"{msg.topic} msg '{msg.payload}'")
+        properties = getattr(msg, "properties", None)
+        fmt = record_utils.format_of(msg.payload, properties)
+        if fmt is not None:
+            self.on_records(msg.payload, fmt, properties)
+            return
+        # A payload may hold a batch of lines, see utils/batch.py
+        lines = 0
+        if self.latency is None:
+            for line in batch.split_raw_lines(msg.payload):
+                self.process_line(line)
+                lines += 1
+        else:
+            received = time.time()
+            read, published = latency_utils.stamps(properties)
+            for line in batch.split_raw_lines(msg.payload):
+                self.process_line(
+                    line, (latency_utils.origin(line, received), read, published, received),
+                )
+                lines += 1
+        self.summary.count(len(msg.payload), lines)
+        self._lines.inc(lines)
+
+    def on_records(self, payload: bytes, fmt: str, properties=None):
+        """Show a payload of records published with --publish-format."""
+        stamps = None
+        if self.latency is not None:
+            received = time.time()
+            read, published = latency_utils.stamps(properties)
+            # A record's ts is only direwolf's own when it had one, so
+            # the read stage isn't traced here.
+            stamps = (None, read, published, received)
+        records = 0
+        try:
+            for record in record_utils.decode(payload, fmt):
+                self.process_record(record, stamps)
+                records += 1
+        except ValueError as e:
+            LOG.warning(f"Skipping the rest of a {fmt} payload: {e}")
+            self.summary.failures += 1
+            self._failures.inc()
+        self.summary.count(len(payload), records)
+        self._lines.inc(records)
+
+    def _show(self, packet, **kwargs):
+        if not packet:
+            self.summary.failures += 1
+            self._failures.inc()
+            return
+        self._packets.inc(packet.__class__.__name__)
+        if not self.headless:
+            start = time.perf_counter()
+            self._packet_print(
+                self.ctx, packet, latitude=self.latitude, longitude=self.longitude,
+                **kwargs,
+            )
+            self._render_time.observe(time.perf_counter() - start)
+
+    def _heard(self, packet):
+        if packet and self.stations is not None:
+            self.stations.update(packet)
+
+    # process_line is classify, decode, select, parse and show; they are
+    # public so `dwm replay` can time each stage of the real thing.
+
+    def classify(self, line):
+        """Return ``(kind, raw)`` for a line that may be shown, None otherwise.
+
+        `raw` is the packet text as printed.  APRS-IS server comments
+        get their own kind, they aren't packets.
+        """
+        if isinstance(line, str):
+            line = line.encode("UTF-8")
+        kind, raw = classify.classify(line)
+        if kind not in _PACKET_KINDS:
+            # DIGI ([0H]) repeats a packet we already showed as RX, RX_IG
+            # is an RX packet being gated, and everything else isn't a
+            # packet at all.
+            return None
+        if kind == classify.IG and raw[:1] == b"#":
+            return _COMMENT, raw
+        return kind, raw
+
+    def decode(self, kind, raw) -> Optional[bytes]:
+        """Return the packet bytes to parse, None for APRS-IS comments."""
+        if kind == _COMMENT:
+            return None
+        return escape.decode(raw)
+
+    def select(self, kind, raw, packet) -> bool:
+        """Return True if a decoded line passes the filter and isn't a copy."""
+        if kind == _COMMENT:
+            return self.filter is None or self.filter.before_parse(classify.IG, bytes(raw))
+        if self.filter is not None and not self.filter.before_parse(kind, packet):
+            return False
+        return not self._duplicate(kind, packet)
+
+    def prepare(self, line):
+        """Classify, decode, filter and dedup a line, the cheap part of handling it.
+
+        Returns ``(kind, raw, packet)`` for lines to render, where `raw`
+        is the packet text as printed and `packet` the decoded bytes to
+        parse (None for APRS-IS comments), or None for lines that aren't
+        shown.
+        """
+        job = self.classify(line)
+        if job is None:
+            return None
+        kind, raw = job
+        packet = self.decode(kind, raw)
+        if not self.select(kind, raw, packet):
+            return None
+        return kind, raw, packet
+
+    def _duplicate(self, kind, packet) -> bool:
+        return (self.dedup is not None and kind in self.dedup_kinds
+                and self.dedup.seen(packet))
+
+    def _render(self, kind, raw, packet):
+        """Show a parsed packet, `packet` is None if it didn't parse."""
+        if kind == classify.RX:
+            self._heard(packet)
+            self._show(packet)
+        elif kind == classify.TX:
+            # packet that direwolf Transmitted
+            self._show(packet, tx=True)
+        elif kind == classify.IG:
+            # Packet sent to direwolf from APRSIS
+            if not self.headless:
+                self.console.print(f"IG {str(raw, 'UTF-8', 'replace')}")
+            self._heard(packet)
+            self._show(packet)
+        elif kind == classify.IG_TX:
+            self._show(packet, header="\\[ig>tx]")
+        elif not self.headless:
+            self.console.print(f"IG {str(raw, 'UTF-8', 'replace')}")
+
+    def show(self, kind, raw, packet) -> bool:
+        """Render a prepared and parsed line if it passes the filter.
+
+        Args:
+            kind: the kind :meth:`prepare` returned.
+            raw: the packet text it returned.
+            packet: the parsed packet, None if it didn't parse.
+
+        Returns True if it was shown.
+        """
+        if self.filter is not None and not self.filter.after_parse(packet):
+            return False
+        self._render(kind, raw, packet)
+        return True
+
+    def process_line(self, line: Union[bytes, str], stamps=None):
+        """Show one line.
+
+        Args:
+            line: the direwolf log line.
+            stamps: ``(origin, read, published, received)`` times to
+                record the line's latency with, if tracing.
+        """
+        job = self.prepare(line)
+        if job is None:
+            return
+        kind, raw, packet = job
+        parsed = self.parse(packet) if packet is not None else None
+        if stamps is None:
+            self.show(kind, raw, parsed)
+            return
+        parse_time = time.time()
+        if self.show(kind, raw, parsed):
+            self.latency.record(*stamps, parse_time, time.time())
+
+    def _prepare_record(self, record: dict):
+        """Check, filter and dedup a record, like :meth:`prepare` a line.
+
+        Returns ``(kind, raw, fields)`` for records to render, where
+        `fields` is what :meth:`_build` makes the packet from, or None
+        for records that aren't shown.
+        """
+        if record.get("v") != record_utils.SCHEMA_VERSION:
+            self._versions.inc(str(record.get("v")))
+            return None
+        kind = record.get("kind")
+        if kind not in _PACKET_KINDS:
+            return None
+        raw = record["raw"].encode("UTF-8")
+        if kind == classify.IG and raw[:1] == b"#":
+            if self.filter is not None and not self.filter.before_parse(kind, raw):
+                return None
+            return _COMMENT, raw, None
+        packet = escape.decode(raw)
+        if self.filter is not None and not self.filter.before_parse(kind, packet):
+            return None
+        if self._duplicate(kind, packet):
+            return None
+        return kind, raw, record_utils.fields(record)
+
+    def _build(self, raw, fields):
+        """Make the packet of a record from its fields, None if it can't."""
+        if fields is None:
+            return None
+        try:
+            return self._factory(fields)
+        except (KeyError, TypeError, ValueError) as e:
+            LOG.debug(f"Bad fields in record {raw!r}: {e}")
+            return None
+
+    def process_record(self, record: dict, stamps=None):
+        """Show one record, its packet was already parsed by the publisher.
+
+        Args:
+            record: a record, see :mod:`~direwolf_monitor.utils.record`.
+            stamps: ``(origin, read, published, received)`` times to
+                record its latency with, if tracing.
+        """
+        job = self._prepare_record(record)
+        if job is None:
+            return
+        kind, raw, fields = job
+        parsed = self._build(raw, fields)
+        if stamps is None:
+            self.show(kind, raw, parsed)
+            return
+        parse_time = time.time()
+        if self.show(kind, raw, parsed):
+            self.latency.record(*stamps, parse_time, time.time())
+
+    def _dropped(self, label, dropped):
+        """Dedup on_expire callback, reports the copies we didn't show."""
+        if self.headless:
+            return
+        label = markup.escape(str(label, "UTF-8", "replace"))
+        copies = "copy" if dropped == 1 else "copies"
+        self.console.print(f"[dim]  {label}: {dropped} more {copies} not shown[/]")
+
+    def line(self) -> str:
+        """Return cache and dedup counters for the summary line."""
+        parts = []
+        if self.filter is not None:
+            parts.append(self.filter.line())
+        if isinstance(self.parse, cache_utils.ParseCache):
+            parts.append(self.parse.line())
+        if self.dedup is not None:
+            parts.append(self.dedup.line())
+        if self.stations is not None:
+            parts.append(self.stations.line())
+        return " ".join(parts)
+
+    def close(self):
+        if self.dedup is not None:
+            self.dedup.close()
+
+
+# Set in each worker process by _init_worker.
+_worker_parse = None
+
+
+def _init_worker(cache_size, cache_ttl):
+    global _worker_parse
+    from direwolf_monitor.utils import packet as packet_utils
+    _worker_parse = packet_utils.parse_packet
+    if cache_size > 0:
+        _worker_parse = cache_utils.ParseCache(
+            packet_utils.parse_packet, max_entries=cache_size, ttl=cache_ttl,
+        )
+
+
+def _parse_chunk(chunk):
+    """Parse a chunk of packets in a worker process."""
+    return [_worker_parse(data) if data is not None else None for data in chunk]
+
+
+class PooledLineProcessor(LineProcessor):
+    """A :class:`LineProcessor` that parses in a pool of processes.
+
+    paho's network thread only classifies, decodes and dedups each line,
+    then queues it.  A dispatcher thread groups queued lines into chunks
+    of up to `chunk_size`, waiting at most `max_delay` seconds to fill
+    one, and sends each chunk to a worker process to parse.  A render
+    thread takes the chunks back in the order they were sent, so
+    packets are shown in the order they arrived.
+
+    When the workers fall behind the queues fill up and paho's thread
+    blocks, leaving the backlog with the broker instead of in memory.
+
+    Records (see :mod:`~direwolf_monitor.utils.record`) have nothing
+    left to parse.  They are queued with the lines all the same, so
+    everything is shown in order by the one render thread, which also
+    builds their packets from the fields.
+
+    Each worker has its own parse cache of `cache_size` packets.
+
+    Args:
+        ctx: the click context, used for its Rich console.
+        workers: number of worker processes.
+        chunk_size: most lines sent to a worker at once.
+        max_delay: most seconds a line waits for its chunk to fill.
+        cache_size: parse cache size per worker, 0 for none.
+        cache_ttl: parse cache ttl.
+        **kwargs: passed to :class:`LineProcessor`.
+    """
+
+    def __init__(self, ctx, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_delay=DEFAULT_MAX_DELAY, cache_size=0,
+                 cache_ttl=cache_utils.DEFAULT_TTL, **kwargs):
+        super().__init__(ctx, **kwargs)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_delay = max_delay
+        self.chunks = 0
+        self._pool = futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(cache_size, cache_ttl),
+        )
+        # Start the workers now, before paho and our own threads exist
+        # to be forked along with them.
+        self._pool.submit(int).result()
+        self._jobs = queue.Queue(maxsize=chunk_size * workers * 4)
+        self._sent = queue.Queue(maxsize=workers * 2)
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="dwm-dispatch", daemon=True,
+        )
+        self._renderer = threading.Thread(
+            target=self._render_chunks, name="dwm-render", daemon=True,
+        )
+        self._dispatcher.start()
+        self._renderer.start()
+
+    @property
+    def depth(self) -> int:
+        """Lines queued and not yet sent to a worker."""
+        return self._jobs.qsize()
+
+    # Jobs are (kind, raw, packet, fields, stamps): lines have the
+    # packet bytes for a worker to parse, records the fields to build
+    # the packet from.
+
+    def process_line(self, line: Union[bytes, str], stamps=None):
+        job = self.prepare(line)
+        if job is not None:
+            self._jobs.put(job + (None, stamps))
+
+    def process_record(self, record: dict, stamps=None):
+        job = self._prepare_record(record)
+        if job is not None:
+            kind, raw, fields = job
+            self._jobs.put((kind, raw, None, fields, stamps))
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            job = self._jobs.get()
+            if job is _STOP:
+                break
+            chunk = [job]
+            deadline = time.monotonic() + self.max_delay
+            while len(chunk) < self.chunk_size:
+                try:
+                    job = self._jobs.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                chunk.append(job)
+            data = [job[2] for job in chunk]
+            try:
+                if any(packet is not None for packet in data):
+                    future = self._pool.submit(_parse_chunk, data)
+                else:
+                    # Only records and comments, nothing to parse.
+                    future = futures.Future()
+                    future.set_result(data)
+            except futures.BrokenExecutor as e:
+                # A worker died; the renderer logs it for each chunk.
+                future = futures.Future()
+                future.set_exception(e)
+            self._sent.put((chunk, future))
+            self.chunks += 1
+        self._sent.put(_STOP)
+
+    def _render_chunks(self):
+        while True:
+            item = self._sent.get()
+            if item is _STOP:
+                return
+            chunk, future = item
+            try:
+                packets = future.result()
+            except Exception:
+                LOG.exception("Failed to parse a chunk of packets")
+                packets = [None] * len(chunk)
+            parse_time = time.time()
+            for (kind, raw, _, fields, stamps), packet in zip(chunk, packets, strict=True):
+                if fields is not None:
+                    packet = self._build(raw, fields)
+                try:
+                    shown = self.show(kind, raw, packet)
+                except Exception:
+                    LOG.exception("Failed to render a packet")
+                    shown = True
+                if shown and stamps is not None:
+                    self.latency.record(*stamps, parse_time, time.time())
+
+    def line(self) -> str:
+        parts = [f"chunks {self.chunks} queue {self.depth}"]
+        if self.filter is not None:
+            parts.append(self.filter.line())
+        if self.dedup is not None:
+            parts.append(self.dedup.line())
+        if self.stations is not None:
+            parts.append(self.stations.line())
+        return " ".join(parts)
+
+    def close(self):
+        """Render everything queued, then stop the workers."""
+        self._jobs.put(_STOP)
+        self._dispatcher.join()
+        self._renderer.join()
+        self._pool.shutdown()
+        super().close()
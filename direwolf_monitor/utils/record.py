@@ -0,0 +1,241 @@
+"""Structured records of parsed packets, published instead of log lines.
+
+By default ``log_to_mqtt`` publishes direwolf's log lines as they are
+and every subscriber classifies, decodes and parses them itself.  With
+``--publish-format json`` or ``msgpack`` the publisher does that once
+and publishes one record per packet instead::
+
+    {"v": 1, "kind": "rx", "ts": 1714589102.0,
+     "raw": "K6ABC-7>APRS,WIDE1-1:>hi<0x0d>",
+     "fields": {"from": "K6ABC-7", "to": "APRS", "format": "status", ...}}
+
+``v``
+    the schema version, :data:`SCHEMA_VERSION`.  Consumers should skip
+    records with a version they don't know.
+``kind``
+    the line kind from :mod:`~direwolf_monitor.utils.classify`: ``rx``,
+    ``tx``, ``ig`` or ``ig>tx``.  Other lines (audio levels, digipeats,
+    direwolf's own messages) aren't published.
+``ts``
+    when the packet was received, in seconds since the epoch: direwolf's
+    ``-T`` timestamp when it logs one, otherwise when ``log_to_mqtt``
+    read the line from the log (for a batch, when its first line was).
+    Lines that waited in the spool keep the time they were read, or
+    were spooled, not when they were published.
+``raw``
+    the packet as direwolf logged it, with ``<0xNN>`` escapes, see
+    :mod:`~direwolf_monitor.utils.escape`.
+``fields``
+    what ``aprslib.parse`` makes of it, without its ``raw`` (see
+    :func:`fields`), or null for APRS-IS comments and packets that
+    don't parse.
+
+JSON records are one per line, so a batch is newline delimited JSON.
+msgpack records are simply concatenated.  Payloads carry the MQTTv5
+content type ``application/json`` or ``application/msgpack``; for
+MQTT 3.1.1 subscribers :func:`format_of` also recognises them by their
+first byte, which a log line never starts with.
+
+msgpack is optional, ``pip install msgpack`` to use it.  Reading JSON
+records needs nothing outside the standard library.
+"""
+import json
+import logging
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+from direwolf_monitor.utils import batch, classify, escape
+from direwolf_monitor.utils import latency as latency_utils
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+SCHEMA_VERSION = 1
+
+FORMAT_RAW = "raw"
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_CHOICES = [FORMAT_RAW, FORMAT_JSON, FORMAT_MSGPACK]
+
+CONTENT_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_MSGPACK: "application/msgpack",
+}
+_FORMATS = {content_type: fmt for fmt, content_type in CONTENT_TYPES.items()}
+
+RECORD_KINDS = (classify.RX, classify.TX, classify.IG, classify.IG_TX)
+
+
+def have_msgpack() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def format_of(payload: bytes, properties=None) -> Optional[str]:
+    """Return the format of a payload of records, or None for log lines.
+
+    Args:
+        payload: the MQTT payload.
+        properties: the message's MQTTv5 properties, if any.
+    """
+    content_type = getattr(properties, "ContentType", None)
+    if content_type:
+        return _FORMATS.get(content_type)
+    first = payload[:1]
+    if first == b"{":
+        return FORMAT_JSON
+    # A msgpack map of up to 15 keys.
+    if first and 0x80 <= first[0] <= 0x8f:
+        return FORMAT_MSGPACK
+    return None
+
+
+def encode(record: dict, fmt: str = FORMAT_JSON) -> bytes:
+    """Serialize one record, JSON ones with their trailing newline."""
+    if fmt == FORMAT_MSGPACK:
+        import msgpack
+        return msgpack.packb(record, use_bin_type=True)
+    return json.dumps(record, separators=(",", ":")).encode("ascii") + b"\n"
+
+
+def decode(payload: bytes, fmt: str = FORMAT_JSON) -> Iterator[dict]:
+    """Yield the records in a payload.
+
+    Raises ValueError for a payload that isn't records in `fmt`.
+    """
+    if fmt == FORMAT_MSGPACK:
+        import msgpack
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(payload)
+        try:
+            yield from unpacker
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ValueError(f"bad msgpack record: {e}") from e
+        return
+    for line in batch.split_raw_lines(payload):
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"bad JSON record: {e}") from e
+
+
+def _text(raw) -> str:
+    raw = bytes(raw)
+    try:
+        return raw.decode("UTF-8")
+    except UnicodeDecodeError:
+        # Escape the rest as direwolf's ASCII only mode would, so the
+        # bytes survive.
+        return escape.encode(raw, ascii_only=True).decode("ascii")
+
+
+def packet_bytes(record: dict) -> bytes:
+    """The packet as received, with direwolf's escapes decoded."""
+    return escape.decode(record["raw"].encode("UTF-8"))
+
+
+def fields(record: dict) -> Optional[dict]:
+    """Return a record's parsed fields as ``aprslib.parse`` returned them.
+
+    The ``raw`` field is left out of records, it is the packet text
+    again; this puts it back.  Non UTF-8 packets are decoded as
+    Latin-1, where aprslib would have guessed their character set.
+    """
+    parsed = record.get("fields")
+    if parsed is None:
+        return None
+    data = packet_bytes(record)
+    try:
+        text = data.decode("UTF-8")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    return dict(parsed, raw=text.rstrip("\r\n"))
+
+
+class Encoder:
+    """Turn payloads of direwolf log lines into payloads of records.
+
+    Args:
+        fmt: :data:`FORMAT_JSON` or :data:`FORMAT_MSGPACK`.
+        parse: called with a packet's bytes, returns aprslib's dict of
+            fields or None.  Defaults to
+            :func:`~direwolf_monitor.utils.packet.parse_fields`.
+        metrics: a :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            count records, lines skipped and parse failures in.
+        clock: returns the time a line was received, when it has no
+            timestamp of its own and the caller doesn't know when it
+            was read.
+    """
+
+    def __init__(self, fmt=FORMAT_JSON, parse: Optional[Callable] = None,
+                 metrics: Optional[metrics_utils.Metrics] = None,
+                 clock: Callable[[], float] = time.time):
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"can't publish records as {fmt!r}")
+        if fmt == FORMAT_MSGPACK and not have_msgpack():
+            raise ValueError("publishing msgpack records needs msgpack, pip install msgpack")
+        self.format = fmt
+        self.content_type = CONTENT_TYPES[fmt]
+        if parse is None:
+            from direwolf_monitor.utils import packet as packet_utils
+            parse = packet_utils.parse_fields
+        self.parse = parse
+        self.clock = clock
+        metrics = metrics if metrics is not None else metrics_utils.Metrics()
+        self.records = metrics.counter("records", "Records published")
+        self.skipped = metrics.counter("records_skipped", "Lines that aren't packets")
+        self.failures = metrics.counter("record_failures", "Packets that didn't parse")
+
+    def record(self, line: bytes, now: Optional[float] = None) -> Optional[dict]:
+        """Return the record for one log line, None if it isn't a packet.
+
+        Args:
+            line: the log line.
+            now: when it was read, if known.
+        """
+        kind, raw = classify.classify(line)
+        if kind not in RECORD_KINDS:
+            return None
+        parsed = None
+        if not (kind == classify.IG and raw[:1] == b"#"):
+            parsed = self.parse(escape.decode(raw))
+            if parsed is None:
+                self.failures.inc()
+            else:
+                parsed = {k: v for k, v in parsed.items() if k != "raw"}
+        if now is None:
+            now = self.clock()
+        ts = latency_utils.origin(line, now) or now
+        return {
+            "v": SCHEMA_VERSION,
+            "kind": kind,
+            "ts": round(ts, 3),
+            "raw": _text(raw),
+            "fields": parsed,
+        }
+
+    def encode(self, payload: bytes, now: Optional[float] = None) -> Tuple[bytes, int]:
+        """Return the records payload for a payload of lines, and how many it holds.
+
+        Args:
+            payload: one or more newline separated log lines.
+            now: when they were read, if known.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("UTF-8")
+        out = []
+        for line in batch.split_raw_lines(payload):
+            record = self.record(line, now)
+            if record is None:
+                self.skipped.inc()
+                continue
+            out.append(encode(record, self.format))
+        self.records.inc(len(out))
+        return b"".join(out), len(out)
+
+    def line(self) -> str:
+        return (f"records {self.records.value} skipped {self.skipped.value} "
+                f"failures {self.failures.value}")
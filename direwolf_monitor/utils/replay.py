@@ -0,0 +1,177 @@
+"""Replay a recorded direwolf log through the receive pipeline.
+
+:class:`Replayer` feeds each line through a
+:class:`~direwolf_monitor.utils.processor.LineProcessor`, as
+mqtt_to_terminal does, timing each of its stages::
+
+    classify   work out the line's kind and find the packet in it
+    decode     undo direwolf's <0xNN> escaping
+    select     the filters that work on the raw packet, and dedup
+    parse      the processor's parse, through its parse cache if it has one
+    render     the filters that need the parsed packet, then packet_print
+               or whatever sink the processor has
+
+Lines are paced by their direwolf -T timestamps divided by `speed`, so
+a log recorded with timestamps replays at 1x, 10x...  Lines without a
+timestamp follow the one before straight away, or, in a log without
+any timestamps, `interval` log seconds after it.  A `speed` of 0
+replays as fast as possible.
+
+:meth:`Replayer.report` gives per stage throughput (lines per busy
+second) and latency percentiles, plus ``total`` (a line's time in the
+pipeline) and ``lag`` (how late it finished against its schedule).
+"""
+import time
+from typing import Iterable, List, Optional
+
+from direwolf_monitor.utils import latency
+from direwolf_monitor.utils import metrics as metrics_utils
+
+CLASSIFY = "classify"
+DECODE = "decode"
+SELECT = "select"
+PARSE = "parse"
+RENDER = "render"
+TOTAL = "total"
+LAG = "lag"
+STAGES = [CLASSIFY, DECODE, SELECT, PARSE, RENDER, TOTAL, LAG]
+
+DEFAULT_SPEED = 1.0
+# Log seconds between lines of a log without -T timestamps.
+DEFAULT_INTERVAL = 0.1
+QUANTILES = (0.5, 0.9, 0.99)
+# Seconds, 1-2-5 steps from 1us to 10s: classifying a line takes a few
+# microseconds, a render a few milliseconds.
+BUCKETS = tuple(
+    mantissa * 10.0 ** exponent
+    for exponent in range(-6, 1)
+    for mantissa in (1, 2, 5)
+) + (10.0,)
+
+
+class Replayer:
+    """Time each stage of handling a sequence of log lines.
+
+    Args:
+        processor: the :class:`~direwolf_monitor.utils.processor.LineProcessor`
+            to handle them with, its filter, dedup and station table
+            included.
+        speed: replay this many times faster than recorded, 0 for as
+            fast as possible.
+        interval: log seconds between lines of a log without -T timestamps.
+        metrics: the :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            keep the ``replay_<stage>_seconds`` histograms in.
+    """
+
+    def __init__(self, processor, speed=DEFAULT_SPEED, interval=DEFAULT_INTERVAL,
+                 metrics: Optional[metrics_utils.Metrics] = None,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.processor = processor
+        self.speed = speed
+        self.interval = interval
+        self.metrics = metrics if metrics is not None else metrics_utils.Metrics("replay")
+        self.histograms = {
+            stage: self.metrics.histogram(
+                f"replay_{stage}_seconds", f"Seconds spent in the {stage} stage",
+                buckets=BUCKETS,
+            )
+            for stage in STAGES
+        }
+        self.lines = 0
+        self.packets = 0
+        self.elapsed = 0.0
+        self._clock = clock
+        self._sleep = sleep
+
+    def run(self, lines: Iterable[bytes]):
+        """Replay `lines`, sleeping between them to keep to the schedule."""
+        clock = self._clock
+        observe = {stage: h.observe for stage, h in self.histograms.items()}
+        classify = self.processor.classify
+        decode = self.processor.decode
+        select = self.processor.select
+        parse = self.processor.parse
+        show = self.processor.show
+        paced = self.speed > 0
+        start = clock()
+        # Log seconds since the first line, and the epoch time of that.
+        log_time = None
+        first_stamp = None
+        for line in lines:
+            due = None
+            if paced:
+                stamp = latency.origin(line)
+                if stamp is not None and first_stamp is None:
+                    first_stamp = stamp - (log_time or 0.0)
+                if first_stamp is None:
+                    log_time = 0.0 if log_time is None else log_time + self.interval
+                elif stamp is not None:
+                    # Never backwards, e.g. across a clock change.
+                    log_time = max(stamp - first_stamp, log_time or 0.0)
+                due = start + log_time / self.speed
+                wait = due - clock()
+                if wait > 0:
+                    self._sleep(wait)
+
+            t0 = clock()
+            self.lines += 1
+            job = classify(line)
+            t1 = clock()
+            observe[CLASSIFY](t1 - t0)
+            if job is None:
+                continue
+            kind, raw = job
+            data = decode(kind, raw)
+            t2 = clock()
+            if data is not None:
+                # APRS-IS comments are neither decoded nor parsed.
+                observe[DECODE](t2 - t1)
+            selected = select(kind, raw, data)
+            t3 = clock()
+            observe[SELECT](t3 - t2)
+            if not selected:
+                continue
+            self.packets += 1
+            packet = None
+            if data is not None:
+                packet = parse(data)
+            t4 = clock()
+            show(kind, raw, packet)
+            t5 = clock()
+            if data is not None:
+                observe[PARSE](t4 - t3)
+            observe[RENDER](t5 - t4)
+            observe[TOTAL](t5 - t0)
+            if due is not None:
+                observe[LAG](max(t5 - due, 0.0))
+        self.elapsed += clock() - start
+
+    def report(self) -> List[dict]:
+        """Return a dict of statistics for each stage with data.
+
+        Each has the stage's count, busy seconds, lines per busy
+        second, and mean and percentiles in seconds.
+        """
+        rows = []
+        for stage in STAGES:
+            histogram = self.histograms[stage]
+            if not histogram.count:
+                continue
+            row = {
+                "stage": stage,
+                "count": histogram.count,
+                "seconds": histogram.sum,
+                "per_second": histogram.count / histogram.sum if histogram.sum else None,
+                "mean": histogram.sum / histogram.count,
+            }
+            for q in QUANTILES:
+                row[f"p{round(q * 100)}"] = histogram.quantile(q)
+            rows.append(row)
+        return rows
+
+    def line(self) -> str:
+        rate = self.lines / self.elapsed if self.elapsed else 0.0
+        return (
+            f"replayed {self.lines} lines ({self.packets} packets) in "
+            f"{self.elapsed:.2f}s, {rate:.0f} lines/s"
+        )
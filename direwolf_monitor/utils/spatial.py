@@ -0,0 +1,182 @@
+"""A grid index of positions for radius, bounding box and nearest queries.
+
+:class:`GridIndex` buckets keys (callsigns) into cells of `cell_degrees`
+latitude by longitude.  Moving a key is two dict operations, and a query
+only looks at the cells its area overlaps, then measures the candidates
+exactly with the :mod:`~direwolf_monitor.utils.geo` batch API::
+
+    index = GridIndex()
+    index.update("K6YZA-4", 37.25, -122.13)
+    index.radius(37.42, -122.08, 20)      # [("K6YZA-4", 12.1)]
+    index.nearest(37.42, -122.08, 5)
+    index.bbox(37.0, -123.0, 38.0, -122.0)
+
+Longitudes wrap at the antimeridian: a box whose west edge is east of
+its east edge crosses it.
+"""
+import math
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from direwolf_monitor.utils import geo
+
+# About 17 miles of latitude; a few stations per cell in a busy area.
+DEFAULT_CELL_DEGREES = 0.25
+
+
+class GridIndex:
+    """Positions bucketed in a latitude/longitude grid.
+
+    Args:
+        cell_degrees: side of a grid cell in degrees.
+    """
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._rows = math.ceil(180 / cell_degrees)
+        self._cols = math.ceil(360 / cell_degrees)
+        # (row, col) -> {key: (latitude, longitude)}
+        self._cells = {}
+        # key -> (row, col)
+        self._where = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _row(self, latitude):
+        return min(max(int((latitude + 90) // self.cell_degrees), 0), self._rows - 1)
+
+    def _col(self, longitude):
+        return int(((longitude + 180) % 360) // self.cell_degrees) % self._cols
+
+    def update(self, key, latitude: float, longitude: float):
+        """Add `key` at a position, or move it there."""
+        cell = (self._row(latitude), self._col(longitude))
+        old = self._where.get(key)
+        if old is not None and old != cell:
+            self._discard(key, old)
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            bucket = self._cells[cell] = {}
+        bucket[key] = (latitude, longitude)
+        self._where[key] = cell
+
+    def remove(self, key):
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            self._discard(key, cell)
+
+    def _discard(self, key, cell):
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._where.clear()
+
+    def _col_ranges(self, west, east) -> List[range]:
+        if east - west >= 360:
+            return [range(self._cols)]
+        first, last = self._col(west), self._col(east)
+        if first <= last and west <= east:
+            return [range(first, last + 1)]
+        return [range(first, self._cols), range(0, last + 1)]
+
+    def _candidates(self, south, west, north, east) -> Iterable[Tuple[object, float, float]]:
+        rows = range(self._row(south), self._row(north) + 1)
+        cols = self._col_ranges(west, east)
+        if len(rows) * sum(map(len, cols)) > len(self._cells):
+            # Fewer occupied cells than cells in the area, scan those.
+            for (row, col), bucket in self._cells.items():
+                if row in rows and any(col in r for r in cols):
+                    for key, (lat, lon) in bucket.items():
+                        yield key, lat, lon
+            return
+        cells = self._cells
+        for row in rows:
+            for r in cols:
+                for col in r:
+                    bucket = cells.get((row, col))
+                    if bucket:
+                        for key, (lat, lon) in bucket.items():
+                            yield key, lat, lon
+
+    def bbox(self, south: float, west: float, north: float, east: float,
+             accept: Optional[Callable[[object], bool]] = None) -> list:
+        """Return the keys inside a bounding box.
+
+        Args:
+            south, west, north, east: the box's edges in degrees.
+            accept: only return keys for which this returns True.
+        """
+        wraps = west > east
+        found = []
+        for key, lat, lon in self._candidates(south, west, north, east):
+            if not south <= lat <= north:
+                continue
+            if wraps:
+                if not (lon >= west or lon <= east):
+                    continue
+            elif not west <= lon <= east:
+                continue
+            if accept is None or accept(key):
+                found.append(key)
+        return found
+
+    def radius(self, latitude: float, longitude: float, miles: float,
+               accept: Optional[Callable[[object], bool]] = None) -> List[Tuple[object, float]]:
+        """Return ``(key, miles)`` within `miles` of a point, nearest first.
+
+        Args:
+            latitude: the point's latitude.
+            longitude: the point's longitude.
+            miles: the radius.
+            accept: only return keys for which this returns True.
+        """
+        angle = miles / geo.EARTH_RADIUS_MILES
+        if angle >= math.pi:
+            box = (-90, -180, 90, 180)
+        else:
+            lat = math.radians(latitude)
+            south, north = lat - angle, lat + angle
+            if south <= -math.pi / 2 or north >= math.pi / 2:
+                # The circle covers a pole, so every longitude.
+                box = (math.degrees(max(south, -math.pi / 2)), -180,
+                       math.degrees(min(north, math.pi / 2)), 180)
+            else:
+                dlon = math.degrees(math.asin(min(math.sin(angle) / math.cos(lat), 1.0)))
+                box = (math.degrees(south), longitude - dlon,
+                       math.degrees(north), longitude + dlon)
+
+        keys, lats, lons = [], [], []
+        for key, lat, lon in self._candidates(*box):
+            if accept is None or accept(key):
+                keys.append(key)
+                lats.append(lat)
+                lons.append(lon)
+        if not keys:
+            return []
+        distances, _ = geo.home(latitude, longitude).distances_bearings(lats, lons)
+        found = [(key, float(d)) for key, d in zip(keys, distances, strict=True) if d <= miles]
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest(self, latitude: float, longitude: float, k: int,
+                accept: Optional[Callable[[object], bool]] = None) -> List[Tuple[object, float]]:
+        """Return the `k` nearest ``(key, miles)`` to a point, nearest first.
+
+        Searches a radius of one cell, doubling it until `k` keys are
+        found or it covers the whole earth.
+        """
+        if k <= 0 or not self._where:
+            return []
+        miles = self.cell_degrees * math.pi / 180 * geo.EARTH_RADIUS_MILES
+        while True:
+            found = self.radius(latitude, longitude, miles, accept)
+            if len(found) >= k or miles / geo.EARTH_RADIUS_MILES >= math.pi:
+                return found[:k]
+            miles *= 2
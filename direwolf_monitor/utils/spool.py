@@ -0,0 +1,328 @@
+"""Spool log lines to disk while the MQTT broker is unreachable.
+
+paho only queues qos 0 messages in memory, and not at all while it's
+disconnected, so every line tailed during a broker outage used to be
+lost.  :class:`SpoolingPublisher` sits between the tailer and the MQTT
+client.  While the broker is down, or while there is still spooled data
+waiting to go out, lines are appended to a :class:`Spool` file.  Once
+the client reconnects a background thread drains the spool in batches
+under a rate limit, then publishing goes direct again.
+
+Spool file format
+-----------------
+Append-only, one record per direwolf line::
+
+    <unix timestamp> <line>\\n
+
+The timestamp is when the line was spooled, to the millisecond.  It is
+used to expire records older than `max_age`, and is handed on when the
+line is drained so records published from it keep roughly when the
+line was read.  Records that don't parse, say one torn
+by a crash mid write or a block zero filled by the filesystem, are
+skipped and counted in :attr:`Spool.corrupt`.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple, Union
+
+from direwolf_monitor.utils import batch
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_AGE = 60 * 60
+DEFAULT_DRAIN_RATE = 500
+DEFAULT_DRAIN_BATCH = 50
+
+# fsync the spool at most this often, rather than once per line.
+FSYNC_INTERVAL = 1.0
+
+
+def _parse(record: bytes) -> Optional[Tuple[float, bytes]]:
+    """Return a record's timestamp and line, None if it's malformed."""
+    ts, sep, line = record.partition(b" ")
+    if not sep or not record.endswith(b"\n"):
+        return None
+    try:
+        return float(ts), line
+    except ValueError:
+        return None
+
+
+class Spool:
+    """A bounded, append-only spool file of timestamped lines.
+
+    Args:
+        path: spool filename.  Existing contents are kept, so lines
+            spooled before a restart are drained after it.
+        max_bytes: when an append would grow the file past this, the
+            oldest records are dropped until it's back under 3/4 of it.
+        max_age: records older than this many seconds are dropped
+            rather than published.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.dropped = 0
+        self.expired = 0
+        self.corrupt = 0
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        self._size = os.fstat(self._fd).st_size
+        self._drop_torn_record()
+        # Everything before this offset has been published.
+        self._offset = 0
+        # Bumped when the file is rewritten, invalidating read cursors.
+        self._generation = 0
+        self._last_fsync = time.monotonic()
+
+    def __len__(self):
+        """Bytes still waiting to be drained."""
+        return self._size - self._offset
+
+    @property
+    def pending(self) -> bool:
+        return self._size > self._offset
+
+    def close(self):
+        with self._lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
+
+    def _drop_torn_record(self):
+        """Truncate a last record left without its newline by a crash.
+
+        Otherwise the next line appended would be glued onto it.
+        """
+        if not self._size:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self._size - 4096))
+            tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        end = tail.rfind(b"\n")
+        if end < 0 and self._size > len(tail):
+            # No newline in the last block either; keep it, read() and
+            # _compact() skip whatever doesn't parse.
+            return
+        size = self._size - len(tail) + end + 1
+        LOG.warning(f"Spool {self.path} ends in a torn record, dropping {self._size - size} bytes")
+        os.ftruncate(self._fd, size)
+        self._size = size
+        self.corrupt += 1
+
+    def append(self, line: bytes):
+        record = b"%.3f %s" % (time.time(), line)
+        if not record.endswith(b"\n"):
+            record += b"\n"
+        with self._lock:
+            if self._size + len(record) > self.max_bytes:
+                self._compact()
+            os.write(self._fd, record)
+            self._size += len(record)
+            now = time.monotonic()
+            if now - self._last_fsync >= FSYNC_INTERVAL:
+                os.fsync(self._fd)
+                self._last_fsync = now
+
+    def read(self, max_lines) -> Tuple[List[bytes], Tuple[int, int]]:
+        """Return up to `max_lines` undrained lines and a cursor after them.
+
+        Expired and malformed records are skipped, so the list may be
+        empty even though the spool was :attr:`pending`.  Pass the cursor
+        to :meth:`commit` once the lines have been published.
+        """
+        records, cursor = self.read_records(max_lines)
+        return [line for _, line, _ in records], cursor
+
+    def read_records(self, max_lines):
+        """Like :meth:`read`, but return ``(timestamp, line, cursor)`` for each line.
+
+        Each line's cursor is the one to commit if only the lines up to
+        and including it were published.
+        """
+        records = []
+        with self._lock:
+            offset = self._offset
+            oldest = time.time() - self.max_age
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                while len(records) < max_lines and offset < self._size:
+                    record = f.readline(self._size - offset)
+                    if not record:
+                        break
+                    offset += len(record)
+                    parsed = _parse(record)
+                    if parsed is None:
+                        self.corrupt += 1
+                        continue
+                    if parsed[0] < oldest:
+                        self.expired += 1
+                        continue
+                    records.append(parsed + ((self._generation, offset),))
+        return records, (self._generation, offset)
+
+    def commit(self, cursor):
+        """Mark everything before `cursor` as published.
+
+        If the spool was compacted since the cursor was read, the commit
+        is ignored and those lines may be sent again; delivery is at
+        least once.  Once the whole spool is drained the file is
+        truncated.
+        """
+        generation, offset = cursor
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._offset = max(self._offset, min(offset, self._size))
+            if self._offset >= self._size:
+                os.ftruncate(self._fd, 0)
+                self._size = 0
+                self._offset = 0
+
+    def _compact(self):
+        """Drop drained, expired and the oldest records to make room."""
+        target = self.max_bytes * 3 // 4
+        oldest = time.time() - self.max_age
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            records = f.readlines()
+        keep = []
+        size = 0
+        for record in reversed(records):
+            parsed = _parse(record)
+            if parsed is None:
+                self.corrupt += 1
+                continue
+            if parsed[0] < oldest:
+                self.expired += 1
+                continue
+            if size + len(record) > target:
+                self.dropped += 1
+                continue
+            keep.append(record)
+            size += len(record)
+        keep.reverse()
+        LOG.warning(
+            f"Spool {self.path} full, dropped {len(records) - len(keep)} oldest lines",
+        )
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.writelines(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+        self._size = size
+        self._offset = 0
+        self._generation += 1
+
+
+class SpoolingPublisher:
+    """Publish lines directly, or spool them while the broker is away.
+
+    Args:
+        send: called as ``send(payload, count, spooled)``, returns True
+            if the payload was handed to a connected client.  `spooled`
+            is when its first line was spooled, or None if it wasn't.
+            If only the first lines went out it can return how many
+            did, and only the rest are spooled or sent again.
+        spool: the :class:`Spool` to use during outages.
+        drain_rate: max lines per second when draining the spool.
+        drain_batch: lines per payload when draining, framed as in
+            :mod:`direwolf_monitor.utils.batch`.
+    """
+
+    def __init__(self, send: Callable[[Union[bytes, str], int], bool], spool: Spool,
+                 drain_rate=DEFAULT_DRAIN_RATE, drain_batch=DEFAULT_DRAIN_BATCH):
+        self.send = send
+        self.spool = spool
+        self.drain_rate = drain_rate
+        self.drain_batch = drain_batch
+        self.spooled = 0
+        self.drained = 0
+        self._connected = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._drain, name="dwm-spool-drain", daemon=True,
+        )
+        self._thread.start()
+
+    def publish(self, payload: Union[bytes, str], count: int = 1) -> bool:
+        """Send `payload`, or spool its lines if that's not possible now.
+
+        Returns True once the lines are sent or safely in the spool.
+        """
+        sent = 0
+        # Anything already spooled has to go out first to keep ordering.
+        if self._connected.is_set() and not self.spool.pending:
+            sent = self.send(payload, count, None)
+            if sent is True:
+                return True
+            self._connected.clear()
+        if isinstance(payload, str):
+            payload = payload.encode("UTF-8")
+        lines = list(batch.split_raw_lines(payload))
+        for line in lines[sent or 0:]:
+            self.spool.append(line)
+            self.spooled += 1
+        self._wake.set()
+        return True
+
+    def connected(self):
+        if self.spool.pending:
+            LOG.info(f"Connected, draining {len(self.spool)} spooled bytes")
+        self._connected.set()
+        self._wake.set()
+
+    def disconnected(self):
+        self._connected.clear()
+        LOG.warning(f"Disconnected, spooling to {self.spool.path}")
+
+    def close(self):
+        self._stopped = True
+        self._connected.set()
+        self._wake.set()
+        self._thread.join()
+        self.spool.close()
+
+    def _commit_sent(self, records, sent: int):
+        """Commit the first `sent` of `records`, they went out."""
+        self.spool.commit(records[sent - 1][2])
+        self.drained += sent
+
+    def _drain(self):
+        while not self._stopped:
+            self._connected.wait()
+            if self._stopped:
+                break
+            if not self.spool.pending:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            records, cursor = self.spool.read_records(self.drain_batch)
+            lines = [line for _, line, _ in records]
+            if lines:
+                sent = self.send(b"".join(lines), len(lines), records[0][0])
+                if sent is not True:
+                    self._connected.clear()
+                    if sent:
+                        self._commit_sent(records, sent)
+                    continue
+            self.spool.commit(cursor)
+            self.drained += len(lines)
+            if lines:
+                time.sleep(len(lines) / self.drain_rate)
+            else:
+                # Only expired or malformed records, or the spool was
+                # compacted under us; wait for the next line rather than
+                # spinning on the same offset.
+                self._wake.wait()
+                self._wake.clear()
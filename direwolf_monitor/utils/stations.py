@@ -0,0 +1,305 @@
+"""Who we have heard: a bounded table of stations by callsign.
+
+Every packet we receive updates its sender's :class:`Station` record:
+last position and symbol, when it was first and last heard, how many
+packets of each type it sent and the path of the last one.  The table
+is an ordered dict kept in last-heard order, so an update is a lookup
+and a move to the end, and evicting the least recently heard stations
+(past `max_stations`, or not heard for `max_age` seconds) pops from the
+front.
+
+Stations with a position are also kept in a
+:class:`~direwolf_monitor.utils.spatial.GridIndex`, updated as positions
+arrive, for :meth:`StationTable.within`, :meth:`StationTable.in_bbox`
+and :meth:`StationTable.nearest`.
+
+With a `path` the table is loaded from it when started and saved to it
+every `interval` seconds and on close, the same way as
+:class:`~direwolf_monitor.utils.checkpoint.Checkpoint`.  ``dwm
+stations`` reads that snapshot.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from direwolf_monitor.utils import spatial
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_MAX_STATIONS = 20000
+# A day.
+DEFAULT_MAX_AGE = 86400
+DEFAULT_INTERVAL = 60.0
+
+SNAPSHOT_VERSION = 1
+
+
+class Station:
+    """What we know about one callsign."""
+
+    __slots__ = (
+        "callsign", "latitude", "longitude", "symbol", "symbol_table",
+        "first_heard", "last_heard", "packets", "counts", "path",
+    )
+
+    def __init__(self, callsign, now):
+        self.callsign = callsign
+        self.latitude = None
+        self.longitude = None
+        self.symbol = None
+        self.symbol_table = None
+        self.first_heard = now
+        self.last_heard = now
+        self.packets = 0
+        # packet type name -> count
+        self.counts = {}
+        self.path = ()
+
+    def __repr__(self):
+        return f"Station({self.callsign!r}, packets={self.packets})"
+
+    def heard(self, packet, now):
+        """Update the record from one of the station's packets."""
+        self.last_heard = now
+        self.packets += 1
+        name = packet.__class__.__name__
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.path = tuple(packet.path or ())
+        latitude = getattr(packet, "latitude", None)
+        longitude = getattr(packet, "longitude", None)
+        if latitude is not None and longitude is not None:
+            self.latitude = latitude
+            self.longitude = longitude
+        symbol = getattr(packet, "symbol", None)
+        if symbol:
+            self.symbol = symbol
+            self.symbol_table = getattr(packet, "symbol_table", None)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Station":
+        station = cls(data["callsign"], data["first_heard"])
+        for name in cls.__slots__:
+            if name in data:
+                setattr(station, name, data[name])
+        station.path = tuple(station.path)
+        station.counts = dict(station.counts)
+        return station
+
+
+def _sender(packet):
+    # A third party packet was gated by the outer sender for the inner one.
+    subpacket = getattr(packet, "subpacket", None)
+    return subpacket if subpacket is not None else packet
+
+
+class StationTable:
+    """Bounded, last-heard ordered table of :class:`Station` records.
+
+    Args:
+        max_stations: most stations to keep, the least recently heard
+            are dropped first.
+        max_age: forget stations not heard for this many seconds, 0 to
+            keep them until there are too many.
+        path: snapshot file to load when started and save to.
+        interval: seconds between snapshot writes.
+    """
+
+    def __init__(self, max_stations=DEFAULT_MAX_STATIONS, max_age=DEFAULT_MAX_AGE,
+                 path=None, interval=DEFAULT_INTERVAL):
+        self.max_stations = max_stations
+        self.max_age = max_age
+        self.path = os.path.abspath(path) if path else None
+        self.interval = interval
+        self.evictions = 0
+        self.writes = 0
+        self._stations = collections.OrderedDict()
+        self.index = spatial.GridIndex()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._stations)
+
+    def __contains__(self, callsign):
+        return callsign in self._stations
+
+    def get(self, callsign) -> Optional[Station]:
+        return self._stations.get(callsign)
+
+    def update(self, packet, now=None) -> Optional[Station]:
+        """Record a received packet against its sender."""
+        packet = _sender(packet)
+        callsign = getattr(packet, "from_call", None)
+        if not callsign:
+            return None
+        if now is None:
+            now = time.time()
+        with self._lock:
+            station = self._stations.get(callsign)
+            if station is None:
+                station = self._stations[callsign] = Station(callsign, now)
+                if len(self._stations) > self.max_stations:
+                    self._evict()
+            else:
+                self._stations.move_to_end(callsign)
+            station.heard(packet, now)
+            if station.latitude is not None:
+                self.index.update(callsign, station.latitude, station.longitude)
+            self._expire(now)
+        return station
+
+    def _evict(self):
+        callsign, _ = self._stations.popitem(last=False)
+        self.index.remove(callsign)
+        self.evictions += 1
+
+    def _expire(self, now):
+        if not self.max_age:
+            return
+        cutoff = now - self.max_age
+        stations = self._stations
+        while stations:
+            oldest = next(iter(stations.values()))
+            if oldest.last_heard >= cutoff:
+                break
+            self._evict()
+
+    def heard(self, since: Optional[float] = None, now=None) -> List[Station]:
+        """Return the stations heard in the last `since` seconds, newest first."""
+        if now is None:
+            now = time.time()
+        cutoff = now - since if since else None
+        result = []
+        with self._lock:
+            for station in reversed(self._stations.values()):
+                if cutoff is not None and station.last_heard < cutoff:
+                    break
+                result.append(station)
+        return result
+
+    def _accept(self, since, now):
+        if not since:
+            return None
+        cutoff = (now if now is not None else time.time()) - since
+        stations = self._stations
+        return lambda callsign: stations[callsign].last_heard >= cutoff
+
+    def within(self, latitude: float, longitude: float, miles: float,
+               since: Optional[float] = None, now=None) -> List[Tuple[Station, float]]:
+        """Return ``(station, miles)`` within `miles` of a point, nearest first.
+
+        Args:
+            latitude: the point's latitude, usually our own.
+            longitude: the point's longitude.
+            miles: the radius.
+            since: only stations heard in the last this many seconds.
+        """
+        with self._lock:
+            found = self.index.radius(latitude, longitude, miles, self._accept(since, now))
+            return [(self._stations[callsign], d) for callsign, d in found]
+
+    def in_bbox(self, south: float, west: float, north: float, east: float,
+                since: Optional[float] = None, now=None) -> List[Station]:
+        """Return the stations inside a bounding box, in no particular order."""
+        with self._lock:
+            found = self.index.bbox(south, west, north, east, self._accept(since, now))
+            return [self._stations[callsign] for callsign in found]
+
+    def nearest(self, latitude: float, longitude: float, k: int,
+                since: Optional[float] = None, now=None) -> List[Tuple[Station, float]]:
+        """Return the `k` nearest ``(station, miles)`` to a point."""
+        with self._lock:
+            found = self.index.nearest(latitude, longitude, k, self._accept(since, now))
+            return [(self._stations[callsign], d) for callsign, d in found]
+
+    def snapshot(self) -> dict:
+        """Return the table as JSON-able data, oldest heard first."""
+        with self._lock:
+            stations = [station.to_dict() for station in self._stations.values()]
+        return {
+            "version": SNAPSHOT_VERSION,
+            "time": time.time(),
+            "stations": stations,
+        }
+
+    def restore(self, snapshot: dict):
+        """Replace the table's contents with a :meth:`snapshot`."""
+        stations = sorted(
+            (Station.from_dict(data) for data in snapshot["stations"]),
+            key=lambda station: station.last_heard,
+        )
+        with self._lock:
+            self._stations = collections.OrderedDict(
+                (station.callsign, station) for station in stations[-self.max_stations:]
+            )
+            self.index.clear()
+            for station in self._stations.values():
+                if station.latitude is not None:
+                    self.index.update(station.callsign, station.latitude, station.longitude)
+            self._expire(time.time())
+
+    def start(self):
+        """Load the snapshot, then save it every `interval` seconds."""
+        if self.path:
+            snapshot = load(self.path)
+            if snapshot is not None:
+                self.restore(snapshot)
+            self._thread = threading.Thread(
+                target=self._run, name="dwm-stations", daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self.save()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.save()
+
+    def save(self, path=None):
+        """Write a snapshot to `path`, or the table's own path."""
+        path = path or self.path
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError as e:
+            LOG.error(f"Failed to write station snapshot {path}: {e}")
+            return
+        self.writes += 1
+
+    def line(self) -> str:
+        """Return the counters as a summary fragment."""
+        return f"stations {len(self)}/{self.max_stations} evictions {self.evictions}"
+
+
+def load(path) -> Optional[dict]:
+    """Return the snapshot saved at `path`, or None if there isn't one."""
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"unknown version {snapshot.get('version')}")
+        if not isinstance(snapshot.get("stations"), list):
+            raise ValueError("no stations")
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        LOG.warning(f"Ignoring unreadable station snapshot {path}: {e}")
+        return None
+    return snapshot
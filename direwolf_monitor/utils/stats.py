@@ -0,0 +1,83 @@
+"""Periodic one-line summaries for --headless mode.
+
+Running as a systemd service, printing every line only feeds journald.
+In headless mode the commands instead bump a few counters per line and a
+:class:`Summary` logs one line every `interval` seconds, e.g.::
+
+    log_to_mqtt: 41.2 lines/s 3.1 KB/s failures 0 queue 0
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_INTERVAL = 60
+
+
+class Summary:
+    """Count lines, bytes and failures, and log their rates periodically.
+
+    The counters are plain attributes so the hot path only pays for an
+    integer add.
+
+    Args:
+        name: prefix for the summary line.
+        interval: seconds between summaries.
+        depth: optional callable returning the current queue depth.
+        extra: optional callable returning more text for the line, e.g.
+            :meth:`~direwolf_monitor.utils.cache.ParseCache.line`.
+    """
+
+    def __init__(self, name, interval=DEFAULT_INTERVAL,
+                 depth: Optional[Callable[[], int]] = None,
+                 extra: Optional[Callable[[], str]] = None):
+        self.name = name
+        self.interval = interval
+        self.depth = depth
+        self.extra = extra
+        self.lines = 0
+        self.bytes = 0
+        self.failures = 0
+        self._last = (time.monotonic(), 0, 0)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def count(self, nbytes, lines=1):
+        self.lines += lines
+        self.bytes += nbytes
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="dwm-summary", daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            LOG.info(self.line())
+
+    def line(self) -> str:
+        """Return the summary since the last call."""
+        now = time.monotonic()
+        then, lines, nbytes = self._last
+        self._last = (now, self.lines, self.bytes)
+        elapsed = max(now - then, 1e-9)
+        msg = (
+            f"{self.name}: {(self.lines - lines) / elapsed:.1f} lines/s "
+            f"{(self.bytes - nbytes) / elapsed / 1024:.1f} KB/s "
+            f"failures {self.failures}"
+        )
+        if self.depth:
+            msg += f" queue {self.depth()}"
+        if self.extra:
+            msg += f" {self.extra()}"
+        return msg
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            LOG.info(self.line())
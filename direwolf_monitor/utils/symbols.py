@@ -0,0 +1,181 @@
+"""APRS symbol tiles for the terminal.
+
+The symbol charts ship with the package in ``direwolf_monitor/symbols``:
+a 16x6 grid of 128 px tiles each, ``!`` to ``~`` in order, for the
+primary table (0), the alternate table (1) and the overlay characters
+(2).  A symbol table of ``/`` or ``\\`` picks a chart; any other table
+character is an overlay, drawn over the alternate table symbol.
+
+:class:`SymbolAtlas` opens a chart the first time a symbol from it is
+needed, scales each tile down to the terminal's cell size once, and
+keeps the rendered escape sequence, so showing a symbol again is a dict
+lookup.
+"""
+import collections
+import logging
+import threading
+from importlib import resources
+from typing import Optional
+
+from PIL import Image
+
+LOG = logging.getLogger("dwm")
+
+TILE_SIZE = 128
+COLUMNS = 16
+# '!' to '~'
+SYMBOLS = 94
+
+PRIMARY = "/"
+ALTERNATE = "\\"
+CHARTS = {
+    PRIMARY: "aprs-symbols-128-0.png",
+    ALTERNATE: "aprs-symbols-128-1.png",
+}
+OVERLAY_CHART = "aprs-symbols-128-2.png"
+
+# Overlays are keyed by (overlay, symbol), bound them separately.
+DEFAULT_MAX_OVERLAYS = SYMBOLS
+# Tile size when the terminal doesn't report its cell size; big enough
+# for the block renderer, which uses 2 pixels per cell.
+DEFAULT_TILE_PIXELS = 8
+
+# Format spec for a symbol one cell high, as packet_print used.
+RENDER_FORMAT = "1.1#"
+
+
+def _open_chart(name):
+    path = resources.files("direwolf_monitor").joinpath("symbols", name)
+    with path.open("rb") as f:
+        chart = Image.open(f)
+        chart.load()
+    return chart
+
+
+def _tile_pixels():
+    try:
+        from term_image.utils import get_cell_size
+        cell = get_cell_size()
+    except Exception:
+        cell = None
+    return cell[1] if cell else DEFAULT_TILE_PIXELS
+
+
+class SymbolAtlas:
+    """Lazily loaded, pre-scaled APRS symbol tiles.
+
+    Args:
+        tile_pixels: side of the scaled tiles.  Defaults to the
+            terminal's cell height.
+        max_overlays: overlay symbols to keep.  The primary and
+            alternate tables hold at most 2x94 tiles between them.
+    """
+
+    def __init__(self, tile_pixels: Optional[int] = None,
+                 max_overlays=DEFAULT_MAX_OVERLAYS):
+        self.tile_pixels = tile_pixels
+        self.max_overlays = max_overlays
+        self._charts = {}
+        self._images = {}
+        self._rendered = {}
+        self._overlays = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _chart(self, name):
+        chart = self._charts.get(name)
+        if chart is None:
+            chart = self._charts[name] = _open_chart(name)
+        return chart
+
+    def _crop(self, name, symbol):
+        offset = ord(symbol) - 33
+        row, col = divmod(offset, COLUMNS)
+        return self._chart(name).crop((
+            col * TILE_SIZE,
+            row * TILE_SIZE,
+            col * TILE_SIZE + TILE_SIZE,
+            row * TILE_SIZE + TILE_SIZE,
+        ))
+
+    def _scale(self, tile):
+        if self.tile_pixels is None:
+            self.tile_pixels = _tile_pixels()
+        size = self.tile_pixels
+        if size >= TILE_SIZE:
+            return tile
+        return tile.resize((size, size), Image.LANCZOS)
+
+    def _tile(self, symbol, table):
+        if table in CHARTS:
+            return self._scale(self._crop(CHARTS[table], symbol))
+        tile = self._crop(CHARTS[ALTERNATE], symbol)
+        if _valid(table):
+            tile = Image.alpha_composite(tile, self._crop(OVERLAY_CHART, table))
+        return self._scale(tile)
+
+    def image(self, symbol: str, table: str = PRIMARY):
+        """Return a one cell high term_image image of a symbol.
+
+        Returns None for characters that aren't symbols.
+        """
+        if not _valid(symbol):
+            return None
+        key = (table, symbol)
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                from term_image.image import AutoImage
+                image = AutoImage(self._tile(symbol, table))
+                image.height = 1
+                if table not in CHARTS:
+                    self._add_overlay(key)
+                self._images[key] = image
+            return image
+
+    def render(self, symbol: str, table: str = PRIMARY) -> str:
+        """Return the symbol rendered for the terminal, or '' if invalid."""
+        key = (table, symbol)
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            self.hits += 1
+            if table not in CHARTS:
+                with self._lock:
+                    if key in self._overlays:
+                        self._overlays.move_to_end(key)
+            return rendered
+        if not _valid(symbol):
+            return ""
+        self.misses += 1
+        rendered = format(self.image(symbol, table), RENDER_FORMAT)
+        with self._lock:
+            # Unless the overlay was evicted meanwhile.
+            if table in CHARTS or key in self._overlays:
+                self._rendered[key] = rendered
+        return rendered
+
+    def _add_overlay(self, key):
+        self._overlays[key] = None
+        while len(self._overlays) > self.max_overlays:
+            old, _ = self._overlays.popitem(last=False)
+            self._images.pop(old, None)
+            self._rendered.pop(old, None)
+
+    def __len__(self):
+        return len(self._images)
+
+
+def _valid(char):
+    return isinstance(char, str) and len(char) == 1 and "!" <= char <= "~"
+
+
+_atlas = None
+
+
+def atlas() -> SymbolAtlas:
+    """Return the shared atlas, creating it on first use."""
+    global _atlas
+    if _atlas is None:
+        _atlas = SymbolAtlas()
+    return _atlas
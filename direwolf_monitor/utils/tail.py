@@ -0,0 +1,330 @@
+"""Follow a growing log file without busy polling.
+
+The original :func:`direwolf_monitor.cmds.log.follow` sleeps a fixed
+100 ms after every empty read.  That puts up to 100 ms of latency on
+every packet and keeps waking an otherwise idle Pi.  The tailer here
+blocks on an inotify watch (through watchdog) and only wakes when the
+file actually changes.  When inotify isn't available it falls back to
+polling with an adaptive backoff.
+
+:class:`Tailer` also follows logrotate, in both the rename/create and
+copytruncate styles, which the original ``follow()`` never noticed.
+"""
+import logging
+import os
+import threading
+from typing import Iterator, Optional
+
+LOG = logging.getLogger("dwm")
+
+# Upper bound on how long we block without re-checking the file, even
+# when inotify is in use.  This covers filesystems that don't deliver
+# events (NFS, some FUSE mounts).
+DEFAULT_MAX_WAIT = 1.0
+
+# Polling backoff range used when inotify isn't available.
+DEFAULT_MIN_POLL = 0.005
+DEFAULT_MAX_POLL = 0.5
+
+# How much to ask for per read.  Large enough that a burst of packets is
+# picked up in one syscall.
+CHUNK_SIZE = 64 * 1024
+
+
+class PollingWatcher:
+    """Wait for a file to change by polling with exponential backoff.
+
+    Every empty wait doubles the sleep interval up to `max_interval`.
+    Calling :meth:`reset` after data was read drops it back to
+    `min_interval`, so bursts are picked up quickly and idle files cost
+    at most a couple of wakeups a second.
+    """
+
+    kind = "poll"
+
+    def __init__(self, path, min_interval=DEFAULT_MIN_POLL,
+                 max_interval=DEFAULT_MAX_POLL):
+        self.path = os.path.abspath(path)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._interval = min_interval
+        self._stopped = threading.Event()
+
+    def start(self):
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def reset(self):
+        """Data was read, go back to the fastest poll rate."""
+        self._interval = self.min_interval
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleep for the current backoff interval.
+
+        Returns False if the watcher was stopped while waiting.
+        """
+        interval = self._interval
+        if timeout is not None:
+            interval = min(interval, timeout)
+        self._interval = min(self._interval * 2, self.max_interval)
+        return not self._stopped.wait(interval)
+
+
+class InotifyWatcher:
+    """Wait for a file to change using an inotify watch on its directory.
+
+    The parent directory is watched rather than the file itself so that
+    events for a file that is created, moved or replaced are seen too.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, path, max_wait=DEFAULT_MAX_WAIT):
+        # Imported here so a missing or broken watchdog install only
+        # costs us the fallback to polling.
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers.inotify import InotifyObserver
+
+        self.path = os.path.abspath(path)
+        self.max_wait = max_wait
+        self._changed = threading.Event()
+        self._stopped = False
+
+        watched = self.path
+        changed = self._changed
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if (event.src_path == watched
+                        or getattr(event, "dest_path", None) == watched):
+                    changed.set()
+
+        self._observer = InotifyObserver()
+        self._observer.daemon = True
+        self._observer.schedule(
+            _Handler(), os.path.dirname(self.path), recursive=False,
+        )
+
+    def start(self):
+        self._observer.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._changed.set()
+        try:
+            self._observer.stop()
+        except Exception as e:
+            LOG.debug(f"Failed to stop inotify observer: {e}")
+
+    def reset(self):
+        pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the file changes, or `timeout` expires.
+
+        The event stays set until consumed here, so a write that lands
+        between the reader's last empty read and this call still wakes
+        us immediately.  Returns False if the watcher was stopped.
+        """
+        if timeout is None:
+            timeout = self.max_wait
+        self._changed.wait(timeout)
+        self._changed.clear()
+        return not self._stopped
+
+
+def create_watcher(path, use_inotify=True, **kwargs):
+    """Return a started watcher for `path`.
+
+    Uses inotify when it's asked for and available, otherwise falls back
+    to a :class:`PollingWatcher`.
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher(path).start()
+        except Exception as e:
+            LOG.warning(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(path, **kwargs).start()
+
+
+class Tailer:
+    """Yield lines appended to a file as they are written.
+
+    The file is read in large chunks with ``os.read`` and split on
+    ``\n`` with ``bytes.find`` over a memoryview, so a line is copied
+    once on its way out instead of being built up by string
+    concatenation.  Only an unterminated tail is kept between reads.
+    Lines are decoded after they are complete, so a multi-byte UTF-8
+    sequence split across two reads is never decoded in halves.
+
+    When the reader hits EOF it stats `path` to notice rotation:
+
+      * a different inode means logrotate moved the file away and a new
+        one was created, so the new file is opened from the start.
+      * a size smaller than our read position means the file was
+        truncated in place (copytruncate), so we seek back to 0.
+
+    Args:
+        path: the file to follow.
+        watcher: a started watcher from :func:`create_watcher`.  One is
+            created for `path` if not given.
+        from_end: start at the current end of the file rather than the
+            beginning.
+        use_inotify: passed to :func:`create_watcher` when no watcher
+            is given.
+        chunk_size: how many bytes to ask for per ``os.read``.
+        encoding: used to decode lines in :meth:`lines`.  Invalid bytes
+            are replaced rather than raising.
+    """
+
+    def __init__(self, path, watcher=None, from_end=True, use_inotify=True,
+                 chunk_size=CHUNK_SIZE, encoding="utf-8"):
+        self.path = os.path.abspath(path)
+        self.watcher = watcher or create_watcher(self.path, use_inotify=use_inotify)
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        # offset in the current file just past the last line handed out
+        self.offset = 0
+        self.rotations = 0
+        self.truncations = 0
+        # True once a read found nothing left in the file.
+        self.eof = False
+        self._partial = bytearray()
+        self._fd = None
+        self._inode = None
+        self._stopped = False
+        self._open(os.SEEK_END if from_end else os.SEEK_SET)
+
+    def _open(self, whence=os.SEEK_SET, offset=0, path=None):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(path or self.path, os.O_RDONLY)
+        self._inode = os.fstat(self._fd).st_ino
+        self._pos = os.lseek(self._fd, offset, whence)
+        self.offset = self._pos
+        self._partial = bytearray()
+
+    @property
+    def inode(self):
+        """Inode of the file currently being read."""
+        return self._inode
+
+    def resume(self, inode, offset):
+        """Continue from `offset` in the file that had `inode`.
+
+        If the log was rotated since, the rotated copy is looked for next
+        to it (direwolf.log.1 and so on) and read to its end before
+        moving on to the current file.  Returns False if the old file is
+        gone and we had to start from the beginning of the current one.
+        """
+        if inode == self._inode:
+            if offset > os.fstat(self._fd).st_size:
+                LOG.warning(f"{self.path} is shorter than the checkpoint, starting over")
+                offset = 0
+            self._open(offset=offset)
+            return True
+
+        dirname = os.path.dirname(self.path)
+        for entry in os.scandir(dirname):
+            if entry.is_file() and entry.inode() == inode:
+                LOG.info(f"Resuming from rotated log {entry.path}")
+                self._open(offset=offset, path=entry.path)
+                return True
+        LOG.warning(f"Checkpointed log for {self.path} is gone, starting over")
+        self._open()
+        return False
+
+    @property
+    def lag(self) -> int:
+        """Bytes written to the file that haven't been yielded yet."""
+        try:
+            size = os.fstat(self._fd).st_size
+        except (OSError, TypeError):
+            return 0
+        return max(size - self.offset, 0)
+
+    def stop(self):
+        self._stopped = True
+        self.watcher.stop()
+
+    def close(self):
+        self.stop()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _check_rotated(self) -> bool:
+        """Reopen or rewind the file if it was rotated or truncated.
+
+        Only called once the current descriptor is at EOF, so nothing
+        left in the old file is lost.  Returns True if the read position
+        changed.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # Moved away and not recreated yet, keep waiting on the old one.
+            return False
+        fst = os.fstat(self._fd)
+        if (st.st_ino, st.st_dev) != (fst.st_ino, fst.st_dev):
+            LOG.info(f"{self.path} was rotated, reopening")
+            if self._partial:
+                LOG.debug(f"Dropping {len(self._partial)} byte partial line")
+            self.rotations += 1
+            self._open()
+            return True
+        if st.st_size < self._pos:
+            LOG.info(f"{self.path} was truncated, reading from the start")
+            self.truncations += 1
+            self._pos = os.lseek(self._fd, 0, os.SEEK_SET)
+            self.offset = 0
+            self._partial = bytearray()
+            return True
+        return False
+
+    def __iter__(self) -> Iterator[str]:
+        return self.lines()
+
+    def lines(self) -> Iterator[str]:
+        encoding = self.encoding
+        for raw in self.raw_lines():
+            yield raw.decode(encoding, errors="replace")
+
+    def raw_lines(self) -> Iterator[bytes]:
+        """Yield each complete line, newline included, as bytes."""
+        while not self._stopped:
+            chunk = os.read(self._fd, self.chunk_size)
+            if not chunk:
+                self.eof = True
+                if self._check_rotated():
+                    continue
+                if not self.watcher.wait():
+                    break
+                continue
+
+            self.eof = False
+            self.watcher.reset()
+            self._pos += len(chunk)
+            if self._partial:
+                self._partial += chunk
+                data = self._partial
+            else:
+                data = chunk
+
+            start = 0
+            find = data.find
+            with memoryview(data) as view:
+                while (end := find(b"\n", start)) >= 0:
+                    end += 1
+                    self.offset += end - start
+                    yield view[start:end].tobytes()
+                    start = end
+                    if self._stopped:
+                        break
+            if start < len(data):
+                self._partial = bytearray(data[start:])
+            else:
+                self._partial = bytearray()
@@ -0,0 +1,230 @@
+"""Publish each packet to its own MQTT topic, for the broker to filter.
+
+By default every line goes to the one ``--mqtt-topic`` and every
+subscriber gets the full stream.  With ``log-to-mqtt --shard-topics``
+each packet goes to a topic made from :data:`DEFAULT_TEMPLATE`::
+
+    direwolf/<station>/<kind>/<type>/<from_call>
+    direwolf/home/rx/position/K6ABC-7
+    direwolf/home/ig/message/N0CALL
+    direwolf/home/ig_tx/message/WB4BOR-11
+
+so subscribers can use wildcards to take only what they show::
+
+    dwm mqtt-to-terminal --subscribe 'direwolf/+/+/weather/#'
+    dwm mqtt-to-terminal --subscribe 'direwolf/+/rx/+/K6ABC-7'
+
+`kind` is the line kind from :mod:`~direwolf_monitor.utils.classify`
+with ``>`` spelled ``_``.  `type` comes from the APRS data type
+identifier, see :func:`packet_type`; it is worked out from the raw bytes
+without parsing.  Lines that aren't packets aren't published.  APRS-IS
+server comments go to ``.../ig/comment/_``.
+"""
+import logging
+import re
+from typing import Iterator, Optional, Tuple
+
+from direwolf_monitor.utils import batch, classify, escape
+from direwolf_monitor.utils import metrics as metrics_utils
+
+LOG = logging.getLogger("dwm")
+
+DEFAULT_TEMPLATE = "{topic}/{station}/{kind}/{type}/{from_call}"
+TEMPLATE_FIELDS = ("topic", "station", "kind", "type", "from_call")
+
+POSITION = "position"
+MIC_E = "mic-e"
+MESSAGE = "message"
+BULLETIN = "bulletin"
+STATUS = "status"
+WEATHER = "weather"
+TELEMETRY = "telemetry"
+OBJECT = "object"
+ITEM = "item"
+NMEA = "nmea"
+QUERY = "query"
+CAPABILITIES = "capabilities"
+THIRD_PARTY = "third-party"
+USER_DEFINED = "user-defined"
+COMMENT = "comment"
+UNKNOWN = "unknown"
+
+PACKET_TYPES = [
+    POSITION, MIC_E, MESSAGE, BULLETIN, STATUS, WEATHER, TELEMETRY, OBJECT,
+    ITEM, NMEA, QUERY, CAPABILITIES, THIRD_PARTY, USER_DEFINED, COMMENT, UNKNOWN,
+]
+
+TOPIC_KINDS = (classify.RX, classify.TX, classify.IG, classify.IG_TX)
+
+# The data type identifier, the first byte of the information field.
+_TYPES = {
+    ord("!"): POSITION,
+    ord("="): POSITION,
+    ord("/"): POSITION,
+    ord("@"): POSITION,
+    ord("`"): MIC_E,
+    ord("'"): MIC_E,
+    0x1c: MIC_E,
+    0x1d: MIC_E,
+    ord(":"): MESSAGE,
+    ord(">"): STATUS,
+    ord("_"): WEATHER,
+    ord("#"): WEATHER,
+    ord("*"): WEATHER,
+    ord("T"): TELEMETRY,
+    ord(";"): OBJECT,
+    ord(")"): ITEM,
+    ord("$"): NMEA,
+    ord("?"): QUERY,
+    ord("<"): CAPABILITIES,
+    ord("}"): THIRD_PARTY,
+    ord("{"): USER_DEFINED,
+}
+_TELEMETRY_MESSAGE = re.compile(rb"^:[^:]{9}:(?:PARM|UNIT|EQNS|BITS)\.")
+# Where the symbol code is in a position without and with a timestamp,
+# counting the data type identifier.
+_SYMBOL_OFFSET = {ord("!"): 1, ord("="): 1, ord("/"): 8, ord("@"): 8}
+_UNSAFE = re.compile(r"[/+#\x00-\x20]")
+
+
+def packet_type(packet: bytes) -> str:
+    """Return what kind of APRS packet this is, from its data type identifier.
+
+    Positions with the weather symbol are :data:`WEATHER`, messages that
+    define telemetry are :data:`TELEMETRY` and ``BLN`` messages
+    :data:`BULLETIN`.  Anything else is decided by the first byte of the
+    information field alone.
+    """
+    colon = packet.find(b":")
+    if colon < 0 or colon + 1 >= len(packet):
+        return UNKNOWN
+    info = packet[colon + 1:]
+    dti = info[0]
+    kind = _TYPES.get(dti, UNKNOWN)
+    if kind == POSITION:
+        start = _SYMBOL_OFFSET[dti]
+        if info[start:start + 1].isdigit():
+            # Uncompressed: ddmm.mmN then the table, dddmm.mmE then the code.
+            code = info[start + 18:start + 19]
+        else:
+            # Compressed: the table, 8 bytes of position then the code.
+            code = info[start + 9:start + 10]
+        if code == b"_":
+            return WEATHER
+    elif kind == MESSAGE:
+        if info[1:4] == b"BLN":
+            return BULLETIN
+        if _TELEMETRY_MESSAGE.match(info):
+            return TELEMETRY
+    return kind
+
+
+def from_call(packet: bytes) -> str:
+    """Return the sender of a packet, everything before the ``>``."""
+    end = packet.find(b">")
+    return str(packet[:end] if end > 0 else b"", "UTF-8", "replace")
+
+
+def level(value: str) -> str:
+    """Make `value` safe to use as one topic level."""
+    return _UNSAFE.sub("_", value) or "_"
+
+
+def validate_template(template: str):
+    """Raise ValueError if `template` uses fields we don't have."""
+    try:
+        template.format(**{name: name for name in TEMPLATE_FIELDS})
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(
+            f"bad topic template {template!r}: {e}, the fields are "
+            f"{', '.join('{' + name + '}' for name in TEMPLATE_FIELDS)}"
+        ) from e
+
+
+def validate_filter(topic_filter: str):
+    """Raise ValueError if `topic_filter` isn't a valid MQTT subscription."""
+    if not topic_filter:
+        raise ValueError("empty topic filter")
+    levels = topic_filter.split("/")
+    for i, part in enumerate(levels):
+        if "#" in part and (part != "#" or i != len(levels) - 1):
+            raise ValueError(f"'#' must be the whole last level in {topic_filter!r}")
+        if "+" in part and part != "+":
+            raise ValueError(f"'+' must be a whole level in {topic_filter!r}")
+
+
+def subscriptions(topic: str, filters=()) -> list:
+    """Return the topic filters to subscribe to.
+
+    `filters` as given, or without any, `topic` and everything under
+    it, which takes both plain and sharded publishers.
+    """
+    if filters:
+        return list(filters)
+    if topic.endswith("#"):
+        return [topic]
+    return [f"{topic}/#"]
+
+
+class Router:
+    """Work out the topic of each line published.
+
+    Args:
+        topic: the base topic, ``--mqtt-topic``.
+        station: this direwolf's name, the second level by default.
+        template: how topics are made, see :data:`DEFAULT_TEMPLATE`.
+        metrics: a :class:`~direwolf_monitor.utils.metrics.Metrics` to
+            count lines that aren't published in.
+    """
+
+    def __init__(self, topic: str, station: str, template: str = DEFAULT_TEMPLATE,
+                 metrics: Optional[metrics_utils.Metrics] = None):
+        validate_template(template)
+        self.template = template
+        self.station = level(station)
+        self._topic = topic
+        metrics = metrics if metrics is not None else metrics_utils.Metrics()
+        self.skipped = metrics.counter("topics_skipped", "Lines that aren't packets")
+
+    def topic(self, line: bytes) -> Optional[str]:
+        """Return the topic for one log line, None if it isn't a packet."""
+        kind, raw = classify.classify(line)
+        if kind not in TOPIC_KINDS:
+            return None
+        if kind == classify.IG and raw[:1] == b"#":
+            ptype, sender = COMMENT, "_"
+        else:
+            packet = escape.decode(raw)
+            ptype, sender = packet_type(packet), from_call(packet)
+        return self.template.format(
+            topic=self._topic, station=self.station, kind=kind.replace(">", "_"),
+            type=ptype, from_call=level(sender),
+        )
+
+    def route(self, payload: bytes) -> Iterator[Tuple[str, bytes, int, int]]:
+        """Split a payload of lines by topic.
+
+        Yields ``(topic, payload, count, start)`` for each run of lines
+        that go to the same topic, keeping their order.  `start` is how
+        many of the payload's lines come before the run, counting the
+        ones that aren't published.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("UTF-8")
+        current = None
+        start = 0
+        lines = []
+        for i, line in enumerate(batch.split_raw_lines(payload)):
+            topic = self.topic(line)
+            if topic is None:
+                self.skipped.inc()
+                continue
+            if topic != current and lines:
+                yield current, b"\n".join(lines) + b"\n", len(lines), start
+                lines = []
+            if not lines:
+                start = i
+            current = topic
+            lines.append(line)
+        if lines:
+            yield current, b"\n".join(lines) + b"\n", len(lines), start
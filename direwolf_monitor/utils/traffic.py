@@ -0,0 +1,403 @@
+"""Synthetic direwolf log traffic for load tests.
+
+:class:`Traffic` makes up a population of stations around a point and
+produces what direwolf would print as they are heard: received packets
+(positions, Mic-E, messages, weather, telemetry, objects, status text
+with ``<0xNN>`` escaped bytes), our own ``[0L]`` beacons, ``[ig]``
+packets from APRS-IS and messages gated back to RF with ``[ig>tx]``,
+plus the audio level chatter around received packets::
+
+    traffic = Traffic(seed=1)
+    traffic.event()
+    # [b"K6ABC-7 audio level = 43(10/7)   [NONE]   |||||||__\\n",
+    #  b"[0.4] K6ABC-7>APDR16,WIDE1-1,WIDE2-1:=3742.61N/12225.27W>...\\n",
+    #  b"\\n"]
+
+How often each kind of event happens is a weighted `mix`.
+:meth:`Traffic.run` emits events at a steady, optionally ramping, rate.
+"""
+import logging
+import random
+import string
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from direwolf_monitor.utils import escape
+
+LOG = logging.getLogger("dwm")
+
+POSITION = "position"
+MIC_E = "mic-e"
+MESSAGE = "message"
+STATUS = "status"
+WEATHER = "weather"
+TELEMETRY = "telemetry"
+OBJECT = "object"
+ESCAPED = "escaped"
+BEACON = "beacon"
+IG = "ig"
+IG_TX = "ig-tx"
+KINDS = [
+    POSITION, MIC_E, MESSAGE, STATUS, WEATHER, TELEMETRY, OBJECT, ESCAPED,
+    BEACON, IG, IG_TX,
+]
+
+# Roughly what a busy metro area digipeater hears.
+DEFAULT_MIX = {
+    POSITION: 30, MIC_E: 20, MESSAGE: 8, STATUS: 8, WEATHER: 8, TELEMETRY: 4,
+    OBJECT: 4, ESCAPED: 4, BEACON: 4, IG: 7, IG_TX: 3,
+}
+DEFAULT_STATIONS = 200
+DEFAULT_LATITUDE = 37.7
+DEFAULT_LONGITUDE = -122.2
+# Degrees around the center that stations are spread over.
+DEFAULT_SPREAD = 1.0
+DEFAULT_MYCALL = "WB4BOR-11"
+DEFAULT_RATE = 10.0
+DEFAULT_RAMP_INTERVAL = 10.0
+# Most events emitted at once when the writer falls behind.
+MAX_BURST = 1000
+
+_PREFIXES = ["K", "N", "W", "AA", "KB", "KD", "KE", "KF", "KI", "KJ", "KK", "KM", "KN", "WA", "WB"]
+_TOCALLS = ["APDR16", "APK102", "APOT30", "APMI06", "APRS", "APN391", "APDW17", "APLRG1"]
+_PATHS = [["WIDE1-1", "WIDE2-1"], ["WIDE2-1"], ["WIDE2-2"], ["WIDE1-1"], []]
+_SYMBOLS = ["/>", "/[", "/k", "/-", "/#", "/_", "/v", "/j", "\\>", "/Y"]
+_WORDS = [
+    "monitoring", "146.52", "aprsd", "test", "mobile", "home", "qrv", "net",
+    "tonight", "73", "digi", "igate", "hiking", "weather", "ok", "thanks",
+]
+_SERVERS = ["T2USANE", "T2SPAIN", "T2CAEAST", "T2HUB"]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse ``kind=weight,...`` into a mix, e.g. ``"position=5,ig=1"``."""
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip().lower()
+        if kind not in KINDS:
+            raise ValueError(f"unknown traffic kind {kind!r}, not one of {', '.join(KINDS)}")
+        try:
+            mix[kind] = float(weight) if weight.strip() else 1.0
+        except ValueError as e:
+            raise ValueError(f"bad weight {weight!r} for {kind}") from e
+    if not mix or not any(mix.values()):
+        raise ValueError("the mix needs at least one kind with a weight")
+    return mix
+
+
+def _lat(latitude):
+    hemisphere = "N" if latitude >= 0 else "S"
+    latitude = abs(latitude)
+    degrees = int(latitude)
+    return f"{degrees:02d}{(latitude - degrees) * 60:05.2f}{hemisphere}"
+
+
+def _lon(longitude):
+    hemisphere = "E" if longitude >= 0 else "W"
+    longitude = abs(longitude)
+    degrees = int(longitude)
+    return f"{degrees:03d}{(longitude - degrees) * 60:05.2f}{hemisphere}"
+
+
+def mic_e(latitude: float, longitude: float, speed=0, course=0, symbol="/>") -> tuple:
+    """Return the ``(destination, information)`` of a Mic-E position.
+
+    Both are bytes as sent over the air, before direwolf escapes them.
+    The message bits are "Off Duty".
+    """
+    lat = abs(latitude)
+    degrees = int(lat)
+    hundredths = round((lat - degrees) * 6000)
+    minutes, hundredths = divmod(hundredths, 100)
+    if minutes == 60:
+        degrees, minutes = degrees + 1, 0
+    digits = f"{degrees:02d}{minutes:02d}{hundredths:02d}"
+
+    lon = abs(longitude)
+    lon_degrees = int(lon)
+    lon_hundredths = round((lon - lon_degrees) * 6000)
+    lon_minutes, lon_hundredths = divmod(lon_hundredths, 100)
+    if lon_minutes == 60:
+        lon_degrees, lon_minutes = lon_degrees + 1, 0
+    offset = not 10 <= lon_degrees <= 99
+
+    # P-Y is a 1 message bit, or north, +100 or west; 0-9 the opposite.
+    flags = [True, True, True, latitude >= 0, offset, longitude < 0]
+    destination = bytes(
+        ord("P" if flag else "0") + int(digit) for digit, flag in zip(digits, flags, strict=True)
+    )
+
+    if lon_degrees <= 9:
+        d = lon_degrees + 90
+    elif lon_degrees <= 99:
+        d = lon_degrees
+    elif lon_degrees <= 109:
+        d = lon_degrees - 20
+    else:
+        d = lon_degrees - 100
+    m = lon_minutes if lon_minutes >= 10 else lon_minutes + 60
+    information = bytes([
+        ord("`"), d + 28, m + 28, lon_hundredths + 28,
+        speed // 10 + 28, (speed % 10) * 10 + course // 100 + 28, course % 100 + 28,
+        ord(symbol[1]), ord(symbol[0]),
+    ])
+    return destination, information
+
+
+class _Station:
+    __slots__ = ("callsign", "tocall", "path", "symbol", "latitude", "longitude", "messages")
+
+    def __init__(self, callsign, tocall, path, symbol, latitude, longitude):
+        self.callsign = callsign
+        self.tocall = tocall
+        self.path = path
+        self.symbol = symbol
+        self.latitude = latitude
+        self.longitude = longitude
+        self.messages = 0
+
+
+class Traffic:
+    """Made up direwolf log lines from a population of stations.
+
+    Args:
+        mix: kind -> relative weight, see :data:`DEFAULT_MIX`.
+        stations: how many stations there are.
+        latitude: center of the area the stations are in.
+        longitude: center of the area.
+        spread: degrees around the center the stations are spread over.
+        mycall: our own callsign, for beacons and gated messages.
+        timestamps: prefix received packets with -T style ``%H:%M:%S``
+            timestamps.
+        chatter: add the audio level and blank lines direwolf prints
+            around received packets.
+        seed: seed for a repeatable sequence.
+    """
+
+    def __init__(self, mix: Optional[Dict[str, float]] = None, stations=DEFAULT_STATIONS,
+                 latitude=DEFAULT_LATITUDE, longitude=DEFAULT_LONGITUDE,
+                 spread=DEFAULT_SPREAD, mycall=DEFAULT_MYCALL, timestamps=False,
+                 chatter=True, seed=None):
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.spread = spread
+        self.mycall = mycall
+        self.timestamps = timestamps
+        self.chatter = chatter
+        self.events = 0
+        self.lines = 0
+        self.rate = 0.0
+        # Seconds the last run ended behind schedule.
+        self.behind = 0.0
+        self._random = random.Random(seed)
+        self._kinds = [kind for kind, weight in self.mix.items() if weight > 0]
+        self._weights = [self.mix[kind] for kind in self._kinds]
+        self._stations = [self._station() for _ in range(max(stations, 2))]
+        self._make = {
+            POSITION: self._position,
+            MIC_E: self._mic_e,
+            MESSAGE: self._message,
+            STATUS: self._status,
+            WEATHER: self._weather,
+            TELEMETRY: self._telemetry,
+            OBJECT: self._object,
+            ESCAPED: self._escaped,
+            BEACON: self._beacon,
+            IG: self._ig,
+            IG_TX: self._ig_tx,
+        }
+
+    def _callsign(self):
+        r = self._random
+        call = (r.choice(_PREFIXES) + str(r.randint(0, 9))
+                + "".join(r.choice(string.ascii_uppercase) for _ in range(r.randint(2, 3))))
+        ssid = r.choice([0, 0, 0, 1, 2, 5, 7, 9, 10, 15])
+        return f"{call}-{ssid}" if ssid else call
+
+    def _station(self):
+        r = self._random
+        return _Station(
+            self._callsign(), r.choice(_TOCALLS), r.choice(_PATHS), r.choice(_SYMBOLS),
+            self.latitude + r.uniform(-self.spread, self.spread),
+            self.longitude + r.uniform(-self.spread, self.spread),
+        )
+
+    def _pick(self) -> _Station:
+        station = self._random.choice(self._stations)
+        # Wander a little, so positions change between packets.
+        station.latitude += self._random.uniform(-0.001, 0.001)
+        station.longitude += self._random.uniform(-0.001, 0.001)
+        return station
+
+    def _words(self, low=1, high=5):
+        return " ".join(self._random.choice(_WORDS) for _ in range(self._random.randint(low, high)))
+
+    def _header(self, station, tocall=None):
+        path = ",".join([tocall or station.tocall] + station.path)
+        return f"{station.callsign}>{path}:".encode()
+
+    def _pos(self, station):
+        return (f"{_lat(station.latitude)}{station.symbol[0]}"
+                f"{_lon(station.longitude)}{station.symbol[1]}")
+
+    def _rx(self, station, info: bytes, tocall=None) -> List[bytes]:
+        """What direwolf prints for a received packet."""
+        r = self._random
+        channel = f"0.{r.randint(1, 6)}"
+        if self.timestamps:
+            channel += time.strftime(" %H:%M:%S")
+        packet = escape.encode(self._header(station, tocall) + info)
+        line = b"[" + channel.encode() + b"] " + packet + b"\n"
+        if not self.chatter:
+            return [line]
+        level = r.randint(20, 110)
+        audio = (f"{station.callsign} audio level = {level}({level // 4}/{level // 7})"
+                 f"   [NONE]   {'|' * r.randint(4, 9):_<9}\n").encode()
+        return [audio, line, b"\n"]
+
+    def _position(self):
+        station = self._pick()
+        return self._rx(station, f"={self._pos(station)}{self._words()}".encode())
+
+    def _mic_e(self):
+        station = self._pick()
+        destination, information = mic_e(
+            station.latitude, station.longitude,
+            speed=self._random.randint(0, 70), course=self._random.randint(0, 359),
+            symbol=station.symbol,
+        )
+        return self._rx(
+            station, information + b"]" + self._words(0, 2).encode(),
+            tocall=destination.decode(),
+        )
+
+    def _message(self):
+        station = self._pick()
+        other = self._random.choice(self._stations)
+        station.messages = station.messages % 99 + 1
+        return self._rx(
+            station,
+            f":{other.callsign:<9}:{self._words()}{{{station.messages}".encode(),
+        )
+
+    def _status(self):
+        return self._rx(self._pick(), f">{self._words()}".encode())
+
+    def _weather(self):
+        station = self._pick()
+        r = self._random
+        return self._rx(station, (
+            f"@{time.strftime('%d%H%M', time.gmtime())}z{_lat(station.latitude)}/"
+            f"{_lon(station.longitude)}_{r.randint(0, 359):03d}/{r.randint(0, 30):03d}"
+            f"g{r.randint(0, 45):03d}t{r.randint(20, 105):03d}r000p000P000"
+            f"h{r.randint(10, 99):02d}b{r.randint(9800, 10300):05d}"
+        ).encode())
+
+    def _telemetry(self):
+        r = self._random
+        values = ",".join(f"{r.randint(0, 255):03d}" for _ in range(5))
+        bits = "".join(r.choice("01") for _ in range(8))
+        return self._rx(self._pick(), f"T#{r.randint(0, 999):03d},{values},{bits}".encode())
+
+    def _object(self):
+        station = self._pick()
+        name = f"{self._random.uniform(144, 148):.3f}-R"
+        return self._rx(station, (
+            f";{name:<9}*{time.strftime('%d%H%M', time.gmtime())}z"
+            f"{_lat(station.latitude)}/{_lon(station.longitude)}r T100 -060"
+        ).encode())
+
+    def _escaped(self):
+        r = self._random
+        junk = bytes(r.choice([0x07, 0x0d, 0x1b, 0x1f, 0x7f, 0xb0]) for _ in range(r.randint(1, 3)))
+        return self._rx(self._pick(), b">" + self._words().encode() + junk + b" end")
+
+    def _beacon(self):
+        mycall = f"{self.mycall}>APDW17,WIDE1-1:"
+        if self._random.random() < 0.5:
+            return [(f"[0L] {mycall}!{_lat(self.latitude)}/{_lon(self.longitude)}"
+                     f"#PHG7460/W1 igate\n").encode()]
+        return [(f"[0L] {mycall}<IGATE,MSG_CNT={self.events % 100},"
+                 f"PKT_CNT={self.events},DIR_CNT={self.events // 2}\n").encode()]
+
+    def _is_header(self, station):
+        return f"{station.callsign}>{station.tocall},TCPIP*,qAC,{self._random.choice(_SERVERS)}:"
+
+    def _ig(self):
+        station = self._pick()
+        if self._random.random() < 0.05:
+            return [f"[ig] # aprsc 2.1.14-g5e22b37 {time.strftime('%d %b %Y %H:%M:%S')} GMT\n".encode()]
+        return [f"[ig] {self._is_header(station)}={self._pos(station)}{self._words()}\n".encode()]
+
+    def _ig_tx(self):
+        station = self._pick()
+        other = self._random.choice(self._stations)
+        station.messages = station.messages % 99 + 1
+        header = self._is_header(station)
+        message = f":{other.callsign:<9}:{self._words()}{{{station.messages}"
+        inner = f"{station.callsign}>{station.tocall},TCPIP,{self.mycall}*:{message}"
+        return [
+            f"[ig] {header}{message}\n".encode(),
+            f"[ig>tx] {header}{message}\n".encode(),
+            f"[0L] {self.mycall}>APDW17,WIDE1-1:}}{inner}\n".encode(),
+        ]
+
+    def event(self) -> List[bytes]:
+        """Return the lines of one randomly chosen event."""
+        kind = self._random.choices(self._kinds, self._weights)[0]
+        lines = self._make[kind]()
+        self.events += 1
+        self.lines += len(lines)
+        return lines
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            yield from self.event()
+
+    def run(self, emit: Callable[[List[bytes]], None], rate=DEFAULT_RATE, duration=0.0,
+            ramp=0.0, ramp_interval=DEFAULT_RAMP_INTERVAL, stopped=None,
+            clock=time.monotonic, sleep=time.sleep):
+        """Emit events at `rate` per second.
+
+        Args:
+            emit: called with the lines of the events due, at most
+                :data:`MAX_BURST` of them at once.
+            rate: events per second.
+            duration: stop after this many seconds, 0 to run until
+                `stopped` is set.
+            ramp: add this many events per second to the rate every
+                `ramp_interval` seconds, to find where a consumer
+                falls behind.
+            ramp_interval: seconds between rate steps.
+            stopped: a threading.Event that stops the run when set.
+        """
+        start = clock()
+        due = start
+        self.rate = rate
+        while stopped is None or not stopped.is_set():
+            now = clock()
+            elapsed = now - start
+            if duration and elapsed >= duration:
+                break
+            current = rate + ramp * int(elapsed // ramp_interval) if ramp else rate
+            if current != self.rate:
+                LOG.info(f"Generating {current:g} packets/s")
+                self.rate = current
+            lines = []
+            burst = 0
+            while due <= now and burst < MAX_BURST:
+                lines.extend(self.event())
+                due += 1.0 / current
+                burst += 1
+            if lines:
+                emit(lines)
+            else:
+                sleep(min(due - now, 0.1))
+        self.behind = max(clock() - due, 0.0)
+
+    def line(self) -> str:
+        return f"generated {self.events} events, {self.lines} lines"
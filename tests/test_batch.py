@@ -0,0 +1,84 @@
+"""Tests for batched MQTT payloads."""
+import threading
+import time
+import unittest
+
+from direwolf_monitor.utils import batch
+
+
+class TestBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def _publish(self, payload, count):
+        self.sent.append((payload, count))
+        return True
+
+    def test_max_lines(self):
+        b = batch.Batcher(self._publish, max_lines=2, max_delay=60)
+        for line in ("a", "b", "c"):
+            b.add(line)
+        self.assertEqual(self.sent, [(b"a\nb\n", 2)])
+        b.close()
+        self.assertEqual(self.sent[-1], (b"c\n", 1))
+
+    def test_max_bytes(self):
+        b = batch.Batcher(self._publish, max_bytes=8, max_delay=60)
+        b.add(b"1234\n")
+        b.add(b"5678\n")
+        self.assertEqual(self.sent, [(b"1234\n", 1)])
+        b.close()
+
+    def test_max_delay(self):
+        b = batch.Batcher(self._publish, max_delay=0.01)
+        b.add("late")
+        deadline = time.monotonic() + 2
+        while not self.sent and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(self.sent, [(b"late\n", 1)])
+        b.close()
+
+    def test_on_published_only_when_sent(self):
+        published = []
+        up = [False]
+        b = batch.Batcher(
+            lambda payload, count: up[0], max_lines=1, max_delay=60,
+            on_published=published.append,
+        )
+        b.add("lost", cursor=1)
+        self.assertEqual(published, [])
+        up[0] = True
+        b.add("sent", cursor=2)
+        self.assertEqual(published, [2])
+        b.close()
+
+    def test_add_while_publishing(self):
+        publishing = threading.Event()
+        release = threading.Event()
+
+        def _publish(payload, count):
+            publishing.set()
+            release.wait(5)
+            self.sent.append((payload, count))
+            return True
+
+        b = batch.Batcher(_publish, max_lines=1, max_delay=60)
+        sender = threading.Thread(target=b.add, args=("slow",))
+        sender.start()
+        self.assertTrue(publishing.wait(2))
+        # The buffer isn't locked while the first batch is out.
+        b.max_lines = 2
+        b.add("queued")
+        self.assertEqual(self.sent, [])
+        release.set()
+        sender.join(2)
+        b.close()
+        self.assertEqual(self.sent, [(b"slow\n", 1), (b"queued\n", 1)])
+
+    def test_split_lines(self):
+        payload = b"[0.4] A>B:one\n[0L] A>B:two\n\n"
+        self.assertEqual(
+            list(batch.split_lines(payload)), ["[0.4] A>B:one", "[0L] A>B:two"],
+        )
+        self.assertEqual(list(batch.split_lines("single\n")), ["single"])
@@ -0,0 +1,110 @@
+"""Tests for the MQTT broker stand-in."""
+import threading
+import unittest
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from direwolf_monitor.utils import broker
+
+
+class TestTopicMatches(unittest.TestCase):
+
+    def test_matches(self):
+        self.assertTrue(broker.topic_matches("direwolf", "direwolf"))
+        self.assertTrue(broker.topic_matches("direwolf/#", "direwolf/rx/K6ABC"))
+        self.assertTrue(broker.topic_matches("direwolf/#", "direwolf"))
+        self.assertTrue(broker.topic_matches("direwolf/+/K6ABC", "direwolf/rx/K6ABC"))
+        self.assertTrue(broker.topic_matches("#", "direwolf/rx"))
+        self.assertFalse(broker.topic_matches("direwolf/+", "direwolf/rx/K6ABC"))
+        self.assertFalse(broker.topic_matches("direwolf/tx/#", "direwolf/rx/K6ABC"))
+        self.assertFalse(broker.topic_matches("#", "$SYS/broker"))
+
+
+class _Subscriber:
+
+    def __init__(self, port, topic, protocol=mqtt.MQTTv5, expect=1):
+        self.messages = []
+        self.done = threading.Event()
+        self.expect = expect
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, client_id=f"test-{topic}-{protocol}",
+            protocol=protocol,
+        )
+        subscribed = threading.Event()
+        self.client.on_subscribe = lambda *args: subscribed.set()
+        self.client.on_message = self._on_message
+        self.client.connect("127.0.0.1", port)
+        self.client.subscribe(topic)
+        self.client.loop_start()
+        assert subscribed.wait(5)
+
+    def _on_message(self, client, userdata, msg):
+        self.messages.append(msg)
+        if len(self.messages) >= self.expect:
+            self.done.set()
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class TestBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = broker.Broker(port=0).start()
+        self.subscribers = []
+
+    def tearDown(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.broker.close()
+
+    def _subscribe(self, topic, **kwargs):
+        subscriber = _Subscriber(self.broker.port, topic, **kwargs)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def test_publish_over_mqtt(self):
+        v5 = self._subscribe("direwolf/#")
+        v311 = self._subscribe("direwolf/+/rx", protocol=mqtt.MQTTv311)
+        other = self._subscribe("elsewhere")
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, protocol=mqtt.MQTTv5)
+        publisher.connect("127.0.0.1", self.broker.port)
+        publisher.loop_start()
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ("lines", "1")
+        publisher.publish("direwolf/home/rx", b"[0.4] A>B:>hi", qos=1,
+                          properties=properties).wait_for_publish(5)
+        self.assertTrue(v5.done.wait(5))
+        self.assertTrue(v311.done.wait(5))
+        publisher.disconnect()
+        publisher.loop_stop()
+        self.assertEqual(v5.messages[0].payload, b"[0.4] A>B:>hi")
+        self.assertEqual(v5.messages[0].properties.UserProperty, [("lines", "1")])
+        self.assertEqual(v311.messages[0].topic, "direwolf/home/rx")
+        self.assertEqual(other.messages, [])
+        self.assertEqual(self.broker.received.value, 1)
+
+    def test_publish_in_process(self):
+        subscriber = self._subscribe("direwolf", expect=3)
+        for i in range(3):
+            self.broker.publish("direwolf", b"line %d" % i)
+        self.assertTrue(subscriber.done.wait(5))
+        self.assertEqual([m.payload for m in subscriber.messages],
+                         [b"line 0", b"line 1", b"line 2"])
+        self.assertIn("received 3", self.broker.line())
+
+    def test_drops_when_behind(self):
+        self.broker.queue_size = 2
+        session = broker._Session(self.broker, None, None, queue_size=2)
+        session.subscriptions = frozenset({"direwolf"})
+        with self.broker._lock:
+            self.broker._sessions.add(session)
+        for _ in range(5):
+            self.broker.publish("direwolf", b"line")
+        self.assertEqual(session.dropped, 3)
+        self.assertEqual(self.broker.dropped.value, 3)
+        with self.broker._lock:
+            self.broker._sessions.discard(session)
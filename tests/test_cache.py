@@ -0,0 +1,64 @@
+"""Tests for the packet parse cache."""
+import types
+import unittest
+from unittest import mock
+
+from direwolf_monitor.utils import cache
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def _parse(raw):
+            self.calls.append(raw)
+            if raw.startswith(b"bad"):
+                return None
+            return types.SimpleNamespace(raw=raw)
+        self.cache = cache.ParseCache(_parse, max_entries=3, ttl=10)
+
+    def test_hit(self):
+        self.cache(b"A>B:x")
+        second = self.cache(memoryview(b"A>B:x"))
+        self.assertEqual(self.calls, [b"A>B:x"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(second.raw, b"A>B:x")
+
+    def test_copies_are_independent(self):
+        first = self.cache(b"A>B:x")
+        first.raw = b"rebuilt"
+        self.assertEqual(self.cache(b"A>B:x").raw, b"A>B:x")
+
+    def test_negative(self):
+        self.assertIsNone(self.cache(b"bad"))
+        self.assertIsNone(self.cache(b"bad"))
+        self.assertEqual(self.calls, [b"bad"])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_lru_eviction(self):
+        for raw in (b"1", b"2", b"3"):
+            self.cache(raw)
+        self.cache(b"1")  # 2 is now the oldest
+        self.cache(b"4")
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(len(self.cache), 3)
+        self.cache(b"1")
+        self.cache(b"2")
+        self.assertEqual(self.calls, [b"1", b"2", b"3", b"4", b"2"])
+
+    def test_ttl(self):
+        with mock.patch("time.monotonic", return_value=100.0):
+            self.cache(b"A>B:x")
+        with mock.patch("time.monotonic", return_value=105.0):
+            self.cache(b"A>B:x")
+        with mock.patch("time.monotonic", return_value=111.0):
+            self.cache(b"A>B:x")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cache.expired, 1)
+
+    def test_line(self):
+        self.cache(b"A>B:x")
+        self.cache(b"A>B:x")
+        self.assertEqual(self.cache.line(),
+                         "cache 1/3 hits 1 misses 1 (50%) evictions 0")
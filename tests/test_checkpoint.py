@@ -0,0 +1,44 @@
+"""Tests for resume checkpoints."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from direwolf_monitor.utils import checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "dwm.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_missing(self):
+        self.assertIsNone(checkpoint.Checkpoint(self.path).load())
+
+    def test_corrupt(self):
+        with open(self.path, "w") as f:
+            f.write("not json")
+        self.assertIsNone(checkpoint.Checkpoint(self.path).load())
+
+    def test_writes_are_batched(self):
+        cp = checkpoint.Checkpoint(self.path, interval=60).start()
+        for offset in range(1, 101):
+            cp.update(42, offset)
+        self.assertEqual(cp.writes, 0)
+        cp.close()
+        self.assertEqual(cp.writes, 1)
+        self.assertEqual(checkpoint.Checkpoint(self.path).load(), (42, 100))
+
+    def test_written_when_idle(self):
+        cp = checkpoint.Checkpoint(self.path, interval=0.01).start()
+        cp.update(42, 7)
+        deadline = time.monotonic() + 2
+        while not cp.writes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(checkpoint.Checkpoint(self.path).load(), (42, 7))
+        cp.close()
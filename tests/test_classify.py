@@ -0,0 +1,60 @@
+"""Tests for the direwolf line classifier."""
+import collections
+import os
+import unittest
+
+from direwolf_monitor.utils import classify
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class TestClassify(unittest.TestCase):
+
+    def _check(self, line, kind, packet):
+        got_kind, got_packet = classify.classify(line)
+        self.assertEqual(got_kind, kind)
+        self.assertEqual(bytes(got_packet), packet)
+
+    def test_prefixes(self):
+        self._check(b"[0.4] A>B:rx\n", classify.RX, b"A>B:rx")
+        self._check(b"[1.12] A>B:rx\r\n", classify.RX, b"A>B:rx")
+        self._check(b"[0.4 18:45:02] A>B:rx", classify.RX, b"A>B:rx")
+        self._check(b"[0L] A>B:tx", classify.TX, b"A>B:tx")
+        self._check(b"[0H] A>B:digi", classify.DIGI, b"A>B:digi")
+        self._check(b"[ig] A>B:ig", classify.IG, b"A>B:ig")
+        self._check(b"[rx>ig] A>B:gated", classify.RX_IG, b"A>B:gated")
+        self._check(b"[ig>tx] A>B:to rf", classify.IG_TX, b"A>B:to rf")
+        self._check(b"[0.dtmf] DTMF message body=1", classify.DTMF, b"DTMF message body=1")
+        self._check(b"[0.is] A>B:is", classify.IS, b"A>B:is")
+
+    def test_other(self):
+        for line in (
+            b"",
+            b"N6ABC-3 audio level = 43(10/7)   [NONE]   |||||||__",
+            b"Position, Car, APRSdroid Android App",
+            b"ig_to_tx: no route to K6XYZ-9",
+            b"[NONE] not a prefix",
+        ):
+            self.assertEqual(classify.classify(line)[0], classify.OTHER)
+
+    def test_no_copy(self):
+        line = b"[0.4] A>B:rx\n"
+        kind, packet = classify.classify(line)
+        self.assertIs(packet.obj, line)
+
+    def test_timestamp(self):
+        self.assertEqual(classify.timestamp(b"[0.4 18:45:02] A>B:rx"), b"18:45:02")
+        self.assertIsNone(classify.timestamp(b"[0.4] A>B:rx"))
+        self.assertIsNone(classify.timestamp(b"[0L] A>B:tx"))
+
+    def test_corpus(self):
+        with open(CORPUS, "rb") as f:
+            kinds = collections.Counter(classify.classify(line)[0] for line in f)
+        self.assertEqual(kinds[classify.RX], 16)
+        self.assertEqual(kinds[classify.TX], 3)
+        self.assertEqual(kinds[classify.DIGI], 1)
+        self.assertEqual(kinds[classify.IG], 5)
+        self.assertEqual(kinds[classify.RX_IG], 1)
+        self.assertEqual(kinds[classify.IG_TX], 1)
+        self.assertEqual(kinds[classify.DTMF], 1)
+        self.assertEqual(kinds[classify.IS], 1)
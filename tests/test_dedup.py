@@ -0,0 +1,68 @@
+"""Tests for digipeated packet dedup."""
+import unittest
+from unittest import mock
+
+from direwolf_monitor.utils import dedup
+
+DIRECT = b"K6YZA-4>S7QUPV,WIDE1-1:`2_Xl \x1ck/]\"4)}=\r"
+DIGI = b"K6YZA-4>S7QUPV,W6CX-3*,WIDE1:`2_Xl \x1ck/]\"4)}=\r"
+IGATE = b"K6YZA-4>S7QUPV,TCPIP*,qAR,W6CX:`2_Xl \x1ck/]\"4)}=\r"
+
+
+class TestDedup(unittest.TestCase):
+
+    def setUp(self):
+        self.expired = []
+        self.dedup = dedup.Dedup(
+            window=30, on_expire=lambda *a: self.expired.append(a),
+        )
+
+    def _seen(self, raw, now):
+        with mock.patch("time.monotonic", return_value=now):
+            return self.dedup.seen(raw)
+
+    def test_key_ignores_path(self):
+        self.assertEqual(dedup.key(DIRECT), dedup.key(DIGI))
+        self.assertEqual(dedup.key(DIRECT), dedup.key(IGATE))
+        self.assertEqual(dedup.key(b"A>B:x"), (b"A>B", b"x"))
+        self.assertIsNone(dedup.key(b"no colon"))
+
+    def test_copies(self):
+        self.assertFalse(self._seen(DIRECT, 0))
+        self.assertTrue(self._seen(DIGI, 1))
+        self.assertTrue(self._seen(IGATE, 2))
+        self.assertFalse(self._seen(b"K6YZA-4>S7QUPV:other", 3))
+        self.assertFalse(self._seen(b"W6STU>S7QUPV:`2_Xl", 3))
+        self.assertEqual((self.dedup.passed, self.dedup.dropped), (3, 2))
+        self.assertEqual(self.dedup.line(), "dedup 2/5 (40%)")
+
+    def test_window(self):
+        self.assertFalse(self._seen(DIRECT, 25))
+        # The next bucket still knows it...
+        self.assertTrue(self._seen(DIGI, 55))
+        self.assertEqual(self.expired, [])
+        # ...but not the one after.
+        self.assertFalse(self._seen(DIGI, 61))
+        self.assertEqual(self.expired, [(b"K6YZA-4>S7QUPV", 1)])
+
+    def test_quiet_gap(self):
+        self._seen(DIRECT, 0)
+        self._seen(DIGI, 1)
+        self.assertFalse(self._seen(DIGI, 200))
+        self.assertEqual(self.expired, [(b"K6YZA-4>S7QUPV", 1)])
+
+    def test_bounded(self):
+        small = dedup.Dedup(window=30, max_entries=2)
+        for raw in (b"A>B:1", b"A>B:2", b"A>B:3"):
+            small.seen(raw)
+        self.assertEqual(len(small), 2)
+        self.assertFalse(small.seen(b"A>B:3"))
+        self.assertTrue(small.seen(b"A>B:1"))
+
+    def test_close(self):
+        self._seen(DIRECT, 0)
+        self._seen(DIGI, 0)
+        self._seen(b"A>B:once", 0)
+        self.dedup.close()
+        self.assertEqual(self.expired, [(b"K6YZA-4>S7QUPV", 1)])
+        self.assertEqual(len(self.dedup), 0)
@@ -3,6 +3,8 @@
 """Tests for `python_direwolf_monitor` package."""
 
 
+import subprocess
+import sys
 import unittest
 from click.testing import CliRunner
 
@@ -30,3 +32,27 @@ class TestPython_direwolf_monitor(unittest.TestCase):
         help_result = runner.invoke(cli.main, ['--help'])
         assert help_result.exit_code == 0
         assert '--help  Show this message and exit.' in help_result.output
+
+    def test_version_is_light(self):
+        """`dwm version` doesn't import the packet or MQTT stacks."""
+        code = (
+            "import sys\n"
+            "from click.testing import CliRunner\n"
+            "from direwolf_monitor import cli\n"
+            "assert CliRunner().invoke(cli.cli, ['version']).exit_code == 0\n"
+            "heavy = ('paho', 'aprsd', 'aprslib', 'PIL', 'term_image', 'oslo_config')\n"
+            "print(' '.join(m for m in heavy if m in sys.modules))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], check=True,
+                                capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_lazy_commands(self):
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, ['--help'])
+        assert result.exit_code == 0
+        for name in cli.LAZY_COMMANDS:
+            assert name in result.output
+        result = runner.invoke(cli.cli, ['mqtt-to-terminal', '--help'])
+        assert result.exit_code == 0
+        assert '--dedup-window' in result.output
@@ -0,0 +1,58 @@
+"""Tests for the direwolf <0xNN> escape decoder."""
+import os
+import random
+import unittest
+
+from direwolf_monitor.utils import classify, escape
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class TestEscape(unittest.TestCase):
+
+    def test_no_escapes(self):
+        data = b"N0CALL>APRS:>just text"
+        self.assertEqual(escape.decode(data), data)
+        self.assertEqual(escape.decode(memoryview(data)), data)
+
+    def test_every_byte(self):
+        for byte in range(256):
+            self.assertEqual(escape.decode(b"<0x%02x>" % byte), bytes([byte]))
+            self.assertEqual(escape.decode(b"<0x%02X>" % byte), bytes([byte]))
+
+    def test_old_replace_chain_bugs(self):
+        # The old chain turned these into a NUL followed by "x1f"/"x0a".
+        self.assertEqual(escape.decode(b"a<0x1f>b"), b"a\x1fb")
+        self.assertEqual(escape.decode(b"a<0x0a>b"), b"a\nb")
+
+    def test_not_escapes(self):
+        for data in (b"<0x>", b"<0x1>", b"<0x1g>", b"<0X1f>", b"<0x1f", b"0x1f>"):
+            self.assertEqual(escape.decode(data), data)
+
+    def test_adjacent(self):
+        self.assertEqual(escape.decode(b"<0x1f><0x1e><0x0a>"), b"\x1f\x1e\n")
+        self.assertEqual(escape.decode(b"<<0x3c>0x41>"), b"<<0x41>")
+
+    def test_encode(self):
+        self.assertEqual(escape.encode(b"a\x1c\x7f\xfe\xff\xe2\x82\xac"),
+                         b"a<0x1c><0x7f><0xfe><0xff>\xe2\x82\xac")
+        self.assertEqual(escape.encode(b"\xe2", ascii_only=True), b"<0xe2>")
+
+    def test_round_trip(self):
+        rand = random.Random(1)
+        for ascii_only in (False, True):
+            for _ in range(200):
+                # A literal "<0x" in the packet is printed as-is by
+                # direwolf and can't be told apart from an escape.
+                data = bytes(rand.choice([b for b in range(256) if b != ord("<")])
+                             for _ in range(rand.randint(0, 80)))
+                self.assertEqual(escape.decode(escape.encode(data, ascii_only)), data)
+
+    def test_corpus(self):
+        with open(CORPUS, "rb") as f:
+            decoded = [escape.decode(classify.classify(line)[1]) for line in f]
+        self.assertIn(b"W6STU-5>APRS,WIDE2-1:=3742.00N/12159.00W-PHG2110/A=000200"
+                      b" text with \r inside", decoded)
+        self.assertIn(b"N6BCD-8>APRS,WIDE2-1:>low bytes\x1f\x1e\n end", decoded)
+        for packet in decoded:
+            self.assertNotIn(b"<0x", packet)
@@ -0,0 +1,195 @@
+"""Differential tests of the fast-path parser against aprslib and aprsd."""
+import copy
+import dataclasses
+import os
+import random
+import unittest
+
+import aprslib
+from aprsd.packets import core as aprsd_core
+from aprslib import base91
+
+from direwolf_monitor.utils import classify, escape, fastparse
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+CALLS = ["N0CALL", "K6YZA-4", "W6STU-5", "KM6XXX-15", "VE3ABC-9", "n0call",
+         "DL1ABC-1"]
+BAD_CALLS = ["TOOLONGCALL", "K6Y_ZA", ""]
+TOCALLS = ["APRS", "APDW16", "APZ100", "BEACON", "APRS-15"]
+BAD_TOCALLS = ["aprs", "APRS-16", ""]
+PATHS = ["", ",WIDE1-1", ",WIDE1-1,WIDE2-2", ",W6CX-3*,WIDE2-1",
+         ",TCPIP*,qAC,T2TEXAS", ",W6CX-3*,WIDE1,qAR,K6YZA"]
+BAD_PATHS = [",WI DE", ",", ",TOOLONGCALL"]
+COMMENTS = ["", "088/036", "360/000", "000/000", "400/010", "PHG2110",
+            "PHG5132/", "PHG7A60", "RNG0050", "/A=001234", "/A=-00012",
+            "hello world", "088/036/270/729", "|!!\"\"#|", "!W12!", "!wAB!",
+            " spaced ", "/slash", "Kenwood ]=", "été", "123/"]
+
+
+class _Generator:
+    """Random packets in the fast-path formats, valid and not."""
+
+    def __init__(self, seed):
+        self.rand = random.Random(seed)
+
+    def pick(self, good, bad):
+        return self.rand.choice(bad if self.rand.random() < 0.05 else good)
+
+    def header(self):
+        return (f"{self.pick(CALLS, BAD_CALLS)}>{self.pick(TOCALLS, BAD_TOCALLS)}"
+                f"{self.pick(PATHS, BAD_PATHS)}")
+
+    def comment(self):
+        r = self.rand
+        return "".join(r.choice(COMMENTS) for _ in range(r.randint(0, 3)))
+
+    def uncompressed(self):
+        r = self.rand
+        lat = f"{r.randint(0, 92):02d}{r.uniform(0, 60):05.2f}"
+        lon = f"{r.randint(0, 182):03d}{r.uniform(0, 60):05.2f}"
+        ambiguity = r.choice([0, 0, 0, 1, 2, 3, 4])
+        for pos in (6, 5, 3, 2)[:ambiguity]:
+            lat = lat[:pos - 1] + " " + lat[pos:]
+            lon = lon[:pos] + " " + lon[pos + 1:]
+        table = r.choice("/\\A9")
+        symbol = r.choice("->k_[#")
+        return (f"{r.choice('!=')}{lat}{r.choice('NS')}{table}"
+                f"{lon}{r.choice('EW')}{symbol}{self.comment()}")
+
+    def compressed(self):
+        r = self.rand
+        lat = base91.from_decimal(r.randint(0, 91 ** 4 - 1), 4)
+        lon = base91.from_decimal(r.randint(0, 91 ** 4 - 1), 4)
+        cst = "".join(chr(r.randint(32, 124)) for _ in range(3))
+        table = r.choice("/\\A")
+        return (f"{r.choice('!=')}{table}{lat}{lon}"
+                f"{r.choice('->k_')}{cst}{self.comment()}")
+
+    def mice(self):
+        r = self.rand
+        dst = "".join(r.choice("0123456789ABCDEFGHIJKLPQRSTUVWXYZ") for _ in range(3))
+        dst += "".join(r.choice("0123456789LPQRSTUVWXYZ") for _ in range(3))
+        body = chr(r.randint(0x26, 0x7f)) + chr(r.randint(0x26, 0x61))
+        body += "".join(chr(r.randint(0x1c, 0x7d)) for _ in range(4))
+        body += r.choice(">k[-") + r.choice("/\\")
+        extra = r.choice(["", "]", "`", "'0a1b2c3d4e", "`0a1b", "\"4)}",
+                          "]\"4)}=", "Comment"]) + self.comment()
+        data_type = r.choice("`'")
+        return (f"{self.pick(CALLS, BAD_CALLS)}>{dst}{self.pick(PATHS, BAD_PATHS)}:"
+                f"{data_type}{body}{extra}")
+
+    def status(self):
+        r = self.rand
+        return ">" + r.choice(["", "092345z", "123456h", "Net tonight", " spaced "]) \
+            + self.comment()
+
+    def message(self):
+        r = self.rand
+        addresse = r.choice(["KM6XXX", "N0CALL-1", "BLN1", "BLNA", "BLN1WX",
+                             "TOOLONGADDR"]).ljust(9)[:r.choice([9, 9, 9, 8])]
+        text = r.choice(["hello", "hello{12", "hi{AB}CD", "hi{AB}", "ack12",
+                         "rejAB}CD", "ackAB}", "PARM.A,B", " spaced {1 ",
+                         "", "x{123456"])
+        return f":{addresse}:{text}"
+
+    def packet(self):
+        r = self.rand
+        kind = r.choice(["uncompressed", "compressed", "mice", "status", "message"])
+        if kind == "mice":
+            packet = self.mice()
+        else:
+            packet = f"{self.header()}:{getattr(self, kind)()}"
+        if r.random() < 0.1:
+            # Damage it.
+            pos = r.randrange(len(packet))
+            packet = packet[:pos] + chr(r.randint(0x1c, 0x7e)) + packet[pos + 1:]
+        return packet.encode("utf-8")
+
+
+def _aprslib(raw):
+    try:
+        return aprslib.parse(raw)
+    except Exception as e:
+        return type(e)
+
+
+def _fields(packet, packet_json):
+    if not dataclasses.is_dataclass(packet):
+        return packet
+    fields = dict(vars(packet))
+    # Set from the clock and a counter when the packet is built.
+    fields.pop("timestamp")
+    if "msgNo" not in packet_json:
+        fields.pop("msgNo", None)
+    return type(packet), fields
+
+
+def _build(factory, packet_json):
+    try:
+        # Both factories change the dict, aprsd's nested ones too.
+        return _fields(factory(copy.deepcopy(packet_json)), packet_json)
+    except Exception as e:
+        return type(e)
+
+
+class TestFastParse(unittest.TestCase):
+
+    def _corpus(self):
+        with open(CORPUS, "rb") as f:
+            for line in f:
+                kind, raw = classify.classify(line)
+                if kind != classify.OTHER:
+                    yield escape.decode(raw)
+        gen = _Generator(13)
+        for _ in range(4000):
+            yield gen.packet()
+
+    def test_parse_matches_aprslib(self):
+        handled = 0
+        for raw in self._corpus():
+            fast = fastparse.parse(raw)
+            if fast is None:
+                continue
+            handled += 1
+            self.assertEqual(fast, _aprslib(raw), raw)
+        # Most of the generated packets are valid.
+        self.assertGreater(handled, 1200)
+
+    def test_factory_matches_aprsd(self):
+        built = 0
+        for number, raw in enumerate(self._corpus()):
+            if number % 4:
+                continue
+            packet_json = _aprslib(raw)
+            if not isinstance(packet_json, dict):
+                continue
+            built += 1
+            self.assertEqual(
+                _build(fastparse.factory, packet_json),
+                _build(aprsd_core.factory, packet_json),
+                raw,
+            )
+        self.assertGreater(built, 300)
+
+    def test_falls_back(self):
+        for raw in (b"N0CALL>APRS:/092345z3742.00N/12159.00W-",
+                    b"N0CALL>APRS:;OBJECT   *092345z3742.00N/12159.00W-",
+                    b"N0CALL>APRS:!3742.00N/12159.00W_090/005g010t072",
+                    b"N0CALL>APRS::BLN1     :bulletin",
+                    b"N0CALL>APRS:T#001,1,2,3,4,5,00000000",
+                    b"N0CALL>APRS:}W6STU>APRS,TCPIP,N0CALL*:>third party",
+                    b"N0CALL>APRS:>\xe9t\xe9 latin-1",
+                    b"no header"):
+            self.assertIsNone(fastparse.parse(raw), raw)
+
+    def test_examples(self):
+        packet = fastparse.parse(b"W6STU-5>APRS,WIDE2-1:=3742.00N/12159.00W-PHG2110/A=000200 hi")
+        self.assertEqual(packet["format"], "uncompressed")
+        self.assertAlmostEqual(packet["latitude"], 37.7)
+        self.assertAlmostEqual(packet["altitude"], 200 * 0.3048)
+        self.assertEqual(packet["comment"], "hi")
+        packet = fastparse.factory(fastparse.parse(b"N0CALL>APRS::KM6XXX   :hello{12"))
+        self.assertIsInstance(packet, aprsd_core.MessagePacket)
+        self.assertEqual((packet.to_call, packet.message_text, packet.msgNo),
+                         ("KM6XXX", "hello", "12"))
@@ -0,0 +1,106 @@
+"""Tests for the mqtt_to_terminal packet filters."""
+import types
+import unittest
+
+from direwolf_monitor.utils import filters
+
+
+def _at(latitude, longitude):
+    return types.SimpleNamespace(latitude=latitude, longitude=longitude)
+
+
+class TestCompile(unittest.TestCase):
+
+    def _passes(self, expression, kind, packet, parsed=None, **kwargs):
+        compiled = filters.compile([expression], **kwargs)
+        return compiled.before_parse(kind, packet) and compiled.after_parse(parsed)
+
+    def test_no_terms(self):
+        self.assertIsNone(filters.compile([]))
+        self.assertIsNone(filters.compile(["  "]))
+
+    def test_call(self):
+        packet = b"K6ABC-7>APRS,WIDE1-1:>hi"
+        self.assertTrue(self._passes("call:K6*", "rx", packet))
+        self.assertTrue(self._passes("call:k6abc-?", "rx", packet))
+        self.assertTrue(self._passes("call:N0CALL,K6ABC-7", "rx", packet))
+        self.assertFalse(self._passes("call:K6ABC", "rx", packet))
+        self.assertFalse(self._passes("call:W6*", "rx", packet))
+        # Only the sender, not the path or the text.
+        self.assertFalse(self._passes("call:WIDE*", "rx", packet))
+        self.assertFalse(self._passes("call:K6*", "ig", b"# aprsc 2.1.14"))
+
+    def test_type_and_kind(self):
+        packet = b"K6ABC>APRS:!3742.00N/12212.00W_180/005g010t068"
+        self.assertTrue(self._passes("type:weather", "rx", packet))
+        self.assertFalse(self._passes("type:position,mic-e", "rx", packet))
+        self.assertTrue(self._passes("kind:rx,ig", "rx", packet))
+        self.assertTrue(self._passes("kind:ig-tx", "ig>tx", packet))
+        self.assertFalse(self._passes("kind:tx", "rx", packet))
+        self.assertTrue(self._passes("type:comment", "ig", b"# aprsc 2.1.14"))
+
+    def test_text(self):
+        packet = b"K6ABC>APRS:>Net Tonight 7pm"
+        self.assertTrue(self._passes('text:"net tonight"', "rx", packet))
+        self.assertFalse(self._passes("text:cancelled", "rx", packet))
+
+    def test_negate(self):
+        packet = b"K6ABC>APRS:>hi"
+        self.assertFalse(self._passes("!call:K6*", "rx", packet))
+        self.assertTrue(self._passes("!type:telemetry", "rx", packet))
+
+    def test_bbox(self):
+        packet = b"K6ABC>APRS:>hi"
+        self.assertTrue(self._passes("bbox:37,-123,38,-122", "rx", packet, _at(37.7, -122.4)))
+        self.assertFalse(self._passes("bbox:37,-123,38,-122", "rx", packet, _at(36.9, -122.4)))
+        self.assertFalse(self._passes("bbox:37,-123,38,-122", "rx", packet, None))
+        # Across the antimeridian.
+        self.assertTrue(self._passes("bbox:-20,170,-10,-170", "rx", packet, _at(-15, 179)))
+        self.assertTrue(self._passes("bbox:-20,170,-10,-170", "rx", packet, _at(-15, -175)))
+        self.assertFalse(self._passes("bbox:-20,170,-10,-170", "rx", packet, _at(-15, 0)))
+
+    def test_radius(self):
+        packet = b"K6ABC>APRS:>hi"
+        home = dict(latitude="37.7", longitude="-122.2")
+        # About 14 miles.
+        self.assertTrue(self._passes("radius:25", "rx", packet, _at(37.8, -122.45), **home))
+        self.assertFalse(self._passes("radius:10", "rx", packet, _at(37.8, -122.45), **home))
+        self.assertFalse(self._passes("radius:25", "rx", packet, _at(40.0, -122.2), **home))
+        self.assertFalse(self._passes("radius:25", "rx", packet, object(), **home))
+
+    def test_errors(self):
+        for bad in ("call", "nope:1", "call:", "type:bogus", "kind:digi",
+                    "bbox:1,2,3", "bbox:38,0,37,1", "radius:far", 'text:"open'):
+            with self.assertRaises(ValueError, msg=bad):
+                filters.compile([bad], latitude=0, longitude=0)
+        with self.assertRaises(ValueError):
+            filters.compile(["radius:10"])
+
+
+class TestFilter(unittest.TestCase):
+
+    def test_stages_cheapest_first(self):
+        compiled = filters.compile(
+            ["radius:5 text:hi", "bbox:0,0,1,1 type:status call:K6* kind:rx"],
+            latitude=0, longitude=0,
+        )
+        self.assertEqual(compiled.stages, filters.STAGES)
+        self.assertTrue(compiled.needs_parse)
+        self.assertFalse(filters.compile(["call:K6*"]).needs_parse)
+
+    def test_counters(self):
+        compiled = filters.compile(["kind:rx call:K6* type:status"])
+        packets = [
+            ("tx", b"K6ABC>APRS:>hi"),
+            ("rx", b"W6ABC>APRS:>hi"),
+            ("rx", b"W6ABC>APRS:>hi"),
+            ("rx", b"K6ABC>APRS:=3742.00N/12212.00W>"),
+            ("rx", b"K6ABC>APRS:>hi"),
+        ]
+        passed = [p for p in packets
+                  if compiled.before_parse(*p) and compiled.after_parse(None)]
+        self.assertEqual(len(passed), 1)
+        self.assertEqual(compiled.checked.value, 5)
+        self.assertEqual(compiled.passed.value, 1)
+        self.assertEqual(compiled.filtered.values, {"kind": 1, "call": 2, "type": 1})
+        self.assertEqual(compiled.line(), "filter 1/5 (kind 1 call 2 type 1)")
@@ -0,0 +1,65 @@
+"""Tests for distance and bearing from our station."""
+import random
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+from haversine import Unit, haversine
+
+from direwolf_monitor import utils
+from direwolf_monitor.utils import geo, packet
+
+
+def _points(n, seed=1):
+    rand = random.Random(seed)
+    return [(rand.uniform(-90, 90), rand.uniform(-180, 180)) for _ in range(n)]
+
+
+class TestHome(unittest.TestCase):
+
+    def setUp(self):
+        self.home = geo.Home("37.4219", "-122.0841")
+        self.coords = (37.4219, -122.0841)
+
+    def test_scalar_matches(self):
+        for lat, lon in _points(500):
+            miles, bearing = self.home.distance_bearing(lat, lon)
+            self.assertAlmostEqual(
+                miles, haversine(self.coords, (lat, lon), unit=Unit.MILES), places=6,
+            )
+            self.assertAlmostEqual(
+                bearing, utils.calculate_initial_compass_bearing(self.coords, (lat, lon)),
+                places=6,
+            )
+
+    def test_batch_matches_scalar(self):
+        points = _points(1000, seed=2)
+        lats, lons = np.array(points).T
+        miles, bearings = self.home.distances_bearings(lats, lons)
+        self.assertEqual(miles.shape, (1000,))
+        for (lat, lon), m, b in zip(points, miles, bearings, strict=True):
+            expected = self.home.distance_bearing(lat, lon)
+            self.assertAlmostEqual(m, expected[0], places=6)
+            self.assertAlmostEqual(b, expected[1], places=6)
+
+    def test_batch_lists(self):
+        miles, bearings = self.home.distances_bearings([37.4219, 38.4219], [-122.0841, -122.0841])
+        self.assertEqual(miles[0], 0)
+        self.assertAlmostEqual(miles[1], 69.1, places=1)
+        self.assertAlmostEqual(bearings[1], 0)
+
+    def test_cached(self):
+        self.assertIs(geo.home("37.4219", "-122.0841"), geo.home("37.4219", "-122.0841"))
+        self.assertIs(geo.home("37.4219", "-122.0841"), geo.home(37.4219, -122.0841))
+        self.assertEqual(geo.home("1", "2").longitude, 2.0)
+
+    def test_add_gps_reuses_home(self):
+        geo._home.cache_clear()
+        heard = types.SimpleNamespace(latitude=37.8, longitude=-122.4)
+        with mock.patch.object(geo, "Home", wraps=geo.Home) as made:
+            for _ in range(3):
+                logit = []
+                packet.add_gps(logit, heard, "37.4219", "-122.0841")
+                self.assertEqual(len(logit), 1)
+        self.assertEqual(made.call_count, 1)
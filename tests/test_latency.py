@@ -0,0 +1,117 @@
+"""Tests for the per stage latency tracing."""
+import time
+import types
+import unittest
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from direwolf_monitor.utils import latency, metrics
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def test_time_only_is_today(self):
+        now = time.mktime((2024, 5, 1, 18, 45, 10, 0, 0, -1))
+        self.assertEqual(latency.parse_timestamp(b"18:45:02", now), now - 8)
+        self.assertEqual(latency.parse_timestamp("18:45:02.250", now), now - 7.75)
+
+    def test_before_midnight(self):
+        now = time.mktime((2024, 5, 2, 0, 0, 1, 0, 0, -1))
+        self.assertEqual(latency.parse_timestamp("23:59:59", now), now - 2)
+
+    def test_dates(self):
+        expected = time.mktime((2024, 5, 1, 18, 45, 2, 0, 0, -1))
+        self.assertEqual(latency.parse_timestamp("2024-05-01 18:45:02"), expected)
+        self.assertEqual(latency.parse_timestamp("2024-05-01T18:45:02"), expected)
+        self.assertEqual(latency.parse_timestamp("2024-05-01T18:45:02Z"), 1714589102)
+        self.assertEqual(latency.parse_timestamp("1714589102.5"), 1714589102.5)
+        self.assertIsNone(latency.parse_timestamp("Wed"))
+
+    def test_origin(self):
+        now = time.mktime((2024, 5, 1, 18, 45, 10, 0, 0, -1))
+        self.assertEqual(latency.origin(b"[0.4 18:45:02] A>B:>hi\n", now), now - 8)
+        self.assertIsNone(latency.origin(b"[0.4] A>B:>hi\n", now))
+        self.assertIsNone(latency.origin(b"[0L] A>B:>hi\n", now))
+
+
+class TestProperties(unittest.TestCase):
+
+    def test_round_trip(self):
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.UserProperty = ("lines", "2")
+        properties.UserProperty = latency.user_properties(100.25, 100.5)
+        received = Properties(PacketTypes.PUBLISH)
+        received.unpack(properties.pack())
+        self.assertEqual(latency.stamps(received), (100.25, 100.5))
+
+    def test_missing(self):
+        self.assertEqual(latency.stamps(None), (None, None))
+        self.assertEqual(
+            latency.stamps(types.SimpleNamespace(UserProperty=latency.user_properties(None, 1.0))),
+            (None, 1.0),
+        )
+
+
+class TestReadTimes(unittest.TestCase):
+
+    def test_batches_and_drops(self):
+        times = latency.ReadTimes()
+        for i in range(6):
+            times.read(f"line {i}\n".encode(), now=float(i))
+        # line 0 was dropped on the way, 1 and 2 went out in a batch.
+        self.assertEqual(times.take(b"line 1\nline 2\n", 2), 1.0)
+        self.assertEqual(len(times), 3)
+        self.assertEqual(times.take(b"line 3\n"), 3.0)
+        self.assertIsNone(times.take(b"spooled long ago\n"))
+        self.assertEqual(len(times), 2)
+
+    def test_bounded(self):
+        times = latency.ReadTimes(max_pending=2)
+        for i in range(5):
+            times.read(f"line {i}".encode(), now=float(i))
+        self.assertEqual(len(times), 2)
+        self.assertIsNone(times.take(b"line 0"))
+
+
+class TestTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics("test")
+        self.tracker = latency.Tracker(self.metrics)
+
+    def test_stages(self):
+        self.tracker.record(10.0, 10.5, 10.502, 10.55, 10.551, 10.553)
+        counts = {stage: h.count for stage, h in self.tracker.histograms.items()}
+        self.assertEqual(counts, dict.fromkeys(latency.STAGES, 1))
+        self.assertAlmostEqual(self.tracker.histograms["deliver"].sum, 0.048)
+        self.assertAlmostEqual(self.tracker.histograms["total"].sum, 0.553)
+
+    def test_missing_stamps(self):
+        # Not traced by log_to_mqtt, and no -T timestamp.
+        self.tracker.record(None, None, None, 10.0, 10.001, 10.002)
+        stages = [row[0] for row in self.tracker.rows()]
+        self.assertEqual(stages, ["parse", "render"])
+        # Clocks a little out of step.
+        self.tracker.record(None, 10.0, 10.1, 10.05)
+        self.assertEqual(self.tracker.histograms["deliver"].sum, 0.0)
+
+    def test_dump(self):
+        self.assertIn("no latency samples", self.tracker.dump())
+        self.tracker.record(None, 10.0, 10.002)
+        lines = self.tracker.dump().splitlines()
+        self.assertTrue(lines[0].startswith("stage"))
+        self.assertTrue(lines[1].startswith("publish"))
+
+    def test_from_prometheus(self):
+        for seconds in (0.0003, 0.002, 0.002, 45.0):
+            self.tracker.record(None, 10.0, 10.0 + seconds)
+        histograms = latency.from_prometheus(self.metrics.prometheus())
+        self.assertEqual(list(histograms), latency.STAGES)
+        self.assertEqual([row[0] for row in latency.histogram_rows(histograms)], ["publish"])
+        mine = self.tracker.histograms["publish"]
+        theirs = histograms["publish"]
+        self.assertEqual(theirs.counts, mine.counts)
+        self.assertEqual(theirs.count, 4)
+        self.assertAlmostEqual(theirs.sum, mine.sum, places=4)
+        self.assertEqual(theirs.quantile(0.5), mine.quantile(0.5))
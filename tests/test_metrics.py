@@ -0,0 +1,93 @@
+"""Tests for the rolling metrics."""
+import unittest
+import urllib.error
+import urllib.request
+
+from direwolf_monitor.utils import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics("test", window=10)
+        self.lines = self.metrics.counter("lines", "Lines received")
+        self.packets = self.metrics.labeled_counter("packets", "Packets by type")
+        self.render = self.metrics.histogram("render_seconds", "Render seconds")
+
+    def test_same_metric(self):
+        self.assertIs(self.metrics.counter("lines"), self.lines)
+
+    def test_rates(self):
+        self.metrics.sample(now=0)
+        self.lines.inc(50)
+        self.packets.inc("GPSPacket", 20)
+        self.packets.inc("MicEPacket")
+        self.metrics.sample(now=10)
+        rates = self.metrics.rates()
+        self.assertEqual(rates["lines"], 5.0)
+        self.assertEqual(rates["packets"], {"GPSPacket": 2.0, "MicEPacket": 0.1})
+
+    def test_window(self):
+        for now in range(30):
+            self.lines.inc(now)
+            self.metrics.sample(now=now)
+        # The last 10 seconds only: 20+...+29 over 10s.
+        self.assertAlmostEqual(self.metrics.rates()["lines"], sum(range(20, 30)) / 10)
+
+    def test_quantiles(self):
+        for _ in range(99):
+            self.render.observe(0.0003)
+        self.render.observe(3.0)
+        p50, p99 = self.metrics.quantiles("render_seconds")
+        self.assertTrue(0.00025 < p50 <= 0.0005)
+        self.assertLessEqual(p99, 0.0005)
+        self.assertEqual(self.render.quantile(1.0), 5.0)
+        self.render.observe(100)
+        self.assertEqual(self.render.quantile(1.0), 10.0)
+        self.assertIsNone(metrics.Histogram("empty").quantile(0.5))
+
+    def test_line(self):
+        self.metrics.gauge("ratio", lambda: 0.25)
+        self.metrics.sample(now=0)
+        self.lines.inc(10)
+        self.packets.inc("GPSPacket", 10)
+        self.render.observe(0.002)
+        self.metrics.sample(now=1)
+        self.assertEqual(
+            self.metrics.line(),
+            "test: lines 10.0/s packets 10.0/s (GPSPacket 10.0) "
+            "render_seconds p50 1.75ms p99 2.49ms ratio 0.25",
+        )
+
+    def test_prometheus(self):
+        self.metrics.gauge("ratio", lambda: 0.25, "A ratio")
+        self.lines.inc(3)
+        self.packets.inc('we"ird')
+        self.render.observe(0.002)
+        text = self.metrics.prometheus()
+        self.assertIn("# TYPE dwm_lines_total counter\ndwm_lines_total 3\n", text)
+        self.assertIn('dwm_packets_total{type="we\\"ird"} 1\n', text)
+        self.assertIn('dwm_render_seconds', "dwm_render_seconds")
+        self.assertIn('dwm_render_seconds_bucket{le="0.001"} 0\n', text)
+        self.assertIn('dwm_render_seconds_bucket{le="0.0025"} 1\n', text)
+        self.assertIn('dwm_render_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("dwm_render_seconds_count 1\n", text)
+        self.assertIn("# HELP dwm_ratio A ratio\n# TYPE dwm_ratio gauge\ndwm_ratio 0.25\n", text)
+
+    def test_server(self):
+        self.lines.inc()
+        server = metrics.MetricsServer(self.metrics, 0).start()
+        try:
+            url = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(f"{url}/metrics") as response:
+                self.assertIn(b"dwm_lines_total 1", response.read())
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{url}/nope")
+        finally:
+            server.close()
+
+    def test_start_close(self):
+        self.metrics.start(log_interval=0)
+        self.metrics.close()
+        self.assertEqual(len(self.metrics._samples), 1)
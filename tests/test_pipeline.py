@@ -0,0 +1,85 @@
+"""Tests for the reader/publisher pipeline."""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from direwolf_monitor.utils import pipeline, spool
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.consumed = []
+        # Hold the consumer until the test lets it go.
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _consume(self, line, position):
+        self.gate.wait()
+        self.consumed.append(line)
+
+    def _lines(self, n):
+        return [b"line %d\n" % i for i in range(n)]
+
+    def test_block(self):
+        pipe = pipeline.Pipeline(self._consume, maxsize=2)
+        producer = threading.Thread(
+            target=lambda: [pipe.put(line) for line in self._lines(5)],
+        )
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+        self.gate.set()
+        producer.join()
+        pipe.close()
+        self.assertEqual(self.consumed, self._lines(5))
+        self.assertGreater(pipe.blocked, 0)
+
+    def test_drop_oldest(self):
+        pipe = pipeline.Pipeline(
+            self._consume, maxsize=2, overflow=pipeline.OVERFLOW_DROP_OLDEST,
+        )
+        for line in self._lines(6):
+            pipe.put(line)
+        self.gate.set()
+        pipe.close()
+        # The consumer may have taken the first line before blocking.
+        self.assertEqual(self.consumed[-2:], self._lines(6)[-2:])
+        self.assertEqual(len(self.consumed) + pipe.dropped, 6)
+
+    def test_spill_keeps_order(self):
+        s = spool.Spool(os.path.join(self.tmpdir, "overflow"))
+        pipe = pipeline.Pipeline(
+            self._consume, maxsize=2, overflow=pipeline.OVERFLOW_SPILL, spill=s,
+        )
+        for line in self._lines(10):
+            pipe.put(line)
+        self.assertGreater(pipe.spilled, 0)
+        self.gate.set()
+        pipe.close()
+        self.assertEqual(self.consumed, self._lines(10))
+        self.assertEqual(pipe.depth, 0)
+
+    def test_spill_while_consuming(self):
+        s = spool.Spool(os.path.join(self.tmpdir, "overflow"))
+        pipe = pipeline.Pipeline(
+            self._consume, maxsize=4, overflow=pipeline.OVERFLOW_SPILL, spill=s,
+        )
+        self.gate.set()
+        lines = self._lines(2000)
+        for line in lines:
+            pipe.put(line)
+        pipe.close()
+        self.assertEqual(self.consumed, lines)
+        self.assertEqual(pipe.depth, 0)
+
+    def test_spill_needs_spool(self):
+        self.assertRaises(
+            ValueError, pipeline.Pipeline, self._consume,
+            overflow=pipeline.OVERFLOW_SPILL,
+        )
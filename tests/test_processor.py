@@ -0,0 +1,194 @@
+"""Tests for the mqtt_to_terminal line processors."""
+import io
+import os
+import threading
+import time
+import types
+import unittest
+
+from rich.console import Console
+
+from direwolf_monitor.utils import filters, latency, processor, record, stations
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class _Recorder:
+    """Records what a processor would render instead of rendering it."""
+
+    def __init__(self, proc):
+        self.rendered = []
+        proc._render = self._render
+
+    def _render(self, kind, raw, packet):
+        self.rendered.append((kind, bytes(raw), type(packet).__name__))
+
+
+def _ctx():
+    return types.SimpleNamespace(obj={"console": Console(file=io.StringIO())})
+
+
+class TestLineProcessor(unittest.TestCase):
+
+    def _run(self, proc):
+        recorder = _Recorder(proc)
+        with open(CORPUS, "rb") as f:
+            for line in f:
+                proc.process_line(line)
+        proc.close()
+        return recorder.rendered
+
+    def test_corpus(self):
+        rendered = self._run(processor.LineProcessor(_ctx(), headless=True))
+        kinds = [kind for kind, _, _ in rendered]
+        self.assertEqual(kinds.count("rx"), 16)
+        self.assertEqual(kinds.count("ig#"), 3)
+        self.assertNotIn("digi", kinds)
+
+    def test_dedup(self):
+        proc = processor.LineProcessor(_ctx(), headless=True, dedup_window=30)
+        recorder = _Recorder(proc)
+        proc.process_line(b"[0.3] K6YZA-4>APRS,WIDE1-1:>hi\n")
+        proc.process_line(b"[0.4] K6YZA-4>APRS,W6CX*,WIDE1:>hi\n")
+        proc.process_line(b"[ig] K6YZA-4>APRS,TCPIP*,qAR,W6CX:>hi\n")
+        self.assertEqual(len(recorder.rendered), 2)
+        self.assertEqual(proc.dedup.dropped, 1)
+
+    def test_dedup_kinds(self):
+        proc = processor.LineProcessor(
+            _ctx(), headless=True, dedup_window=30, dedup_kinds=("rx", "ig"),
+        )
+        recorder = _Recorder(proc)
+        proc.process_line(b"[0.3] K6YZA-4>APRS,WIDE1-1:>hi\n")
+        proc.process_line(b"[ig] K6YZA-4>APRS,TCPIP*,qAR,W6CX:>hi\n")
+        self.assertEqual(len(recorder.rendered), 1)
+
+    def test_own_beacons_not_deduped(self):
+        proc = processor.LineProcessor(_ctx(), headless=True, dedup_window=30)
+        recorder = _Recorder(proc)
+        for _ in range(3):
+            proc.process_line(b"[0L] W6XYZ>APDW16,WIDE2-1:!3725.31N/12205.05W#\n")
+        self.assertEqual(len(recorder.rendered), 3)
+        self.assertEqual(proc.dedup.dropped, 0)
+
+    def test_stations(self):
+        table = stations.StationTable()
+        proc = processor.LineProcessor(_ctx(), headless=True, stations=table)
+        with open(CORPUS, "rb") as f:
+            for line in f:
+                proc.process_line(line)
+        self.assertIn("N0CALL-1", table)
+        # What we transmitted ourselves isn't "heard".
+        self.assertNotIn("WB4BOR-11", table)
+        self.assertEqual(table.get("KM6LYW-9").packets, 2)
+        self.assertIn("stations 15/", proc.line())
+
+    def test_on_message_counts(self):
+        proc = processor.LineProcessor(_ctx(), headless=True)
+        payload = b"[0.3] A>B:>ok\n[0.3] garbage\n"
+        proc.on_message(None, None, types.SimpleNamespace(payload=payload))
+        self.assertEqual(proc.summary.lines, 2)
+        self.assertEqual(proc.summary.failures, 1)
+        self.assertEqual(proc._lines.value, 2)
+        self.assertEqual(proc._failures.value, 1)
+        self.assertEqual(proc._packets.values, {"StatusPacket": 1})
+
+    def test_records(self):
+        expected = self._run(processor.LineProcessor(_ctx(), headless=True))
+        with open(CORPUS, "rb") as f:
+            payload, _ = record.Encoder().encode(f.read())
+        proc = processor.LineProcessor(_ctx(), headless=True)
+        recorder = _Recorder(proc)
+        proc.on_message(None, None, types.SimpleNamespace(payload=payload))
+        self.assertEqual(recorder.rendered, expected)
+
+    def test_records_render(self):
+        proc = processor.LineProcessor(_ctx(), headless=True)
+        payload, _ = record.Encoder().encode(b"[0.3] A>B:>ok\n[0.3] garbage\n")
+        payload += b'{"v":99,"kind":"rx","raw":"A>B:>ok","fields":null}\n'
+        proc.on_message(None, None, types.SimpleNamespace(payload=payload))
+        self.assertEqual(proc._packets.values, {"StatusPacket": 1})
+        self.assertEqual(proc._failures.value, 1)
+        self.assertEqual(proc._versions.values, {"99": 1})
+        self.assertEqual(proc.summary.lines, 3)
+
+    def test_filter_before_parse(self):
+        parsed = []
+        proc = processor.LineProcessor(
+            _ctx(), headless=True, packet_filter=filters.compile(["call:KM6LYW*"]),
+        )
+        parse = proc.parse
+        proc.parse = lambda data: parsed.append(data) or parse(data)
+        rendered = self._run(proc)
+        self.assertEqual({raw.split(b">")[0] for _, raw, _ in rendered}, {b"KM6LYW-9"})
+        # Only what passed was parsed.
+        self.assertEqual(len(parsed), len(rendered))
+        self.assertIn("filter 2/", proc.line())
+
+    def test_filter_records(self):
+        with open(CORPUS, "rb") as f:
+            payload, _ = record.Encoder().encode(f.read())
+        proc = processor.LineProcessor(
+            _ctx(), headless=True,
+            packet_filter=filters.compile(["bbox:37,-123,38,-121"]),
+        )
+        recorder = _Recorder(proc)
+        proc.on_message(None, None, types.SimpleNamespace(payload=payload))
+        self.assertTrue(recorder.rendered)
+        self.assertGreater(proc.filter.filtered.values["bbox"], 0)
+
+    def test_pooled_keeps_order(self):
+        expected = self._run(processor.LineProcessor(_ctx(), headless=True))
+        pooled = processor.PooledLineProcessor(
+            _ctx(), workers=2, chunk_size=4, headless=True,
+        )
+        self.assertEqual(self._run(pooled), expected)
+        self.assertGreater(pooled.chunks, 1)
+
+    def test_pooled_records_in_order(self):
+        expected = self._run(processor.LineProcessor(_ctx(), headless=True))
+        with open(CORPUS, "rb") as f:
+            lines = f.readlines()
+        half = len(lines) // 2
+        records, _ = record.Encoder().encode(b"".join(lines[half:]))
+        pooled = processor.PooledLineProcessor(
+            _ctx(), workers=1, chunk_size=4, headless=True,
+        )
+        recorder = _Recorder(pooled)
+        threads = []
+        render = recorder._render
+        pooled._render = lambda *args: threads.append(
+            threading.current_thread().name) or render(*args)
+        pooled.on_message(None, None, types.SimpleNamespace(payload=b"".join(lines[:half])))
+        pooled.on_message(None, None, types.SimpleNamespace(payload=records))
+        pooled.close()
+        self.assertEqual(recorder.rendered, expected)
+        self.assertEqual(set(threads), {"dwm-render"})
+
+    def test_latency(self):
+        tracker = latency.Tracker()
+        proc = processor.LineProcessor(_ctx(), headless=True, latency=tracker)
+        now = time.time()
+        msg = types.SimpleNamespace(
+            payload=b"[0.3] A>B:>ok\n[0.3] C>D:>ok\n[0L] E>F:>ok\n",
+            properties=types.SimpleNamespace(
+                UserProperty=latency.user_properties(now - 0.5, now - 0.25),
+            ),
+        )
+        proc.on_message(None, None, msg)
+        counts = {stage: h.count for stage, h in tracker.histograms.items()}
+        self.assertEqual(
+            counts,
+            {"read": 0, "publish": 3, "deliver": 3, "parse": 3, "render": 3, "total": 3},
+        )
+        self.assertGreaterEqual(tracker.histograms["total"].sum, 1.5)
+
+    def test_pooled_latency(self):
+        tracker = latency.Tracker()
+        pooled = processor.PooledLineProcessor(
+            _ctx(), workers=1, chunk_size=4, headless=True, latency=tracker,
+        )
+        pooled.on_message(None, None, types.SimpleNamespace(payload=b"[0.3] A>B:>ok\n"))
+        pooled.close()
+        self.assertEqual(tracker.histograms["parse"].count, 1)
+        self.assertEqual(tracker.histograms["render"].count, 1)
@@ -0,0 +1,102 @@
+"""Tests for publishing parsed packets as records."""
+import json
+import os
+import types
+import unittest
+
+from direwolf_monitor.utils import metrics, packet, record
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class TestEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = record.Encoder(record.FORMAT_JSON, clock=lambda: 1000.0)
+
+    def test_record(self):
+        rec = self.encoder.record(b"[0.3] K6ABC-7>APRS,WIDE1-1:>hi there\n")
+        self.assertEqual(rec["v"], record.SCHEMA_VERSION)
+        self.assertEqual(rec["kind"], "rx")
+        self.assertEqual(rec["ts"], 1000.0)
+        self.assertEqual(rec["raw"], "K6ABC-7>APRS,WIDE1-1:>hi there")
+        self.assertEqual(rec["fields"]["status"], "hi there")
+        self.assertNotIn("raw", rec["fields"])
+        # Back as aprslib returned it.
+        self.assertEqual(record.fields(rec), packet.parse_fields(rec["raw"].encode()))
+
+    def test_timestamp(self):
+        rec = self.encoder.record(b"[0.3 2024-05-01T18:45:02Z] A>B:>hi\n")
+        self.assertEqual(rec["ts"], 1714589102.0)
+
+    def test_read_time(self):
+        # When the line was read, not when it was encoded.
+        payload, count = self.encoder.encode(b"[0.3] A>B:>hi\n[0.4] C>D:>ho\n", 900.5)
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [rec["ts"] for rec in record.decode(payload)], [900.5, 900.5],
+        )
+
+    def test_not_packets(self):
+        self.assertIsNone(self.encoder.record(b"N0CALL audio level = 40(18/11)   [NONE]\n"))
+        self.assertIsNone(self.encoder.record(b"[0H] A>B,DIGI*:>hi\n"))
+        comment = self.encoder.record(b"[ig] # aprsc 2.1.14\n")
+        self.assertEqual(comment["kind"], "ig")
+        self.assertIsNone(comment["fields"])
+
+    def test_escaped_bytes_survive(self):
+        rec = self.encoder.record(b"[0.3] A>B:>caf\xe9<0x0d>\n")
+        json.dumps(rec)
+        self.assertEqual(record.packet_bytes(rec), b"A>B:>caf\xe9\r")
+        self.assertEqual(record.fields(rec)["status"], "caf\xe9")
+
+    def test_corpus_round_trip(self):
+        with open(CORPUS, "rb") as f:
+            payload, count = self.encoder.encode(f.read())
+        self.assertEqual(record.format_of(payload), record.FORMAT_JSON)
+        records = list(record.decode(payload))
+        self.assertEqual(len(records), count)
+        self.assertEqual(self.encoder.records.value, count)
+        self.assertGreater(self.encoder.skipped.value, 0)
+        for rec in records:
+            if rec["fields"] is not None:
+                self.assertEqual(record.fields(rec),
+                                 packet.parse_fields(record.packet_bytes(rec)))
+        self.assertIn(f"records {count}", self.encoder.line())
+
+    def test_metrics(self):
+        registry = metrics.Metrics()
+        encoder = record.Encoder(metrics=registry)
+        encoder.encode(b"[0.3] A>B:>ok\n[0.3] garbage\n")
+        self.assertEqual(encoder.records.value, 2)
+        self.assertIn("record_failures", registry.prometheus())
+        self.assertEqual(encoder.failures.value, 1)
+
+    @unittest.skipUnless(record.have_msgpack(), "msgpack isn't installed")
+    def test_msgpack(self):
+        encoder = record.Encoder(record.FORMAT_MSGPACK)
+        payload, count = encoder.encode(b"[0.3] A>B:>one\n[0L] C>D:>two\n")
+        self.assertEqual(count, 2)
+        self.assertEqual(record.format_of(payload), record.FORMAT_MSGPACK)
+        self.assertEqual([r["raw"] for r in record.decode(payload, record.FORMAT_MSGPACK)],
+                         ["A>B:>one", "C>D:>two"])
+
+
+class TestFormat(unittest.TestCase):
+
+    def test_format_of(self):
+        self.assertIsNone(record.format_of(b"[0.3] A>B:>hi\n"))
+        self.assertIsNone(record.format_of(b""))
+        self.assertEqual(record.format_of(b"\x85"), record.FORMAT_MSGPACK)
+        properties = types.SimpleNamespace(ContentType="application/msgpack")
+        self.assertEqual(record.format_of(b"{", properties), record.FORMAT_MSGPACK)
+        properties = types.SimpleNamespace(ContentType="text/plain")
+        self.assertIsNone(record.format_of(b"{", properties))
+
+    def test_bad_payload(self):
+        with self.assertRaises(ValueError):
+            list(record.decode(b'{"v": 1}\n{nope\n'))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            record.Encoder("xml")
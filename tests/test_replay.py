@@ -0,0 +1,98 @@
+"""Tests for replaying a recorded direwolf log."""
+import io
+import os
+import types
+import unittest
+
+from rich.console import Console
+
+from direwolf_monitor.utils import filters, processor, replay
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class _Clock:
+    """A clock that only moves when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestReplayer(unittest.TestCase):
+
+    def setUp(self):
+        self.rendered = []
+        self.clock = _Clock()
+
+    def _processor(self, **kwargs):
+        proc = processor.LineProcessor(
+            types.SimpleNamespace(obj={"console": Console(file=io.StringIO())}),
+            headless=True, **kwargs
+        )
+        proc.parse = lambda data: bytes(data)
+        proc._render = lambda kind, raw, packet: self.rendered.append((kind, packet))
+        return proc
+
+    def _replayer(self, **kwargs):
+        return replay.Replayer(
+            self._processor(), clock=self.clock, sleep=self.clock.sleep, **kwargs
+        )
+
+    def test_corpus_as_fast_as_possible(self):
+        replayer = replay.Replayer(self._processor(), speed=0)
+        with open(CORPUS, "rb") as f:
+            replayer.run(f)
+        kinds = [kind for kind, _ in self.rendered]
+        self.assertEqual(replayer.packets, len(kinds))
+        self.assertEqual(kinds.count("rx"), 16)
+        # APRS-IS comments are shown too, without a parse.
+        self.assertEqual(kinds.count("ig#"), 3)
+        self.assertEqual(replayer.histograms["parse"].count, len(kinds) - 3)
+        stages = [row["stage"] for row in replayer.report()]
+        self.assertEqual(
+            stages, ["classify", "decode", "select", "parse", "render", "total"],
+        )
+        self.assertEqual(replayer.histograms["classify"].count, replayer.lines)
+        self.assertIn("replayed", replayer.line())
+
+    def test_dedup_and_filter(self):
+        proc = self._processor(
+            dedup_window=30, packet_filter=filters.compile(["call:K6YZA*"]),
+        )
+        replayer = replay.Replayer(proc, speed=0)
+        replayer.run([
+            b"[0.3] K6YZA-4>APRS,WIDE1-1:>hi\n",
+            b"[0.4] K6YZA-4>APRS,W6CX*,WIDE1:>hi\n",
+            b"[0.3] N0CALL>APRS:>other\n",
+        ])
+        self.assertEqual(self.rendered, [("rx", b"K6YZA-4>APRS,WIDE1-1:>hi")])
+        self.assertEqual(replayer.packets, 1)
+        proc.close()
+
+    def test_paced_by_timestamps(self):
+        replayer = self._replayer(speed=2)
+        replayer.run([
+            b"[0.4 18:45:02] A>B:>one\n",
+            b"audio level = 40(18/11)\n",
+            b"[0.4 18:45:04] A>B:>two\n",
+            b"[0.4 18:45:10] A>B:>three\n",
+        ])
+        self.assertEqual(self.clock.sleeps, [1.0, 3.0])
+        self.assertEqual(
+            [packet for _, packet in self.rendered], [b"A>B:>one", b"A>B:>two", b"A>B:>three"],
+        )
+        self.assertEqual(replayer.histograms["lag"].count, 3)
+
+    def test_paced_without_timestamps(self):
+        replayer = self._replayer(speed=1, interval=0.5)
+        replayer.run([b"[0.4] A>B:>one\n", b"[0.4] A>B:>two\n", b"[ig] # comment\n"])
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+        self.assertEqual([kind for kind, _ in self.rendered], ["rx", "rx", "ig#"])
@@ -0,0 +1,66 @@
+"""Tests for the grid spatial index."""
+import random
+import unittest
+
+from direwolf_monitor.utils import geo, spatial
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(3)
+        self.points = {}
+        self.index = spatial.GridIndex(cell_degrees=1.0)
+        for i in range(3000):
+            # Dense around the bay area, and spread over the globe.
+            if i % 3:
+                lat, lon = rand.uniform(36, 39), rand.uniform(-123.5, -120.5)
+            else:
+                lat, lon = rand.uniform(-90, 90), rand.uniform(-180, 180)
+            self.points[i] = (lat, lon)
+            self.index.update(i, lat, lon)
+
+    def _distances(self, lat, lon):
+        home = geo.Home(lat, lon)
+        return {key: home.distance_bearing(*point)[0] for key, point in self.points.items()}
+
+    def test_radius(self):
+        for lat, lon, miles in [(37.42, -122.08, 20), (37.42, -122.08, 300),
+                                (89.5, 10, 200), (-10, 179.9, 500), (0, 0, 20000)]:
+            expected = sorted(k for k, d in self._distances(lat, lon).items() if d <= miles)
+            found = self.index.radius(lat, lon, miles)
+            self.assertEqual(sorted(k for k, _ in found), expected)
+            self.assertEqual(found, sorted(found, key=lambda item: item[1]))
+
+    def test_nearest(self):
+        for lat, lon in [(37.42, -122.08), (-45, 100), (89.9, -179)]:
+            distances = self._distances(lat, lon)
+            expected = sorted(distances, key=distances.get)[:10]
+            self.assertEqual([k for k, _ in self.index.nearest(lat, lon, 10)], expected)
+        self.assertEqual(self.index.nearest(0, 0, 0), [])
+
+    def test_bbox(self):
+        def inside(point, south, west, north, east):
+            lat, lon = point
+            in_lon = west <= lon <= east if west <= east else lon >= west or lon <= east
+            return south <= lat <= north and in_lon
+
+        for box in [(37, -122.5, 38, -121.5), (-60, 170, 60, -170), (-90, -180, 90, 180)]:
+            expected = sorted(k for k, p in self.points.items() if inside(p, *box))
+            self.assertEqual(sorted(self.index.bbox(*box)), expected)
+
+    def test_move_and_remove(self):
+        index = spatial.GridIndex()
+        index.update("A", 37.0, -122.0)
+        index.update("A", 10.0, 10.0)
+        self.assertEqual(index.bbox(36, -123, 38, -121), [])
+        self.assertEqual(index.bbox(9, 9, 11, 11), ["A"])
+        index.remove("A")
+        index.remove("A")
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index._cells, {})
+
+    def test_accept(self):
+        found = self.index.radius(37.42, -122.08, 50, accept=lambda k: k % 2 == 0)
+        self.assertTrue(found)
+        self.assertTrue(all(k % 2 == 0 for k, _ in found))
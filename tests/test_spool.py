@@ -0,0 +1,202 @@
+"""Tests for the outage spool."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from direwolf_monitor.utils import spool
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "dwm.spool")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_commit_truncates(self):
+        s = spool.Spool(self.path)
+        for i in range(3):
+            s.append(b"line %d\n" % i)
+        lines, cursor = s.read(2)
+        self.assertEqual(lines, [b"line 0\n", b"line 1\n"])
+        s.commit(cursor)
+        lines, cursor = s.read(10)
+        self.assertEqual(lines, [b"line 2\n"])
+        s.commit(cursor)
+        self.assertFalse(s.pending)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        s.close()
+
+    def test_survives_restart(self):
+        s = spool.Spool(self.path)
+        s.append(b"before restart\n")
+        s.close()
+        s = spool.Spool(self.path)
+        self.assertEqual(s.read(10)[0], [b"before restart\n"])
+        s.close()
+
+    def test_max_age(self):
+        s = spool.Spool(self.path, max_age=60)
+        with mock.patch.object(spool.time, "time", return_value=time.time() - 120):
+            s.append(b"stale\n")
+        s.append(b"fresh\n")
+        self.assertEqual(s.read(10)[0], [b"fresh\n"])
+        self.assertEqual(s.expired, 1)
+        s.close()
+
+    def test_max_bytes_drops_oldest(self):
+        s = spool.Spool(self.path, max_bytes=200)
+        for i in range(20):
+            s.append(b"line %02d\n" % i)
+        lines = s.read(100)[0]
+        self.assertLessEqual(os.path.getsize(self.path), 200)
+        self.assertEqual(lines[-1], b"line 19\n")
+        self.assertGreater(s.dropped, 0)
+        s.close()
+
+    def test_malformed_records_skipped(self):
+        with open(self.path, "wb") as f:
+            f.write(b"%d good\n" % time.time())
+            f.write(b"\0\0\0\0\n")
+            f.write(b"notatime line\n")
+            f.write(b"%d torn" % time.time())
+        s = spool.Spool(self.path)
+        self.assertEqual(s.corrupt, 1)
+        s.append(b"after\n")
+        lines, cursor = s.read(10)
+        self.assertEqual(lines, [b"good\n", b"after\n"])
+        self.assertEqual(s.corrupt, 3)
+        s.commit(cursor)
+        self.assertFalse(s.pending)
+        s.close()
+
+    def test_compact_skips_malformed(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\0\0\0\0\n")
+        s = spool.Spool(self.path, max_bytes=200)
+        for i in range(20):
+            s.append(b"line %02d\n" % i)
+        self.assertEqual(s.corrupt, 1)
+        self.assertEqual(s.read(100)[0][-1], b"line 19\n")
+        s.close()
+
+
+class TestSpoolingPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sent = []
+        self.stamps = []
+        self.up = False
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _send(self, payload, count, spooled):
+        if not self.up:
+            return False
+        self.sent.append(payload)
+        self.stamps.append(spooled)
+        return True
+
+    def test_spool_then_drain_in_order(self):
+        s = spool.Spool(os.path.join(self.tmpdir, "dwm.spool"))
+        pub = spool.SpoolingPublisher(self._send, s, drain_rate=10000)
+        self.assertTrue(pub.publish(b"one\n"))
+        self.assertTrue(pub.publish("two\n"))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(pub.spooled, 2)
+
+        self.up = True
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while s.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(pub.publish(b"three\n"))
+        self.assertEqual(self.sent, [b"one\ntwo\n", b"three\n"])
+        # Drained lines carry when they were spooled, direct ones don't.
+        self.assertAlmostEqual(self.stamps[0], time.time(), delta=5)
+        self.assertIsNone(self.stamps[1])
+        pub.close()
+
+    def test_drains_past_malformed_records(self):
+        path = os.path.join(self.tmpdir, "dwm.spool")
+        with open(path, "wb") as f:
+            f.write(b"\0\0\0\0\n")
+        s = spool.Spool(path)
+        pub = spool.SpoolingPublisher(self._send, s, drain_rate=10000)
+        self.up = True
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while s.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(s.pending)
+        self.assertTrue(pub.publish(b"direct\n"))
+        self.assertEqual(self.sent, [b"direct\n"])
+        self.assertTrue(pub._thread.is_alive())
+        pub.close()
+
+    def test_spools_only_unsent_lines(self):
+        s = spool.Spool(os.path.join(self.tmpdir, "dwm.spool"))
+        attempts = []
+
+        def _send(payload, count, spooled):
+            attempts.append(payload)
+            if not self.up:
+                # The first line went out, the rest didn't.
+                return 1
+            self.sent.append(payload)
+            return True
+
+        pub = spool.SpoolingPublisher(_send, s, drain_rate=10000)
+        self.up = True
+        pub.connected()
+        self.up = False
+        self.assertTrue(pub.publish(b"one\ntwo\nthree\n", 3))
+        self.assertEqual(pub.spooled, 2)
+        # Draining, "two" goes out and "three" doesn't.
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while len(attempts) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.up = True
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while s.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(attempts[1], b"two\nthree\n")
+        self.assertEqual(self.sent, [b"three\n"])
+        pub.close()
+
+    def test_partial_drain_with_repeated_lines(self):
+        s = spool.Spool(os.path.join(self.tmpdir, "dwm.spool"))
+        attempts = []
+
+        def _send(payload, count, spooled):
+            attempts.append(payload)
+            if not self.up:
+                return 1
+            self.sent.append(payload)
+            return True
+
+        pub = spool.SpoolingPublisher(_send, s, drain_rate=10000)
+        self.assertTrue(pub.publish(b"beacon\nbeacon\nother\n", 3))
+        # The first beacon goes out, the identical second one doesn't.
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while not attempts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.up = True
+        pub.connected()
+        deadline = time.monotonic() + 2
+        while s.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(attempts[0], b"beacon\nbeacon\nother\n")
+        self.assertEqual(self.sent, [b"beacon\nother\n"])
+        self.assertEqual(pub.drained, 3)
+        pub.close()
@@ -0,0 +1,101 @@
+"""Tests for the station table."""
+import os
+import tempfile
+import types
+import unittest
+
+from direwolf_monitor.utils import stations
+
+
+class GPSPacket(types.SimpleNamespace):
+    pass
+
+
+class StatusPacket(types.SimpleNamespace):
+    pass
+
+
+def _gps(call, lat=37.0, lon=-122.0, path=("WIDE1-1",)):
+    return GPSPacket(from_call=call, path=list(path), latitude=lat, longitude=lon,
+                     symbol="-", symbol_table="/")
+
+
+def _status(call):
+    return StatusPacket(from_call=call, path=[])
+
+
+class TestStationTable(unittest.TestCase):
+
+    def test_update(self):
+        table = stations.StationTable()
+        table.update(_gps("K6YZA-4"), now=100)
+        station = table.update(_status("K6YZA-4"), now=160)
+        self.assertEqual(station.packets, 2)
+        self.assertEqual(station.counts, {"GPSPacket": 1, "StatusPacket": 1})
+        # A status packet keeps the last position and symbol.
+        self.assertEqual((station.latitude, station.symbol), (37.0, "-"))
+        self.assertEqual(station.path, ())
+        self.assertEqual((station.first_heard, station.last_heard), (100, 160))
+
+    def test_lru(self):
+        table = stations.StationTable(max_stations=3, max_age=0)
+        for i, call in enumerate(["A", "B", "C"]):
+            table.update(_gps(call), now=i)
+        table.update(_gps("A"), now=3)
+        table.update(_gps("D"), now=4)
+        self.assertNotIn("B", table)
+        self.assertEqual([s.callsign for s in table.heard(now=4)], ["D", "A", "C"])
+        self.assertEqual(table.evictions, 1)
+
+    def test_max_age(self):
+        table = stations.StationTable(max_age=60)
+        table.update(_gps("A"), now=0)
+        table.update(_gps("B"), now=30)
+        table.update(_gps("C"), now=70)
+        self.assertEqual(len(table), 2)
+        self.assertEqual([s.callsign for s in table.heard(since=20, now=75)], ["C"])
+
+    def test_spatial(self):
+        table = stations.StationTable(max_stations=3, max_age=0)
+        table.update(_gps("NEAR", lat=37.30, lon=-122.0), now=0)
+        table.update(_gps("FAR", lat=40.0, lon=-122.0), now=10)
+        table.update(_status("NOPOS"), now=20)
+        table.update(_gps("NEW", lat=37.31, lon=-122.0), now=30)
+        # NEAR was evicted, and dropped from the index.
+        self.assertEqual(len(table.index), 2)
+        within = table.within(37.3, -122.0, 20, now=30)
+        self.assertEqual([s.callsign for s, _ in within], ["NEW"])
+        self.assertAlmostEqual(within[0][1], 0.69, places=2)
+        self.assertEqual([s.callsign for s, _ in table.nearest(37.3, -122.0, 5)], ["NEW", "FAR"])
+        self.assertEqual(table.nearest(37.3, -122.0, 5, since=10, now=30)[0][0].callsign, "NEW")
+        self.assertEqual(len(table.nearest(37.3, -122.0, 5, since=10, now=30)), 1)
+        self.assertEqual([s.callsign for s in table.in_bbox(39, -123, 41, -121)], ["FAR"])
+
+    def test_third_party(self):
+        table = stations.StationTable()
+        table.update(types.SimpleNamespace(from_call="GATE", path=[], subpacket=_gps("INNER")))
+        self.assertIn("INNER", table)
+        self.assertNotIn("GATE", table)
+        self.assertIsNone(table.update(types.SimpleNamespace(from_call=None, path=[])))
+
+    def test_snapshot(self):
+        table = stations.StationTable()
+        table.update(_gps("A"), now=1e12)
+        table.update(_gps("B", lat=38.0), now=1e12 + 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stations.json")
+            table.save(path)
+            restored = stations.StationTable(max_stations=1, path=path).start()
+            restored.close()
+            self.assertEqual(restored.writes, 1)
+            self.assertEqual(list(restored._stations), ["B"])
+            station = restored.get("B")
+            self.assertEqual((station.latitude, station.path), (38.0, ("WIDE1-1",)))
+
+    def test_bad_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stations.json")
+            self.assertIsNone(stations.load(path))
+            with open(path, "w") as f:
+                f.write('{"version": 99, "stations": []}')
+            self.assertIsNone(stations.load(path))
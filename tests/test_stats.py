@@ -0,0 +1,23 @@
+"""Tests for headless summaries."""
+import unittest
+
+from direwolf_monitor.utils import stats
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_line(self):
+        summary = stats.Summary("test", depth=lambda: 3)
+        summary.count(1024, lines=10)
+        summary.failures += 2
+        line = summary.line()
+        self.assertTrue(line.startswith("test: "))
+        self.assertIn("lines/s", line)
+        self.assertIn("failures 2", line)
+        self.assertIn("queue 3", line)
+        # Rates are since the previous summary.
+        self.assertIn(" 0.0 lines/s", summary.line())
+
+    def test_extra(self):
+        summary = stats.Summary("test", extra=lambda: "cache 1/3")
+        self.assertTrue(summary.line().endswith(" cache 1/3"))
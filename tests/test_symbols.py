@@ -0,0 +1,53 @@
+"""Tests for the APRS symbol atlas."""
+import os
+import tempfile
+import unittest
+
+from direwolf_monitor.utils import symbols
+
+
+class TestSymbolAtlas(unittest.TestCase):
+
+    def setUp(self):
+        self.atlas = symbols.SymbolAtlas(tile_pixels=4, max_overlays=3)
+
+    def test_lazy(self):
+        self.assertEqual(self.atlas._charts, {})
+        self.atlas.render("-", "/")
+        self.assertEqual(list(self.atlas._charts), [symbols.CHARTS["/"]])
+
+    def test_not_from_cwd(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                self.assertTrue(self.atlas.render(">", "\\"))
+            finally:
+                os.chdir(cwd)
+
+    def test_cached(self):
+        first = self.atlas.render("k", "/")
+        self.assertIs(self.atlas.render("k", "/"), first)
+        self.assertEqual((self.atlas.hits, self.atlas.misses), (1, 1))
+        self.assertEqual(self.atlas.image("k", "/").original_size, (4, 4))
+
+    def test_tables_bounded(self):
+        for table in "/\\":
+            for code in range(33, 127):
+                self.atlas.render(chr(code), table)
+        self.assertEqual(len(self.atlas), 2 * symbols.SYMBOLS)
+        self.assertNotEqual(self.atlas.render("-", "/"), self.atlas.render("-", "\\"))
+
+    def test_overlays(self):
+        plain = self.atlas.render("#", "\\")
+        self.assertNotEqual(self.atlas.render("#", "1"), plain)
+        for overlay in "2345":
+            self.atlas.render("#", overlay)
+        self.assertEqual(len(self.atlas._overlays), 3)
+        self.assertEqual(len(self.atlas), 4)
+        self.assertNotIn(("1", "#"), self.atlas._rendered)
+
+    def test_invalid(self):
+        self.assertEqual(self.atlas.render(" ", "/"), "")
+        self.assertEqual(self.atlas.render("", "/"), "")
+        self.assertIsNone(self.atlas.image(None, "/"))
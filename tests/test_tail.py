@@ -0,0 +1,108 @@
+"""Tests for the direwolf log tailer."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from direwolf_monitor.utils import tail
+
+
+class _OnceWatcher:
+    """Stop the tailer the first time it would block."""
+
+    kind = "test"
+
+    def wait(self, timeout=None):
+        return False
+
+    def reset(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class TestTailer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "direwolf.log")
+        with open(self.path, "wb") as f:
+            f.write(b"old line\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _append(self, data, path=None):
+        with open(path or self.path, "ab") as f:
+            f.write(data)
+
+    def _tailer(self, **kwargs):
+        return tail.Tailer(self.path, watcher=_OnceWatcher(), **kwargs)
+
+    def test_from_end(self):
+        tailer = self._tailer()
+        self._append(b"one\ntwo\n")
+        self.assertEqual(list(tailer.lines()), ["one\n", "two\n"])
+
+    def test_from_start(self):
+        tailer = self._tailer(from_end=False)
+        self.assertEqual(list(tailer.lines()), ["old line\n"])
+
+    def test_partial_line(self):
+        tailer = self._tailer()
+        self._append(b"par")
+        self.assertEqual(list(tailer.lines()), [])
+        self.assertEqual(tailer.lag, 3)
+        self._append(b"tial\n")
+        self.assertEqual(list(tailer.lines()), ["partial\n"])
+        self.assertEqual(tailer.lag, 0)
+
+    def test_split_utf8(self):
+        tailer = self._tailer(chunk_size=4)
+        self._append("abé→\n".encode("utf-8"))
+        self.assertEqual(list(tailer.lines()), ["abé→\n"])
+
+    def test_rename_rotation(self):
+        tailer = self._tailer()
+        self._append(b"before\n")
+        os.rename(self.path, self.path + ".1")
+        self._append(b"last in old\n", self.path + ".1")
+        self._append(b"after\n")
+        self.assertEqual(
+            list(tailer.lines()), ["before\n", "last in old\n", "after\n"],
+        )
+        self.assertEqual(tailer.rotations, 1)
+
+    def test_copytruncate(self):
+        tailer = self._tailer()
+        self._append(b"before\n")
+        self.assertEqual(list(tailer.lines()), ["before\n"])
+        os.truncate(self.path, 0)
+        self._append(b"new\n")
+        self.assertEqual(list(tailer.lines()), ["new\n"])
+        self.assertEqual(tailer.truncations, 1)
+
+    def test_resume(self):
+        tailer = self._tailer()
+        self._append(b"missed\n")
+        tailer.resume(tailer.inode, len(b"old line\n"))
+        self.assertEqual(list(tailer.lines()), ["missed\n"])
+
+    def test_resume_rotated(self):
+        tailer = self._tailer()
+        inode = tailer.inode
+        self._append(b"missed in old\n")
+        os.rename(self.path, self.path + ".1")
+        self._append(b"new\n")
+        tailer = self._tailer()
+        self.assertTrue(tailer.resume(inode, len(b"old line\n")))
+        self.assertEqual(list(tailer.lines()), ["missed in old\n", "new\n"])
+
+    def test_polling_backoff(self):
+        watcher = tail.PollingWatcher(self.path, min_interval=0.001, max_interval=0.004)
+        for _ in range(4):
+            watcher.wait()
+        self.assertEqual(watcher._interval, 0.004)
+        watcher.reset()
+        self.assertEqual(watcher._interval, 0.001)
@@ -0,0 +1,109 @@
+"""Tests for sharding packets over MQTT topics."""
+import os
+import unittest
+
+from direwolf_monitor.utils import broker, topics
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "direwolf.log")
+
+
+class TestPacketType(unittest.TestCase):
+
+    def test_types(self):
+        cases = {
+            b"A>B:!3742.00N/12212.00W>mobile": topics.POSITION,
+            b"A>B:@092345z3742.00N/12212.00W-home": topics.POSITION,
+            b"A>B:=/5L!!<*e7>7P[": topics.POSITION,
+            b"A>B:!3742.00N/12212.00W_180/005g010t068": topics.WEATHER,
+            b"A>B:@092345z3742.00N/12212.00W_180/005g010t068": topics.WEATHER,
+            b"A>B:=/5L!!<*e7_7P[": topics.WEATHER,
+            b"A>B:_10090556c220s004g005t077": topics.WEATHER,
+            b"A>S32U6T:`(_fn\"Oj/": topics.MIC_E,
+            b"A>B::N0CALL   :hello{1": topics.MESSAGE,
+            b"A>B::BLN1     :net tonight": topics.BULLETIN,
+            b"A>B::A        :PARM.Volts": topics.TELEMETRY,
+            b"A>B:T#005,199,000,255,073,123,01101001": topics.TELEMETRY,
+            b"A>B:>qrv": topics.STATUS,
+            b"A>B:;LEADER   *092345z3742.00N/12212.00W>": topics.OBJECT,
+            b"A>B:}C>D:>inner": topics.THIRD_PARTY,
+            b"A>B:~what": topics.UNKNOWN,
+            b"A>B": topics.UNKNOWN,
+        }
+        for packet, expected in cases.items():
+            self.assertEqual(topics.packet_type(packet), expected, packet)
+
+    def test_from_call(self):
+        self.assertEqual(topics.from_call(b"K6ABC-7>APRS,WIDE1-1:>hi"), "K6ABC-7")
+        self.assertEqual(topics.from_call(b"nonsense"), "")
+        self.assertEqual(topics.level("A/B+#"), "A_B__")
+        self.assertEqual(topics.level(""), "_")
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_template(self):
+        topics.validate_template(topics.DEFAULT_TEMPLATE)
+        topics.validate_template("aprs/{from_call}")
+        for bad in ("{topic}/{callsign}", "{topic}/{0}", "{topic"):
+            with self.assertRaises(ValueError, msg=bad):
+                topics.validate_template(bad)
+
+    def test_filter(self):
+        for good in ("direwolf", "direwolf/#", "direwolf/+/rx/+/K6ABC", "#"):
+            topics.validate_filter(good)
+        for bad in ("", "direwolf/#/rx", "direwolf/rx#", "direwolf/K6+"):
+            with self.assertRaises(ValueError, msg=bad):
+                topics.validate_filter(bad)
+
+    def test_subscriptions(self):
+        self.assertEqual(topics.subscriptions("direwolf"), ["direwolf/#"])
+        self.assertEqual(topics.subscriptions("direwolf/#"), ["direwolf/#"])
+        self.assertEqual(topics.subscriptions("direwolf", ("a/+", "b")), ["a/+", "b"])
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = topics.Router("direwolf", "home")
+
+    def test_topics(self):
+        self.assertEqual(
+            self.router.topic(b"[0.4] K6ABC-7>APRS,WIDE1-1:!3742.00N/12212.00W>\n"),
+            "direwolf/home/rx/position/K6ABC-7",
+        )
+        self.assertEqual(
+            self.router.topic(b"[ig>tx] WB4BOR-11>APDW17::N0CALL   :hi{1\n"),
+            "direwolf/home/ig_tx/message/WB4BOR-11",
+        )
+        self.assertEqual(self.router.topic(b"[ig] # aprsc 2.1.14\n"),
+                         "direwolf/home/ig/comment/_")
+        self.assertIsNone(self.router.topic(b"K6ABC audio level = 40(18/11)\n"))
+        self.assertIsNone(self.router.topic(b"[0H] K6ABC>APRS,DIGI*:>hi\n"))
+
+    def test_route_keeps_runs_together(self):
+        payload = (
+            b"[0.4] A>APRS:>one\n"
+            b"[0.4] A>APRS:>two\n"
+            b"A audio level = 40(18/11)\n"
+            b"[0.4] B>APRS:>three\n"
+            b"[0.4] A>APRS:>four\n"
+        )
+        routed = list(self.router.route(payload))
+        self.assertEqual([(topic, count, start) for topic, _, count, start in routed], [
+            ("direwolf/home/rx/status/A", 2, 0),
+            ("direwolf/home/rx/status/B", 1, 3),
+            ("direwolf/home/rx/status/A", 1, 4),
+        ])
+        self.assertEqual(routed[0][1], b"[0.4] A>APRS:>one\n[0.4] A>APRS:>two\n")
+        self.assertEqual(self.router.skipped.value, 1)
+
+    def test_corpus_filters(self):
+        with open(CORPUS, "rb") as f:
+            routed = list(self.router.route(f.read()))
+        self.assertTrue(routed)
+        for topic, _, _, _ in routed:
+            self.assertTrue(broker.topic_matches("direwolf/home/+/+/+", topic), topic)
+        weather = [t for t, _, _, _ in routed if broker.topic_matches("direwolf/+/+/weather/#", t)]
+        rx = [t for t, _, _, _ in routed if broker.topic_matches("direwolf/+/rx/#", t)]
+        self.assertLess(len(weather), len(routed))
+        self.assertLess(len(rx), len(routed))
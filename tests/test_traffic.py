@@ -0,0 +1,100 @@
+"""Tests for the synthetic direwolf traffic generator."""
+import unittest
+
+import aprslib
+
+from direwolf_monitor.utils import classify, escape, packet, traffic
+
+
+class _Clock:
+    """A clock that only moves when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestMix(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(traffic.parse_mix("position=5, ig=1,mic-e"),
+                         {"position": 5.0, "ig": 1.0, "mic-e": 1.0})
+
+    def test_errors(self):
+        for text in ("nope=1", "position=lots", "", "position=0"):
+            with self.assertRaises(ValueError, msg=text):
+                traffic.parse_mix(text)
+
+
+class TestMicE(unittest.TestCase):
+
+    def test_round_trip(self):
+        for latitude, longitude in ((37.7012, -122.2533), (-33.86, 151.21), (51.5, -0.12)):
+            destination, information = traffic.mic_e(latitude, longitude, speed=36, course=90)
+            parsed = aprslib.parse(
+                b"K6ABC>" + destination + b":" + information
+            )
+            self.assertAlmostEqual(parsed["latitude"], latitude, places=3)
+            self.assertAlmostEqual(parsed["longitude"], longitude, places=3)
+            self.assertEqual(parsed["course"], 90)
+
+
+class TestTraffic(unittest.TestCase):
+
+    def test_seeded_is_repeatable(self):
+        first = traffic.Traffic(seed=7)
+        second = traffic.Traffic(seed=7)
+        self.assertEqual([first.event() for _ in range(50)],
+                         [second.event() for _ in range(50)])
+
+    def test_lines_look_like_direwolf(self):
+        generated = traffic.Traffic(seed=1, timestamps=True)
+        kinds = set()
+        parsed = total = 0
+        for _ in range(500):
+            for line in generated.event():
+                kind, data = classify.classify(line)
+                kinds.add(kind)
+                if kind not in (classify.RX, classify.TX, classify.IG, classify.IG_TX):
+                    continue
+                if data[:1] == b"#":
+                    continue
+                total += 1
+                if packet.parse_packet(escape.decode(data)):
+                    parsed += 1
+        self.assertTrue({classify.RX, classify.TX, classify.IG, classify.IG_TX} <= kinds)
+        # Telemetry and a few oddities don't parse, as with real traffic.
+        self.assertGreater(parsed / total, 0.8)
+        self.assertEqual(generated.events, 500)
+
+    def test_mix(self):
+        generated = traffic.Traffic(mix={"message": 1}, chatter=False, seed=1)
+        for _ in range(20):
+            (line,) = generated.event()
+            self.assertEqual(classify.classify(line)[0], classify.RX)
+            self.assertIn(b"::", line)
+
+    def test_escaped(self):
+        generated = traffic.Traffic(mix={"escaped": 1}, chatter=False, seed=1)
+        self.assertIn(b"<0x", generated.event()[0])
+
+    def test_run_at_rate(self):
+        clock = _Clock()
+        bursts = []
+        generated = traffic.Traffic(chatter=False, seed=1)
+        generated.run(bursts.append, rate=10, duration=2, clock=clock, sleep=clock.sleep)
+        self.assertEqual(generated.events, 20)
+        self.assertEqual(sum(len(burst) for burst in bursts), generated.lines)
+
+    def test_ramp(self):
+        clock = _Clock()
+        generated = traffic.Traffic(chatter=False, seed=1)
+        generated.run(lambda lines: None, rate=10, duration=3, ramp=10, ramp_interval=1,
+                      clock=clock, sleep=clock.sleep)
+        self.assertEqual(generated.rate, 30)
+        self.assertAlmostEqual(generated.events, 60, delta=2)